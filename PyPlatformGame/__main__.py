@@ -10,13 +10,14 @@ from .renderer import draw
 import pygame as pg
 from .gameplay import Gameplay, GameplayCallbacks
 from .audiomanager import AudioManager
+from .audioqueue import AudioCommandQueue
 
 
 def sound_callback(l: float):
-    AudioManager().set_sounds_volume(l)
+    audio.set_sounds_volume(l)
     print('Sound', l)
 def music_callback(l: float):
-    AudioManager().set_background_volume(l)
+    audio.set_background_volume(l)
     print('Music', l)
 
 
@@ -46,21 +47,21 @@ def player_death_callback():
 
 def exit_callback():
     if click_sound_handle != -1:
-        AudioManager().play_sound(click_sound_handle)
+        audio.play_sound(click_sound_handle)
 
     global should_stop
     should_stop = True
 
 def play_callback():
     if click_sound_handle != -1:
-        AudioManager().play_sound(click_sound_handle)
+        audio.play_sound(click_sound_handle)
 
     global cur_state
     cur_state = GAME
 
 def menu_callback():
     if click_sound_handle != -1:
-        AudioManager().play_sound(click_sound_handle)
+        audio.play_sound(click_sound_handle)
         
     global cur_state
     global killed_enemy_count
@@ -167,16 +168,17 @@ FPS = 60
 
 audiomanager = AudioManager()
 sound_path = os.path.join(base_dir, 'assets', 'sounds')
-audiomanager.init_sounds(sound_path, sound_path)
-audiomanager.play_background_music("soundtrack.mp3")
-click_sound_handle = AudioManager().get_sound_handle("click_button.wav")
+audiomanager.init_sounds(sound_path, sound_path, pcm_cache_dir=AudioManager.PCM_CACHE_DIR)
+audio = AudioCommandQueue(audiomanager)
+audio.play_background_music("soundtrack.mp3")
+click_sound_handle = audio.get_sound_handle("click_button.wav")
 
 while True:
     if cur_state != prev_state:
         if cur_state == MENU:
-            interface = menu_ui(play_callback, exit_callback, music_callback, sound_callback, (AudioManager().get_background_volume(), AudioManager().get_sounds_volume()), (lang_callback_ru, lang_callback_en))
+            interface = menu_ui(play_callback, exit_callback, music_callback, sound_callback, (audio.get_background_volume(), audio.get_sounds_volume()), (lang_callback_ru, lang_callback_en))
         elif cur_state == PAUSE:
-            interface = pause_ui(play_callback, menu_callback, music_callback, sound_callback, (AudioManager().get_background_volume(), AudioManager().get_sounds_volume()))
+            interface = pause_ui(play_callback, menu_callback, music_callback, sound_callback, (audio.get_background_volume(), audio.get_sounds_volume()))
         elif cur_state == GAME:
             interface = game_ui()
         elif cur_state == RESULTS:
@@ -193,7 +195,9 @@ while True:
     if should_stop:
         break
     draw(scene, interface, Camera(pos, dir))
+    audio.flush()
     pg.display.flip()
 interface = None
+audio.stop()
 delete_app_state()
 pg.quit()
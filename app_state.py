@@ -5,6 +5,12 @@ from render.shaders import ShaderManager
 from render.textures import TextureManager
 from render.rtargets import RTargetManager
 from render.meshes import MeshManager
+from render.graph import RenderGraph
+from render.profiler import GpuProfiler
+from render.dynres import DynamicResolution
+from render.text import TextRenderer
+from render.ringbuffer import RingBuffer
+from render.capture import FrameCapture
 
 @dataclass
 class AppState:
@@ -15,6 +21,12 @@ class AppState:
     shader_manager: ShaderManager
     texture_manager: TextureManager
     mesh_manager: MeshManager
+    render_graph: RenderGraph
+    profiler: GpuProfiler
+    dynamic_resolution: DynamicResolution
+    text_renderer: TextRenderer
+    frame_data: RingBuffer
+    frame_capture: FrameCapture
 
 APP_STATE_INTERNAL = None
 
@@ -24,11 +36,19 @@ def init_app_state(screen_res: Tuple[int, int],
                     meshes_folder: str) -> None:
     """Init app state."""
     global APP_STATE_INTERNAL
+    rt_manager = RTargetManager(screen_res)
+    profiler = GpuProfiler()
     APP_STATE_INTERNAL = AppState(screen_res,
-                                RTargetManager(screen_res),
+                                rt_manager,
                                 ShaderManager(shaders_folder),
                                 TextureManager(textures_folder),
-                                MeshManager(meshes_folder))
+                                MeshManager(meshes_folder),
+                                RenderGraph(rt_manager, profiler),
+                                profiler,
+                                DynamicResolution(),
+                                TextRenderer(),
+                                RingBuffer(),
+                                FrameCapture())
 def app_state() -> AppState:
     """Get app state."""
     return APP_STATE_INTERNAL
@@ -36,5 +56,7 @@ def app_state() -> AppState:
 def delete_app_state() -> None:
     """Delete app state."""
     global APP_STATE_INTERNAL
+    # finish encoding of captured frames while context is alive
+    APP_STATE_INTERNAL.frame_capture.stop()
     del APP_STATE_INTERNAL
     APP_STATE_INTERNAL = None
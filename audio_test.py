@@ -1,10 +1,12 @@
 """Audio test is responsible for testing AudioManager."""
 
 import os
+import tempfile
 import unittest
 import pygame
 
 from .audiomanager import AudioManager
+from .audioqueue import AudioCommandQueue
 
 
 class AudioManagerTest(unittest.TestCase):
@@ -48,6 +50,167 @@ class AudioManagerTest(unittest.TestCase):
         self.assertTrue(audio_manager.play_sound(handle_2))
         self.assertTrue(audio_manager.play_sound(handle_3))
 
+    def test_lazy_loading(self):
+        """Checking that sounds are decoded on first play and then taken from cache."""
+        self.setup_audiomanager()
+        audio_manager = AudioManager()
+        handle = audio_manager.get_sound_handle('pop1.wav')
+
+        stats = audio_manager.get_cache_stats()
+        self.assertEqual(stats['sounds_resident'], 0)
+        self.assertEqual(stats['bytes_resident'], 0)
+
+        audio_manager.play_sound(handle)
+        audio_manager.play_sound(handle)
+        stats = audio_manager.get_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertGreater(stats['bytes_resident'], 0)
+
+    def test_cache_budget(self):
+        """Checking that least recently used sounds are dropped to fit into budget."""
+        self.setup_audiomanager()
+        audio_manager = AudioManager()
+        self.assertEqual(audio_manager.preload_sounds(['pop1.wav', 'pop3.wav', 'missing.wav']), 2)
+        size_1 = audio_manager.sounds_cache.sounds[audio_manager.get_sound_handle('pop1.wav')][1]
+        size_3 = audio_manager.sounds_cache.sounds[audio_manager.get_sound_handle('pop3.wav')][1]
+
+        audio_manager.sounds_cache.set_budget(size_3)
+        stats = audio_manager.get_cache_stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['bytes_resident'], size_3)
+        self.assertIsNone(audio_manager.sounds_cache.peek(audio_manager.get_sound_handle('pop1.wav')))
+
+        audio_manager.play_sound_by_name('pop1.wav')
+        stats = audio_manager.get_cache_stats()
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['bytes_resident'], size_1)
+
+    def test_max_instances(self):
+        """Checking that the oldest instance is restarted when sound reaches its limit."""
+        self.setup_audiomanager()
+        audio_manager = AudioManager()
+        handle = audio_manager.get_sound_handle('pop1.wav')
+        audio_manager.set_sound_priority(handle, 0, 2)
+        limited = audio_manager.get_voices_stats()['limited']
+
+        for _ in range(5):
+            self.assertTrue(audio_manager.play_sound(handle))
+        self.assertEqual(len(audio_manager.voices.active(handle)), 2)
+        self.assertEqual(audio_manager.get_voices_stats()['limited'] - limited, 3)
+
+    def test_voice_stealing(self):
+        """Checking that busy pool steals voices of lower priority and rejects the others."""
+        self.setup_audiomanager()
+        audio_manager = AudioManager()
+        channels = len(audio_manager.voices.channels)
+        low = audio_manager.get_sound_handle('pop1.wav')
+        high = audio_manager.get_sound_handle('pop3.wav')
+        audio_manager.set_sound_priority(low, 0, channels)
+        audio_manager.set_sound_priority(high, 1, channels)
+        stats = dict(audio_manager.get_voices_stats())
+
+        for _ in range(channels):
+            self.assertTrue(audio_manager.play_sound(low, 0.5))
+        self.assertTrue(audio_manager.play_sound(high, 0.25))
+        self.assertEqual(audio_manager.get_voices_stats()['stolen'] - stats['stolen'], 1)
+        voice = audio_manager.voices.active(high)[0]
+        self.assertAlmostEqual(voice.channel.get_volume(),
+                               0.25 * audio_manager.get_sounds_volume(), places=2)
+
+        for _ in range(channels - 1):
+            self.assertTrue(audio_manager.play_sound(high))
+        self.assertFalse(audio_manager.play_sound(low))
+        self.assertEqual(audio_manager.get_voices_stats()['rejected'] - stats['rejected'], 1)
+        self.assertEqual(len(audio_manager.voices.active(high)), channels)
+
+    def test_pcm_cache(self):
+        """Checking that decoded sounds are stored on first start and loaded on next ones."""
+        base_dir = os.path.dirname(__file__)
+        sounds_folder  = os.path.join(base_dir, 'assets', 'testsounds')
+        audio_manager = AudioManager()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            audio_manager.init_sounds(sounds_folder, sounds_folder, pcm_cache_dir=cache_dir)
+            self.assertEqual(audio_manager.transcode(['pop2.mp3']), 4)
+            cold = audio_manager.get_pcm_cache_stats()
+            self.assertEqual(cold['misses'], 4)
+            music = audio_manager.pcm_cache.music_file(os.path.join(sounds_folder, 'pop2.mp3'))
+            self.assertTrue(music.endswith('.wav'))
+            decoded = pygame.mixer.Sound(os.path.join(sounds_folder, 'pop2.mp3')).get_raw()
+
+            audio_manager.init_sounds(sounds_folder, sounds_folder, pcm_cache_dir=cache_dir)
+            audio_manager.preload_sounds()
+            warm = audio_manager.get_pcm_cache_stats()
+            self.assertEqual(warm['misses'], 0)
+            self.assertEqual(warm['hits'], 3)
+            cached = audio_manager.get_sound(audio_manager.get_sound_handle('pop2.mp3'))
+            self.assertEqual(cached.get_raw(), decoded)
+        self.setup_audiomanager()
+
+    def test_pcm_cache_errors(self):
+        """Checking that missing sources fail as without cache and unwritable cache is skipped."""
+        base_dir = os.path.dirname(__file__)
+        source = os.path.join(base_dir, 'assets', 'testsounds', 'pop1.wav')
+        audio_manager = AudioManager()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            audio_manager.init_sounds(os.path.join(base_dir, 'assets', 'testsounds'), "",
+                                      pcm_cache_dir=os.path.join(cache_dir, 'pcm'))
+            pcm_cache = audio_manager.pcm_cache
+            missing = os.path.join(cache_dir, 'missing.wav')
+            with self.assertRaises(Exception) as uncached:
+                pygame.mixer.Sound(missing)
+            with self.assertRaises(type(uncached.exception)):
+                pcm_cache.load_sound(missing)
+            with self.assertRaises(pygame.error):
+                audio_manager.play_background_music('missing.mp3')
+
+            os.rmdir(pcm_cache.cache_dir)
+            self.assertGreater(pcm_cache.load_sound(source).get_length(), 0.0)
+            self.assertEqual(pcm_cache.music_file(source), source)
+        self.setup_audiomanager()
+
+    def test_command_queue(self):
+        """Checking that commands of a frame are coalesced and executed by worker."""
+        self.setup_audiomanager()
+        audio_manager = AudioManager()
+        volume = audio_manager.get_sounds_volume()
+        audio_queue = AudioCommandQueue(audio_manager)
+        handle = audio_queue.get_sound_handle('pop1.wav')
+
+        for new_volume in [0.1, 0.2, 0.3]:
+            audio_queue.set_sounds_volume(new_volume)
+        audio_queue.play_sound(handle)
+        self.assertEqual(audio_queue.get_sounds_volume(), 0.3)
+        audio_queue.stop()
+
+        stats = audio_queue.get_stats()
+        self.assertEqual(stats['posted'], 4)
+        self.assertEqual(stats['coalesced'], 2)
+        self.assertEqual(stats['executed'], 2)
+        self.assertGreaterEqual(stats['latency_ms_max'], stats['latency_ms_mean'])
+        self.assertAlmostEqual(audio_manager.get_sounds_volume(), 0.3)
+        self.assertEqual(len(audio_manager.voices.active(handle)), 1)
+        audio_manager.set_sounds_volume(volume)
+
+    def test_command_queue_failure(self):
+        """Checking that a failing command does not stop execution of later ones."""
+        self.setup_audiomanager()
+        audio_manager = AudioManager()
+        audio_queue = AudioCommandQueue(audio_manager)
+        handle = audio_queue.get_sound_handle('pop1.wav')
+
+        audio_queue.play_background_music('missing.mp3')
+        audio_queue.post('play_sound')
+        audio_queue.wait()
+        audio_queue.play_sound(handle)
+        audio_queue.wait()
+        self.assertTrue(audio_queue.thread.is_alive())
+        audio_queue.stop()
+
+        self.assertEqual(audio_queue.get_stats()['executed'], 3)
+        self.assertEqual(len(audio_manager.voices.active(handle)), 1)
+        audio_manager.stop_all_sounds()
+
 
 if __name__ == '__main__':
     pygame.mixer.pre_init(44100, 16, 1, 512)
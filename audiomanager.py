@@ -3,6 +3,9 @@
 import os
 from pygame import mixer
 from .singleton import Singleton
+from .soundcache import SoundCache
+from .voices import VoiceManager
+from .pcmcache import PCMCache
 
 class AudioManager(metaclass=Singleton):
     """
@@ -10,32 +13,54 @@ class AudioManager(metaclass=Singleton):
 
     :param sounds_folder_dir: path to folder which contains all sounds
     :param music_folder_dir: path to folder which contains all musics
-    :param sound: array with mixer.Sounds
-    :param sounds_handles: dictionary with mapping between sounds handles and mixer.Sounds
+    :param sounds_paths: array with paths of sound files, index is sound handle
+    :param sounds_handles: dictionary with mapping between sounds filenames and handles
+    :param sounds_cache: decoded mixer.Sounds limited by memory budget
+    :param voices: voice manager playing sounds on a pool of channels
+    :param sounds_priorities: dictionary <handle, (priority, max_instances)> of configured sounds
+    :param pcm_cache: decoded audio stored on disk, None if sounds are decoded from sources
     :param sound_volume: volume factor which applyies to every sound effect
     :param sounds_volumes: array with sound volume for every sound effect
     """
 
     SOUNDS_EXTENSIONS = ['.wav', '.mp3']
+    SOUNDS_CACHE_BUDGET = 64 * 1024 * 1024
+    VOICES_CHANNELS = 16
+    DEFAULT_PRIORITY = 0
+    DEFAULT_MAX_INSTANCES = 4
+    PCM_CACHE_DIR = '.pcm_cache'
 
 
-    def init_sounds(self, sounds_folder_dir: str, music_folder_dir: str):
+    def init_sounds(self, sounds_folder_dir: str, music_folder_dir: str,
+                    cache_budget: int = SOUNDS_CACHE_BUDGET, pcm_cache_dir: str = None):
         """Initialize AudioManager with passing paths to a folder with sounds and music effects.
 
         It runs loads_sounds automatically.
 
         :param sounds_folder_dir: path to folder which contains all sounds
         :param music_folder_dir: path to folder which contains all musics
+        :param cache_budget: memory budget of decoded sounds in bytes
+        :param pcm_cache_dir: path to folder with decoded audio, e.g. PCM_CACHE_DIR.
+            If None, audio is decoded from sources every time
         """
         self.sounds_folder_dir = sounds_folder_dir
         self.music_folder_dir = music_folder_dir
         mixer.init()
+        self.sounds_cache = SoundCache(cache_budget)
+        self.pcm_cache = PCMCache(pcm_cache_dir) if pcm_cache_dir else None
+        if self.voices is None:
+            self.voices = VoiceManager(self.VOICES_CHANNELS)
+        self.voices.stop()
         self.load_sounds()
 
     def __init__(self):
         """Initialize AudioManager with default variables."""
-        self.sounds = []
+        self.sounds_paths = []
         self.sounds_handles = {}
+        self.sounds_cache = SoundCache(self.SOUNDS_CACHE_BUDGET)
+        self.voices = None
+        self.sounds_priorities = {}
+        self.pcm_cache = None
         self.sound_volume = 0.5
         self.sounds_volumes = {}
         self.sounds_folder_dir = ""
@@ -43,24 +68,118 @@ class AudioManager(metaclass=Singleton):
 
 
     def load_sounds(self):
-        """Load every sound file from sounds_folder_dir which was defined in constructor.
+        """Register every sound file from sounds_folder_dir which was defined in constructor.
 
-        It support .wav and .mp4 file formats.
+        It support .wav and .mp3 file formats.
         For every sound algorithm allocate a unique handle,
         which can be requested by get_sound_handle.
+        Sounds are decoded on first play or by preload_sounds.
         """
-        for _, _, files in os.walk(self.sounds_folder_dir):
-            for file in files:
-                filename, ext = os.path.splitext(file)
+        self.sounds_paths = []
+        self.sounds_handles = {}
+        self.sounds_priorities = {}
+        self.sounds_cache.clear()
+        for root, _, files in os.walk(self.sounds_folder_dir):
+            for file in sorted(files):
+                _, ext = os.path.splitext(file)
                 if ext in self.SOUNDS_EXTENSIONS:
-                    sound = mixer.Sound(os.path.join(self.sounds_folder_dir,filename+ext))
-                    handle_sound = len(self.sounds)
-                    self.sounds.append(sound)
-                    self.sounds_handles[filename+ext] = handle_sound
+                    self.sounds_handles[file] = len(self.sounds_paths)
+                    self.sounds_paths.append(os.path.join(root, file))
+
+    def get_sound(self, handle: int) -> mixer.Sound:
+        """
+        Get decoded sound, decode it if it is not in cache.
+
+        :param handle: correct sound handle
+
+        :return: decoded sound, volume is applied to channels playing it
+        """
+        def load() -> mixer.Sound:
+            if self.pcm_cache is not None:
+                return self.pcm_cache.load_sound(self.sounds_paths[handle])
+            return mixer.Sound(self.sounds_paths[handle])
+
+        return self.sounds_cache.get(handle, load)
+
+    def preload_sounds(self, filenames: list = None) -> int:
+        """
+        Decode sounds before they are played.
+
+        :param filenames: sound filenames, every registered sound if None
+
+        :return: number of preloaded sounds
+        """
+        if filenames is None:
+            filenames = list(self.sounds_handles.keys())
+        handles = [self.get_sound_handle(filename) for filename in filenames]
+        handles = [handle for handle in handles if handle != -1]
+        for handle in handles:
+            self.get_sound(handle)
+        return len(handles)
+
+    def transcode(self, music_filenames: list = None) -> int:
+        """
+        Store decoded audio in PCM cache, so the first start does not decode it.
+
+        :param music_filenames: music filenames from music_folder_dir to transcode too
+
+        :return: number of transcoded files, 0 if there's no PCM cache
+        """
+        if self.pcm_cache is None:
+            return 0
+
+        for path in self.sounds_paths:
+            self.pcm_cache.load_sound(path)
+        for filename in music_filenames or []:
+            self.pcm_cache.music_file(os.path.join(self.music_folder_dir, filename))
+        return len(self.sounds_paths) + len(music_filenames or [])
+
+    def get_pcm_cache_stats(self) -> dict:
+        """
+        Get statistics of PCM cache.
+
+        :return: dict with hits, misses, milliseconds of cold loads (decoding) and warm loads
+        """
+        if self.pcm_cache is None:
+            return {}
+        return self.pcm_cache.stats
+
+    def get_cache_stats(self) -> dict:
+        """
+        Get statistics of decoded sounds cache.
+
+        :return: dict with hits, misses, evictions, resident sounds count, bytes resident and budget
+        """
+        return self.sounds_cache.stats()
+
+    def set_sound_priority(self, handle: int, priority: int,
+                           max_instances: int = DEFAULT_MAX_INSTANCES) -> int:
+        """
+        Configure how a sound competes for channels.
+
+        :param handle: sound handle
+        :param priority: voices with lower priority are stolen first
+        :param max_instances: maximum number of concurrent instances of the sound
+
+        :return: If handle is correct, Return 1. Else in Return 0
+        """
+        if handle < 0 or handle >= len(self.sounds_paths):
+            return 0
+
+        self.sounds_priorities[handle] = (priority, max(max_instances, 1))
+        return 1
+
+    def get_voices_stats(self) -> dict:
+        """
+        Get statistics of voice manager.
+
+        :return: dict with played, stolen, limited by instances and rejected sounds counts
+        """
+        return self.voices.stats
 
     def get_sound_handle(self, filename: str) -> int:
         """
-        Return a sound handle based on a filename, based on preloaded sounds.
+        Return a sound handle based on a filename, based on registered sounds.
 
         :param filename: sound filename
 
@@ -74,9 +193,9 @@ class AudioManager(metaclass=Singleton):
 
     def get_loaded_sounds(self) -> dict:
         """
-        Return dictionary  of loaded sounds.
+        Return dictionary  of registered sounds.
 
-        :return: dict <sound_filename, handle> of loaded sounds
+        :return: dict <sound_filename, handle> of registered sounds
         """
         return self.sounds_handles
 
@@ -87,15 +206,68 @@ class AudioManager(metaclass=Singleton):
         :param handle: sound handle
         :param volume: sound volume
 
-        :return: If handle is correct, Return 1. Else in Return 0
+        :return: If handle is correct and sound got a channel, Return 1. Else in Return 0
         """
-        if handle < 0 or handle >= len(self.sounds):
+        if handle < 0 or handle >= len(self.sounds_paths):
             return 0
 
         self.sounds_volumes[handle] = volume
-        self.sounds[handle].play()
-        self.sounds[handle].set_volume(self.sounds_volumes[handle]*self.sound_volume)
-        return 1
+        priority, max_instances = self.sounds_priorities.get(
+            handle, (self.DEFAULT_PRIORITY, self.DEFAULT_MAX_INSTANCES))
+        voice = self.voices.play(handle, self.get_sound(handle), volume*self.sound_volume,
+                                 priority, max_instances)
+        return 0 if voice is None else 1
+
+    def play_emitter(self, emitter: int, handle: int, left: float, right: float,
+                     loops: int=-1) -> int:
+        """
+        Play a positioned sound of a sound emitter, previous sound of the emitter is stopped.
+
+        :param emitter: id of sound emitter, e.g. ECS entity
+        :param handle: sound handle
+        :param left: gain of left speaker
+        :param right: gain of right speaker
+        :param loops: number of repeats after the first play, -1 = endlessly
+
+        :return: If handle is correct and sound got a channel, Return 1. Else in Return 0
+        """
+        if handle < 0 or handle >= len(self.sounds_paths):
+            return 0
+
+        priority, max_instances = self.sounds_priorities.get(
+            handle, (self.DEFAULT_PRIORITY, self.DEFAULT_MAX_INSTANCES))
+        volume = self.sounds_volumes.get(handle, 1.0)*self.sound_volume
+        voice = self.voices.play(handle, self.get_sound(handle), volume, priority, max_instances,
+                                 loops, emitter, (left, right))
+        return 0 if voice is None else 1
+
+    def set_emitter_volume(self, emitter: int, left: float, right: float) -> int:
+        """
+        Change speaker gains of a sound emitter.
+
+        :param emitter: id of sound emitter
+        :param left: gain of left speaker
+        :param right: gain of right speaker
+
+        :return: If emitter plays a sound, Return 1. Else in Return 0
+        """
+        return int(self.voices.set_pan(emitter, left, right))
+
+    def stop_emitter(self, emitter: int):
+        """
+        Stop sound of a sound emitter.
+
+        :param emitter: id of sound emitter
+        """
+        self.voices.stop_emitter(emitter)
+
+    def take_lost_emitters(self) -> set:
+        """
+        Get sound emitters whose sound was stolen, rejected or stopped not by stop_emitter.
+
+        :return: set of emitter ids, each one is returned once
+        """
+        return self.voices.take_lost()
 
     def play_sound_by_name(self, filename: str, volume: float=1.0) -> int:
         """
@@ -118,7 +290,10 @@ class AudioManager(metaclass=Singleton):
         :param filename: music filename
         :param loop: number of iterations for playing. -1 = endlessly
         """
-        mixer.music.load(os.path.join(self.music_folder_dir,filename))
+        path = os.path.join(self.music_folder_dir,filename)
+        if self.pcm_cache is not None:
+            path = self.pcm_cache.music_file(path)
+        mixer.music.load(path)
         mixer.music.play(loop)
 
 
@@ -153,9 +328,10 @@ class AudioManager(metaclass=Singleton):
         volume = min(max(volume, 0.0), 1.0)
         self.sound_volume = volume
 
-        for i_s, _ in enumerate(self.sounds):
-            k =  self.sounds_volumes[i_s] if (i_s in self.sounds_volumes) else 1.0
-            self.sounds[i_s].set_volume(k*self.sound_volume)
+        for voice in self.voices.active():
+            k =  self.sounds_volumes[voice.handle] if (voice.handle in self.sounds_volumes) else 1.0
+            voice.volume = k*self.sound_volume
+            voice.apply_volume()
 
     def get_sounds_volume(self) -> float:
         """
@@ -174,13 +350,13 @@ class AudioManager(metaclass=Singleton):
 
         :return: If handle is correct, Return 1. Else in Return 0
         """
-        if handle < 0 or handle >= len(self.sounds):
+        if handle < 0 or handle >= len(self.sounds_paths):
             return 0
 
         volume = min(max(volume, 0.0), 1.0)
 
         self.sounds_volumes[handle] = volume
-        self.sounds[handle].set_volume(volume*self.sound_volume)
+        self.voices.set_volume(handle, volume*self.sound_volume)
         return 1
 
 
@@ -192,13 +368,12 @@ class AudioManager(metaclass=Singleton):
 
         :return: If handle is correct, Return 1. Else in Return 0
         """
-        if handle < 0 or handle >= len(self.sounds):
+        if handle < 0 or handle >= len(self.sounds_paths):
             return 0
 
-        self.sounds[handle].stop()
+        self.voices.stop(handle)
         return 1
 
     def stop_all_sounds(self):
         """Stop every sound."""
-        for sound in self.sounds:
-            sound.stop()
+        self.voices.stop()
@@ -0,0 +1,296 @@
+"""Module is responsible for running AudioManager calls on a dedicated thread."""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from .audiomanager import AudioManager
+
+
+@dataclass
+class AudioCommand:
+    """
+    AudioManager call posted by game code.
+
+    :param name: AudioManager method name
+    :param args: method arguments
+    :param posted: time.perf_counter() of posting
+    """
+
+    name: str
+    args: tuple
+    posted: float
+
+
+class AudioCommandQueue:
+    """
+    Queue of AudioManager calls executed by a worker thread which owns all mixer calls.
+
+    Game code posts commands without blocking and calls flush once per frame to pass
+    commands of the frame to the worker. Inside a frame later commands replace
+    earlier ones with the same key, e.g. only the last volume change is applied and
+    only the last music switch loads a file. Volumes are mirrored, so getters do not
+    wait for the worker. Calls do not return results, e.g. a sound emitter start is
+    fire-and-forget and emitters which lost their sound are reported back by the
+    worker through take_lost_emitters.
+
+    :param manager: initialized AudioManager
+    :param batch: commands of current frame, replaced ones are None
+    :param stats: posted, coalesced and executed commands counts and latency from post to execution
+    """
+
+    # method name: (key group, number of arguments in key) of commands replacing each other
+    COALESCED = {
+        'set_sounds_volume': ('sounds_volume', 0),
+        'set_sound_volume': ('sound_volume', 1),
+        'set_background_volume': ('background_volume', 0),
+        'play_background_music': ('music', 0),
+        'stop_background_music': ('music', 0),
+        'set_emitter_volume': ('emitter_volume', 1),
+    }
+
+    def __init__(self, manager: AudioManager):
+        """
+        Start worker thread.
+
+        :param manager: initialized AudioManager, must not be called directly after this
+        """
+        self.manager = manager
+        self.sounds_volume = manager.get_sounds_volume()
+        self.background_volume = manager.get_background_volume()
+        self.batch: List[AudioCommand | None] = []
+        self.batch_keys: Dict[Tuple, int] = {}
+        self.queue = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self.stats = {'posted': 0, 'coalesced': 0, 'executed': 0,
+                      'latency_ms_mean': 0.0, 'latency_ms_max': 0.0}
+        self.latency_ms_sum = 0.0
+        self.lost_lock = threading.Lock()
+        self.lost_emitters = set()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def post(self, name: str, *args):
+        """
+        Post AudioManager call, it is passed to worker on flush.
+
+        :param name: AudioManager method name
+        :param args: method arguments
+        """
+        command = AudioCommand(name, args, time.perf_counter())
+        coalesced = 0
+        if name in self.COALESCED:
+            group, key_args = self.COALESCED[name]
+            key = (group, *args[:key_args])
+            if key in self.batch_keys:
+                self.batch[self.batch_keys[key]] = None
+                coalesced = 1
+            self.batch_keys[key] = len(self.batch)
+        self.batch.append(command)
+        with self.stats_lock:
+            self.stats['posted'] += 1
+            self.stats['coalesced'] += coalesced
+
+    def flush(self):
+        """Pass commands of the frame to worker."""
+        batch = [command for command in self.batch if command is not None]
+        self.batch = []
+        self.batch_keys = {}
+        if len(batch) > 0:
+            self.queue.put(batch)
+
+    def wait(self):
+        """Pass commands of the frame to worker and wait until every posted command is executed."""
+        self.flush()
+        self.queue.join()
+
+    def stop(self):
+        """Execute posted commands and stop worker thread."""
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        """Execute batches until None is received. Runs on worker thread."""
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                self.queue.task_done()
+                return
+            try:
+                for command in batch:
+                    self._execute(command)
+                lost = self.manager.take_lost_emitters()
+                if len(lost) > 0:
+                    with self.lost_lock:
+                        self.lost_emitters |= lost
+            finally:
+                self.queue.task_done()
+
+    def _execute(self, command: AudioCommand):
+        """
+        Execute command, failure is logged, so it does not stop the worker.
+
+        :param command: posted AudioManager call
+        """
+        try:
+            getattr(self.manager, command.name)(*command.args)
+        except Exception as error:
+            print(f'Audio command {command.name} failed: {error!r}')
+        latency_ms = (time.perf_counter() - command.posted) * 1000.0
+        with self.stats_lock:
+            self.stats['executed'] += 1
+            self.latency_ms_sum += latency_ms
+            self.stats['latency_ms_mean'] = self.latency_ms_sum / self.stats['executed']
+            self.stats['latency_ms_max'] = max(self.stats['latency_ms_max'], latency_ms)
+
+    def get_stats(self) -> dict:
+        """
+        Get queue statistics.
+
+        :return: dict with posted, coalesced and executed commands counts, mean and max latency
+        """
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def get_sound_handle(self, filename: str) -> int:
+        """
+        Return a sound handle based on a filename, handles do not change after init_sounds.
+
+        :param filename: sound filename
+
+        :return: sound handle or -1
+        """
+        return self.manager.get_sound_handle(filename)
+
+    def play_sound(self, handle: int, volume: float=1.0):
+        """
+        Post playing of a sound.
+
+        :param handle: sound handle
+        :param volume: sound volume
+        """
+        self.post('play_sound', handle, volume)
+
+    def play_sound_by_name(self, filename: str, volume: float=1.0):
+        """
+        Post playing of a sound based on its filename.
+
+        :param filename: sound filename
+        :param volume: sound volume
+        """
+        self.play_sound(self.get_sound_handle(filename), volume)
+
+    def play_emitter(self, emitter: int, handle: int, left: float, right: float,
+                     loops: int=-1):
+        """
+        Post playing of a positioned sound of a sound emitter.
+
+        If sound gets no channel, emitter is returned by take_lost_emitters after execution.
+
+        :param emitter: id of sound emitter
+        :param handle: sound handle
+        :param left: gain of left speaker
+        :param right: gain of right speaker
+        :param loops: number of repeats after the first play, -1 = endlessly
+        """
+        self.post('play_emitter', emitter, handle, left, right, loops)
+
+    def set_emitter_volume(self, emitter: int, left: float, right: float):
+        """
+        Post change of speaker gains of a sound emitter.
+
+        :param emitter: id of sound emitter
+        :param left: gain of left speaker
+        :param right: gain of right speaker
+        """
+        self.post('set_emitter_volume', emitter, left, right)
+
+    def take_lost_emitters(self) -> set:
+        """
+        Get sound emitters which lost their sound in commands executed so far.
+
+        :return: set of emitter ids, each one is returned once
+        """
+        with self.lost_lock:
+            lost = self.lost_emitters
+            self.lost_emitters = set()
+        return lost
+
+    def stop_emitter(self, emitter: int):
+        """
+        Post stopping of sound of a sound emitter.
+
+        :param emitter: id of sound emitter
+        """
+        self.post('stop_emitter', emitter)
+
+    def stop_sound(self, handle: int):
+        """
+        Post stopping of a sound.
+
+        :param handle: sound handle
+        """
+        self.post('stop_sound', handle)
+
+    def stop_all_sounds(self):
+        """Post stopping of every sound."""
+        self.post('stop_all_sounds')
+
+    def set_sound_volume(self, handle: int, volume: float):
+        """
+        Post volume change of a sound.
+
+        :param handle: sound handle
+        :param volume: sound volume
+        """
+        self.post('set_sound_volume', handle, volume)
+
+    def set_sounds_volume(self, volume: float):
+        """
+        Post volume change of all sounds.
+
+        :param volume: sounds volume
+        """
+        self.sounds_volume = min(max(volume, 0.0), 1.0)
+        self.post('set_sounds_volume', volume)
+
+    def get_sounds_volume(self) -> float:
+        """
+        Get last requested sounds volume.
+
+        :return: sounds volume
+        """
+        return self.sounds_volume
+
+    def play_background_music(self, filename: str, loop: int=-1):
+        """
+        Post switching of background music, file is loaded by worker.
+
+        :param filename: music filename
+        :param loop: number of iterations for playing. -1 = endlessly
+        """
+        self.post('play_background_music', filename, loop)
+
+    def stop_background_music(self):
+        """Post stopping of background music."""
+        self.post('stop_background_music')
+
+    def set_background_volume(self, volume: float):
+        """
+        Post volume change of background music.
+
+        :param volume: music volume
+        """
+        self.background_volume = volume
+        self.post('set_background_volume', volume)
+
+    def get_background_volume(self) -> float:
+        """
+        Get last requested background music volume.
+
+        :return: music volume
+        """
+        return self.background_volume
@@ -0,0 +1,308 @@
+"""Headless benchmark of renderer.draw along a fixed camera path.
+
+Renders scene to offscreen EGL or OSMesa context, so it runs on machines
+without GPU and window system (e.g. with Mesa llvmpipe in CI). Reports frame
+time, CPU and GPU time of every pass and number of GL calls. Checksums of
+frames can be saved as reference and compared on later runs.
+
+Software drivers may execute work of a pass when the next one is submitted,
+so with llvmpipe time of neighbouring passes can shift between them.
+
+    python benchmark.py --frames 120 --save-reference bench_ref
+    python benchmark.py --frames 120 --check-reference bench_ref --json report.json
+
+Paths which are expected to differ slightly, e.g. fused compute post-processing
+against blur chains, are compared by the largest channel difference instead:
+
+    python benchmark.py --no-compute-post --save-reference chain_ref
+    python benchmark.py --check-reference chain_ref --max-diff 2
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+import glm
+import numpy as np
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parse command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', maxsplit=1)[0])
+    parser.add_argument('--scene', default='assets/scene.json', help='scene description file')
+    parser.add_argument('--frames', type=int, default=120, help='number of measured frames')
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='frames rendered before measurement')
+    parser.add_argument('--size', default='1280x720', help='resolution as WIDTHxHEIGHT')
+    parser.add_argument('--platform', choices=['egl', 'osmesa'], default='egl',
+                        help='offscreen context API')
+    parser.add_argument('--ui', choices=['game', 'menu'], default='game',
+                        help='interface rendered over scene')
+    parser.add_argument('--radius', type=float, default=0.3,
+                        help='radius of camera orbit around scene center')
+    parser.add_argument('--height', type=float, default=0.05,
+                        help='camera height above scene center')
+    parser.add_argument('--static', action='store_true',
+                        help='keep camera at the start of the path')
+    parser.add_argument('--reference-every', type=int, default=30,
+                        help='checksum every N-th frame and the last one')
+    parser.add_argument('--save-reference', metavar='FOLDER',
+                        help='save checksummed frames as reference')
+    parser.add_argument('--check-reference', metavar='FOLDER',
+                        help='compare frames with saved reference')
+    parser.add_argument('--capture', metavar='FOLDER',
+                        help='record measured frames with asynchronous capture')
+    parser.add_argument('--capture-format', choices=['png', 'raw'], default='png',
+                        help='format of recorded frames')
+    parser.add_argument('--max-diff', type=int, metavar='N',
+                        help='compare frames with reference images, allow channel difference N')
+    parser.add_argument('--blur-quality', metavar='PRESET',
+                        help='blur preset of renderer, its GPU time is reported as "blur"')
+    parser.add_argument('--no-compute-post', action='store_true',
+                        help='use blur chains instead of fused compute post-processing')
+    parser.add_argument('--json', metavar='FILE', help='write report as JSON')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='JSON report to compare mean frame time with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown against baseline')
+    return parser.parse_args(argv)
+
+def camera_path(center: glm.vec3, radius: float, height: float,
+                frames: int) -> List[Tuple[glm.vec3, glm.vec3]]:
+    """Get (position, direction) of camera orbiting once around center."""
+    path = []
+    for frame in range(frames):
+        angle = 2.0 * math.pi * frame / max(frames, 1)
+        pos = center + glm.vec3(radius * math.sin(angle), height, radius * math.cos(angle))
+        path.append((pos, glm.normalize(center - pos)))
+    return path
+
+def frame_stats(samples: List[float]) -> Dict[str, float]:
+    """Get mean, median, 95th percentile and maximum of frame times."""
+    ordered = sorted(samples)
+    return {'mean': statistics.mean(ordered), 'median': statistics.median(ordered),
+            'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            'max': ordered[-1]}
+
+def save_frame(filename: str, pixels) -> None:
+    """Save RGBA pixels read from framebuffer (bottom row first) as image."""
+    from PIL import Image
+    Image.fromarray(pixels[::-1]).save(filename)
+
+def load_frame(filename: str):
+    """Load frame saved by save_frame as RGBA pixels, bottom row first."""
+    from PIL import Image
+    with Image.open(filename) as image:
+        return np.asarray(image.convert('RGBA'))[::-1]
+
+def frame_diff(folder: str, frame: int, pixels) -> int:
+    """Get the largest channel difference of pixels from reference image of frame."""
+    reference = load_frame(os.path.join(folder, f'frame_{frame:04d}.png'))
+    if reference.shape != pixels.shape:
+        return 255
+    return int(np.max(np.abs(reference.astype(np.int16) - pixels.astype(np.int16))))
+
+def check_reference(folder: str, report: Dict, frames: Dict[int, object],
+                    max_diff: int = None) -> List[int]:
+    """Compare frames with reference, save mismatching frames. Return their indices.
+
+    Checksums must be equal, with max_diff frames are compared with reference images
+    and largest differences are stored in report['frame_diff'].
+    """
+    with open(os.path.join(folder, 'reference.json'), 'r', encoding='utf-8') as file:
+        reference = json.load(file)
+    if reference['renderer'] != report['renderer']:
+        print(f'Reference was made with "{reference["renderer"]}", '
+                'checksums of different drivers usually differ')
+    mismatched = []
+    report['frame_diff'] = {}
+    for frame, checksum in reference['checksums'].items():
+        if max_diff is not None and int(frame) in frames:
+            diff = frame_diff(folder, int(frame), frames[int(frame)])
+            report['frame_diff'][frame] = diff
+            matches = diff <= max_diff
+        else:
+            matches = report['checksums'].get(frame) == checksum
+        if not matches:
+            mismatched.append(int(frame))
+            if int(frame) in frames:
+                save_frame(os.path.join(folder, f'frame_{int(frame):04d}_actual.png'),
+                            frames[int(frame)])
+    return mismatched
+
+def save_reference(folder: str, report: Dict, frames: Dict[int, object]) -> None:
+    """Save checksums and images of reference frames."""
+    os.makedirs(folder, exist_ok=True)
+    for frame, pixels in frames.items():
+        save_frame(os.path.join(folder, f'frame_{frame:04d}.png'), pixels)
+    with open(os.path.join(folder, 'reference.json'), 'w', encoding='utf-8') as file:
+        json.dump({key: report[key] for key in ['renderer', 'resolution', 'scene', 'checksums']},
+                    file, indent=4)
+
+def run(args: argparse.Namespace) -> Tuple[Dict, Dict[int, object]]:
+    """Render frames and collect report and pixels of reference frames."""
+    # OpenGL is imported only after platform selection
+    try:
+        from OpenGL import GL
+    except (AttributeError, ImportError) as error:
+        raise RuntimeError(f'OpenGL is not available with "{args.platform}" platform: '
+                            f'{error}') from error
+    import pygame as pg
+    from render.headless import HeadlessContext, GLCallCounter, NO_PASS
+    from app_state import app_state, init_app_state, delete_app_state
+    from scene import Scene, Camera
+    import renderer
+    from renderer import draw
+    from ui_descr import menu_ui, game_ui
+    size = tuple(int(value) for value in args.size.split('x'))
+    renderer.USE_COMPUTE_POST = not args.no_compute_post
+    if args.blur_quality and args.blur_quality not in renderer.BLUR_PRESETS:
+        raise RuntimeError(f'Unknown blur preset "{args.blur_quality}", '
+                            f'available: {", ".join(renderer.BLUR_PRESETS)}')
+    context = HeadlessContext(size)
+    pg.init()
+    init_app_state(size, 'shaders', 'assets/textures', 'assets/meshes')
+    if args.blur_quality:
+        renderer.set_blur_quality(args.blur_quality)
+    scene = Scene(args.scene)
+    if args.ui == 'menu':
+        interface = menu_ui(*[lambda *_: None] * 4, (0.5, 0.5))
+    else:
+        interface = game_ui()
+    center = glm.vec3(0.0)
+    if len(scene.elems) > 0:
+        center = sum((elem.pos for elem in scene.elems), glm.vec3(0.0)) / len(scene.elems)
+    path = camera_path(center, args.radius, args.height, 1 if args.static else args.frames)
+    profiler = app_state().profiler
+    counter = GLCallCounter(profiler)
+    frame_ms = []
+    cpu_ms = []
+    gl_calls = {}
+    checksums = {}
+    frames = {}
+    for frame in range(-args.warmup, args.frames):
+        if frame == 0:
+            GL.glFinish()
+            profiler.history = args.frames
+            profiler.reset()
+            counter.install()
+            counter.reset()
+            if args.capture:
+                app_state().frame_capture.start(args.capture, args.capture_format)
+        pos, direction = path[min(max(frame, 0), len(path) - 1)]
+        # wait for streamed chunks, so frames do not depend on loading speed
+        scene.streamer.update(pos, blocking=True)
+        scene.before_render()
+        start = time.perf_counter()
+        draw(scene, interface, Camera(pos, direction))
+        submitted = time.perf_counter()
+        calls = counter.reset()
+        GL.glFinish()
+        finished = time.perf_counter()
+        if frame < 0:
+            continue
+        frame_ms.append((finished - start) * 1000.0)
+        cpu_ms.append((submitted - start) * 1000.0)
+        for name, count in calls.items():
+            gl_calls[name] = gl_calls.get(name, 0) + count
+        if frame % args.reference_every == 0 or frame == args.frames - 1:
+            counter.uninstall()
+            pixels = context.read_pixels()
+            checksums[str(frame)] = hashlib.sha256(pixels.tobytes()).hexdigest()[:16]
+            frames[frame] = pixels.copy()
+            counter.install()
+    counter.uninstall()
+    app_state().frame_capture.stop()
+    # collect GPU timings of the last frames in flight
+    for _ in range(profiler.FRAMES_IN_FLIGHT):
+        profiler.begin_frame()
+    passes = {name: {'cpu_ms': timing.cpu_ms, 'gpu_ms': timing.gpu_ms,
+                        'gl_calls': gl_calls.get(name, 0) / args.frames}
+                for name, timing in profiler.timings().items()}
+    report = {'renderer': GL.glGetString(GL.GL_RENDERER).decode('utf-8', 'replace'),
+                'resolution': list(size), 'scene': args.scene, 'frames': args.frames,
+                'frame_ms': frame_stats(frame_ms), 'cpu_ms': frame_stats(cpu_ms),
+                'passes': passes,
+                'gl_calls_per_frame': sum(gl_calls.values()) / args.frames,
+                'gl_calls_outside_passes': gl_calls.get(NO_PASS, 0) / args.frames,
+                'draw_stats': scene.draw_stats(),
+                'capture': dict(app_state().frame_capture.stats),
+                'blur_quality': renderer.BLUR_QUALITY,
+                'blur': renderer.blur_report(),
+                'checksums': checksums}
+    interface = None
+    scene = None
+    delete_app_state()
+    pg.quit()
+    context.destroy()
+    return report, frames
+
+def print_report(report: Dict) -> None:
+    """Print report as a table."""
+    print(f'{report["renderer"]}, {report["resolution"][0]}x{report["resolution"][1]}, '
+            f'{report["frames"]} frames of {report["scene"]}')
+    print(f'{"pass":<24}{"CPU ms":>10}{"GPU ms":>10}{"GL calls":>10}')
+    for name, timing in report['passes'].items():
+        print(f'{name:<24}{timing["cpu_ms"]:>10.3f}{timing["gpu_ms"]:>10.3f}'
+                f'{timing["gl_calls"]:>10.1f}')
+    for name in ['frame_ms', 'cpu_ms']:
+        stats = report[name]
+        print(f'{name}: mean {stats["mean"]:.3f}, median {stats["median"]:.3f}, '
+                f'p95 {stats["p95"]:.3f}, max {stats["max"]:.3f}')
+    print(f'GL calls per frame: {report["gl_calls_per_frame"]:.1f} '
+            f'({report["gl_calls_outside_passes"]:.1f} outside passes)')
+    for name, stats in report['draw_stats'].items():
+        changes = ', '.join(f'{key} {stats[key + "_unsorted"]} -> {stats[key]}'
+                            for key in ['program', 'texture', 'mesh', 'vao'] if key in stats)
+        print(f'{name} pass: {stats.get("draws", 0)} draws, state changes {changes}, '
+                f'{stats.get("records", 0)} records, {stats.get("replays", 0)} replays')
+    for preset, timings in report['blur'].items():
+        print(f'Blur {preset}: ' + ', '.join(f'{name} {gpu_ms:.3f}'
+                                                for name, gpu_ms in timings.items()) + ' GPU ms')
+    capture = report['capture']
+    if capture['captured'] + capture['dropped'] > 0:
+        print(f'Capture: {capture["captured"]} frames captured, {capture["encoded"]} encoded, '
+                f'{capture["dropped"]} dropped')
+
+def main(argv: List[str] = None) -> int:
+    """Run benchmark, return process exit code."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    os.environ['PYOPENGL_PLATFORM'] = args.platform
+    if args.platform == 'egl':
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    try:
+        report, frames = run(args)
+    except RuntimeError as error:
+        print(f'Benchmark failed: {error}')
+        return 2
+    print_report(report)
+    failed = False
+    if args.save_reference:
+        save_reference(args.save_reference, report, frames)
+    if args.check_reference:
+        mismatched = check_reference(args.check_reference, report, frames, args.max_diff)
+        if len(report['frame_diff']) > 0:
+            print('Largest channel difference from reference:',
+                    max(report['frame_diff'].values()))
+        if len(mismatched) > 0:
+            print('Frames differ from reference:', ', '.join(str(frame) for frame in mismatched))
+            failed = True
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)['frame_ms']['mean']
+        if report['frame_ms']['mean'] > baseline * (1.0 + args.tolerance):
+            print(f'Mean frame time {report["frame_ms"]["mean"]:.3f} ms is slower than '
+                    f'baseline {baseline:.3f} ms by more than {args.tolerance * 100:.0f}%')
+            failed = True
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=4)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,19 @@
-"""Module containing debug render processor for ECS and assosiated components."""
+"""Module containing debug render processors for ECS and assosiated components."""
 
 
+import ctypes
 from dataclasses import dataclass
-from typing import Tuple
+from typing import List, Tuple
 
 import esper
+import numpy as np
 import pygame
+from OpenGL import GL
+from OpenGL.GL import shaders
 
 from ..physics import aabb
+from ..physics import collision
+from ..physics import velocity
 
 
 @dataclass
@@ -38,3 +44,164 @@ class RenderProcessor(esper.Processor):
             rect = pygame.Rect(*box.pos, *box.dim)
 
             self.screen.blit(surface, rect)
+
+
+# Instance data of one debug primitive: rectangle (x, y, width, height) or
+# segment (x, y, dx, dy) in screen pixels and RGB color in [0, 1]
+INSTANCE_FLOATS = 7
+
+BROAD_PHASE_COLOR = (1.0, 1.0, 0.0)
+CONTACT_COLOR = (1.0, 0.0, 1.0)
+CONTACT_NORMAL_LENGTH = 30.0
+
+VERTEX_SHADER = """
+#version 430 core
+
+layout(location = 0) in vec4 rect;
+layout(location = 1) in vec3 color;
+
+// 0 - filled rectangles, 1 - rectangle outlines, 2 - segments
+uniform int mode;
+uniform vec2 screen_size;
+
+out vec3 vert_color;
+
+void main()
+{
+    vec2 fill[6] = vec2[6](vec2(0, 0), vec2(0, 1), vec2(1, 1), vec2(0, 0), vec2(1, 1), vec2(1, 0));
+    vec2 outline[8] = vec2[8](vec2(0, 0), vec2(1, 0), vec2(1, 0), vec2(1, 1),
+                                vec2(1, 1), vec2(0, 1), vec2(0, 1), vec2(0, 0));
+    vec2 corner;
+    if (mode == 0)
+        corner = fill[gl_VertexID];
+    else if (mode == 1)
+        corner = outline[gl_VertexID];
+    else
+        corner = vec2(gl_VertexID);
+    vec2 pixel = rect.xy + rect.zw * corner;
+    vec2 ndc = pixel / screen_size * 2.0 - 1.0;
+    gl_Position = vec4(ndc.x, -ndc.y, 0, 1);
+    vert_color = color;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 430 core
+
+in vec3 vert_color;
+
+out vec4 color;
+
+void main()
+{
+    color = vec4(vert_color, 1.0);
+}
+"""
+
+# vertices per instance and primitive type for every mode
+MODES = [(6, GL.GL_TRIANGLES), (8, GL.GL_LINES), (2, GL.GL_LINES)]
+
+
+def collect_instances(world: esper.World, fill: bool = True,
+                      show_broad_phase: bool = False,
+                      show_contacts: bool = False) -> Tuple[np.ndarray, List[int]]:
+    """Gather debug primitives of all entities into one array.
+
+    Returns instance data and number of instances of every mode: boxes
+    (filled or outlined), broad phase boxes outlines and contact normals.
+    """
+    boxes = [(*box.pos, *box.dim, *(channel / 255.0 for channel in color.color))
+             for _, (box, color) in world.get_components(aabb.AABBComponent, ColorComponent)]
+    broad = []
+    if show_broad_phase:
+        for _, (box, vel, _) in world.get_components(aabb.AABBComponent,
+                                                     velocity.VelocityComponent,
+                                                     collision.ActiveCollisionComponent):
+            broad_box = aabb.broad_box(box, vel)
+            broad.append((*broad_box.pos, *broad_box.dim, *BROAD_PHASE_COLOR))
+    contacts = []
+    if show_contacts:
+        for _, (box, col) in world.get_components(aabb.AABBComponent,
+                                                  collision.CollisionComponent):
+            if col.time < 1.0:
+                center = box.pos + box.dim * 0.5
+                contacts.append((*center, *(col.normal * CONTACT_NORMAL_LENGTH),
+                                 *CONTACT_COLOR))
+    instances = np.array(boxes + broad + contacts, dtype=np.float32).reshape(-1, INSTANCE_FLOATS)
+    if fill:
+        return instances, [len(boxes), len(broad), len(contacts)]
+    return instances, [0, len(boxes) + len(broad), len(contacts)]
+
+
+class GLRenderProcessor(esper.Processor):
+    """OpenGL render processor for ECS.
+
+    All AABBs are packed into one instance buffer each frame and drawn with at most
+    one instanced call per primitive type, so cost of GL calls does not grow with
+    entity count. Requires current OpenGL 4.3 context.
+    """
+
+    def __init__(self, screen_size: Tuple[int, int], fill: bool = True,
+                 show_broad_phase: bool = False, show_contacts: bool = False):
+        """Initialize debug renderer, compile shaders and create buffers."""
+        self.screen_size = screen_size
+        self.fill = fill
+        self.show_broad_phase = show_broad_phase
+        self.show_contacts = show_contacts
+        self.program = shaders.compileProgram(
+            shaders.compileShader(VERTEX_SHADER, GL.GL_VERTEX_SHADER),
+            shaders.compileShader(FRAGMENT_SHADER, GL.GL_FRAGMENT_SHADER))
+        self.mode_location = GL.glGetUniformLocation(self.program, 'mode')
+        self.screen_size_location = GL.glGetUniformLocation(self.program, 'screen_size')
+        self.capacity = 0
+        self.vao = GL.glGenVertexArrays(1)
+        self.vbo = GL.glGenBuffers(1)
+        GL.glBindVertexArray(self.vao)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        stride = INSTANCE_FLOATS * 4
+        GL.glEnableVertexAttribArray(0)
+        GL.glVertexAttribPointer(0, 4, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(0))
+        GL.glVertexAttribDivisor(0, 1)
+        GL.glEnableVertexAttribArray(1)
+        GL.glVertexAttribPointer(1, 3, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(16))
+        GL.glVertexAttribDivisor(1, 1)
+        GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def process(self, *_):
+        """Render AABB components and enabled overlays with OpenGL."""
+        GL.glClearColor(0.0, 0.0, 0.0, 1.0)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+
+        instances, counts = collect_instances(self.world, self.fill, self.show_broad_phase,
+                                              self.show_contacts)
+        if len(instances) == 0:
+            return
+
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        if len(instances) > self.capacity:
+            self.capacity = max(len(instances), 2 * self.capacity)
+        # orphan previous storage, so upload does not wait for previous frame
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, self.capacity * INSTANCE_FLOATS * 4, None,
+                        GL.GL_STREAM_DRAW)
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, instances.nbytes, instances)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+        GL.glUseProgram(self.program)
+        GL.glUniform2f(self.screen_size_location, *self.screen_size)
+        GL.glBindVertexArray(self.vao)
+        first = 0
+        for mode, count in enumerate(counts):
+            if count > 0:
+                vertices, primitive = MODES[mode]
+                GL.glUniform1i(self.mode_location, mode)
+                GL.glDrawArraysInstancedBaseInstance(primitive, 0, vertices, count, first)
+            first += count
+        GL.glBindVertexArray(0)
+        GL.glUseProgram(0)
+
+    def __del__(self):
+        """Delete OpenGL objects."""
+        GL.glDeleteBuffers(1, [self.vbo])
+        GL.glDeleteVertexArrays(1, [self.vao])
+        GL.glDeleteProgram(self.program)
@@ -0,0 +1,45 @@
+"""Debug test is responsible for testing collection of debug render primitives."""
+
+import unittest
+import esper
+from .debug import renderer
+from .physics import aabb
+from .physics import collision
+from .physics import velocity
+
+
+
+class DebugInstancesTest(unittest.TestCase):
+    """Test class for validating instance data of GL debug renderer."""
+
+    def setUp(self):
+        """Create world with one static and one moving colliding box."""
+        self.world = esper.World()
+        self.world.create_entity(aabb.AABBComponent([10, 20], [30, 40]),
+                                 renderer.ColorComponent((255, 0, 0)))
+        self.world.create_entity(aabb.AABBComponent([0, 0], [2, 2]),
+                                 renderer.ColorComponent((0, 255, 0)),
+                                 collision.ActiveCollisionComponent(),
+                                 velocity.VelocityComponent([4, 0]),
+                                 collision.CollisionComponent(0.5, [-1, 0]))
+
+    def test_boxes(self):
+        """Checking that boxes are packed with normalized colors."""
+        instances, counts = renderer.collect_instances(self.world)
+        self.assertEqual(counts, [2, 0, 0])
+        self.assertEqual(instances.shape, (2, renderer.INSTANCE_FLOATS))
+        self.assertEqual(list(instances[0]), [10.0, 20.0, 30.0, 40.0, 1.0, 0.0, 0.0])
+
+    def test_outlines(self):
+        """Checking that outline mode moves boxes to outline primitives."""
+        _, counts = renderer.collect_instances(self.world, fill=False)
+        self.assertEqual(counts, [0, 2, 0])
+
+    def test_overlays(self):
+        """Checking broad phase boxes and contact normals."""
+        instances, counts = renderer.collect_instances(self.world, show_broad_phase=True,
+                                                       show_contacts=True)
+        self.assertEqual(counts, [2, 1, 1])
+        self.assertEqual(list(instances[2][:4]), [0.0, 0.0, 6.0, 2.0])
+        self.assertEqual(list(instances[3][:4]),
+                         [1.0, 1.0, -renderer.CONTACT_NORMAL_LENGTH, 0.0])
@@ -0,0 +1,50 @@
+"""Draw list test is responsible for testing state sorting of draws."""
+
+import unittest
+from types import SimpleNamespace
+from .render.drawlist import DrawItem, DrawList, state_changes
+
+
+
+def item(texture: str, mesh_name: str, depth: float, index: int,
+         vaos: dict = None) -> DrawItem:
+    """Get draw of mesh which vertex array is looked up by its name."""
+    vao = (vaos or {}).get(mesh_name, hash(mesh_name))
+    return DrawItem('mesh_render', texture, mesh_name, SimpleNamespace(vao=vao), 0, depth, index)
+
+
+class DrawListTest(unittest.TestCase):
+    """Testing draw order and state change counts."""
+
+    def test_state_grouping(self):
+        """Draws with the same texture and mesh become consecutive."""
+        draws = DrawList()
+        for i, (texture, mesh) in enumerate([('a', 'x'), ('b', 'y'), ('a', 'y'),
+                                             ('b', 'x'), ('a', 'x'), ('b', 'y')]):
+            draws.add(item(texture, mesh, float(i), i))
+        items = draws.sort()
+        self.assertEqual([(draw.texture, draw.mesh_name) for draw in items],
+                         [('a', 'x'), ('a', 'x'), ('a', 'y'), ('b', 'x'), ('b', 'y'), ('b', 'y')])
+        self.assertEqual(draws.stats['texture_unsorted'], 6)
+        self.assertEqual(draws.stats['texture'], 2)
+        self.assertEqual(draws.stats['mesh_unsorted'], 4)
+        self.assertEqual(draws.stats['mesh'], 4)
+
+    def test_front_to_back(self):
+        """Draws with the same state are ordered by depth, nearest first."""
+        draws = DrawList()
+        for i, depth in enumerate([3.0, -1.0, 2.0, 0.5]):
+            draws.add(item('a', 'x', depth, i))
+        self.assertEqual([draw.index for draw in draws.sort()], [1, 3, 2, 0])
+
+    def test_shared_vertex_array(self):
+        """Mesh switches inside merged geometry do not change vertex array."""
+        vaos = {'x': 1, 'y': 1}
+        items = [item('a', 'x', 0.0, 0, vaos), item('a', 'y', 0.0, 1, vaos),
+                 item('a', 'x', 0.0, 2, vaos)]
+        self.assertEqual(state_changes(items), {'program': 1, 'texture': 1, 'mesh': 3, 'vao': 1})
+        self.assertEqual(state_changes([]), {'program': 0, 'texture': 0, 'mesh': 0, 'vao': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Dynamic resolution test is responsible for testing render scale controller."""
+
+import unittest
+from .render.dynres import DynamicResolution
+
+
+class DynamicResolutionTest(unittest.TestCase):
+    """Test class for validating DynamicResolution."""
+
+    def test_scale_down(self):
+        """Checking scale goes down while frame time is over budget."""
+        controller = DynamicResolution(target_ms=16.0, history=4)
+        for _ in range(3):
+            self.assertFalse(controller.update(20.0))
+        self.assertTrue(controller.update(20.0))
+        self.assertEqual(controller.scale, 0.875)
+        for _ in range(100):
+            controller.update(40.0)
+        self.assertEqual(controller.scale, controller.min_scale)
+
+    def test_scale_up(self):
+        """Checking scale goes up with enough headroom and stays in bounds."""
+        controller = DynamicResolution(target_ms=16.0, history=4)
+        controller.scale = 0.5
+        for _ in range(100):
+            controller.update(5.0)
+        self.assertEqual(controller.scale, controller.max_scale)
+
+    def test_hysteresis(self):
+        """Checking scale is stable when frame time is between headroom and budget."""
+        controller = DynamicResolution(target_ms=16.0, history=4, headroom=0.8)
+        controller.scale = 0.75
+        for _ in range(100):
+            self.assertFalse(controller.update(14.0))
+        self.assertEqual(controller.scale, 0.75)
+
+    def test_quantized_resolution(self):
+        """Checking internal resolution."""
+        controller = DynamicResolution()
+        self.assertEqual(controller.scaled((1920, 1080)), (1920, 1080))
+        controller.scale = 0.625
+        self.assertEqual(controller.scaled((1920, 1080)), (1200, 675))
+        controller.enabled = False
+        self.assertEqual(controller.scaled((1920, 1080)), (1920, 1080))
+
+    def test_settled(self):
+        """Checking settled is reported once after scale change."""
+        controller = DynamicResolution(history=1, settle_frames=3)
+        self.assertTrue(controller.update(100.0))
+        reports = []
+        for _ in range(5):
+            controller.update(15.0)
+            reports.append(controller.settled())
+        self.assertEqual(reports, [False, False, True, False, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
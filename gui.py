@@ -1,10 +1,13 @@
 """GUI elements and related stuff."""
+import ctypes
 from dataclasses import dataclass
 from typing import Callable, Tuple, List
 from OpenGL import GL
+import numpy as np
 import pygame as pg
 import glm
 from app_state import app_state
+from render.ringbuffer import RECT_BLOCK
 
 class BaseUIElem:
     """Base UI elem that can be placed inside a button."""
@@ -16,60 +19,39 @@ class BaseUIElem:
         """Render element at position."""
 
 class TextRect(BaseUIElem):
-    """Rectangle with specified text."""
+    """Rectangle with specified text. Glyphs are taken from shared atlas."""
 
-    def __init__(self, text: str, font: pg.font.Font,
+    def __init__(self, text: str, font_size: int,
                 color: Tuple[int,int,int,int] = (255, 255, 255, 255),
-                size:Tuple[float,float] = None):
-        """Render text with font and create texture."""
-        text_surface = font.render(text, True, color)
-        intermediate_alpha_surface = pg.Surface((text_surface.get_width(),
-                                        text_surface.get_height()), pg.SRCALPHA)
-        intermediate_alpha_surface.fill(pg.Color((0,0,0,0)))
-        font_rect = text_surface.get_rect()
-        font_rect.center = (text_surface.get_width() // 2, text_surface.get_height() // 2)
-        intermediate_alpha_surface.blit(text_surface, font_rect)
-        text_data = pg.image.tostring(intermediate_alpha_surface, "RGBA", True)
-        self.tex_id = GL.glGenTextures(1)
-        GL.glActiveTexture(GL.GL_TEXTURE0)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.tex_id)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_R, GL.GL_CLAMP_TO_EDGE)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
-        self.width = text_surface.get_width()
-        self.height = text_surface.get_height()
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, self.width, self.height, 0,
-                                            GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, text_data)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
-        self.width /= app_state().screen_res[0]
-        self.height /= app_state().screen_res[1]
-        if size is not None:
-            self.width = size[0]
-            self.height = size[1]
+                size:Tuple[float,float] = None, font_name: str = 'arial'):
+        """Lay out text with cached font."""
+        self.font_size = font_size
+        self.font_name = font_name
+        self.color = color
+        self.size = size
+        self.set_text(text)
+    def set_text(self, text: str) -> None:
+        """Change text, no textures are created."""
+        self.text = text
+        self.layout = app_state().text_renderer.layout(text, self.font_name, self.font_size,
+                                                        self.color)
+        self.width = self.layout.size[0] / app_state().screen_res[0]
+        self.height = self.layout.size[1] / app_state().screen_res[1]
+        if self.size is not None:
+            self.width = self.size[0]
+            self.height = self.size[1]
     def get_relative_size(self) -> Tuple[float, float]:
         """Get size of the rectangle as fraction of screen size."""
         return (self.width, self.height)
     def render(self, pos: Tuple[float, float]) -> None:
-        """Render rectangle with center at specified position."""
-        app_state().shader_manager.use_program('tex_rect')
-        blend = GL.glGetBooleanv(GL.GL_BLEND)
-        blend_src = GL.glGetIntegerv(GL.GL_BLEND_SRC_ALPHA)
-        blend_dst = GL.glGetIntegerv(GL.GL_BLEND_DST_ALPHA)
-        GL.glEnable(GL.GL_BLEND)
-        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
-        GL.glUniform4f(app_state().shader_manager.get_uniform('pos_size'),
-                        pos[0], 1.0-pos[1], *self.get_relative_size())
-        app_state().shader_manager.set_texture('source', self.tex_id)
-        app_state().mesh_manager.draw_quad()
-        if not blend:
-            GL.glDisable(GL.GL_BLEND)
-        else:
-            GL.glBlendFunc(blend_src, blend_dst)
-    def __del__(self):
-        """Delete texture."""
-        GL.glDeleteTextures(1, [self.tex_id])
+        """Queue text with center at specified position, it is drawn with the rest of text."""
+        screen_res = app_state().screen_res
+        scale = (1.0, 1.0)
+        if self.size is not None and self.layout.size[0] > 0:
+            scale = (self.width * screen_res[0] / self.layout.size[0],
+                        self.height * screen_res[1] / self.layout.size[1])
+        app_state().text_renderer.add(self.layout, (pos[0] * screen_res[0],
+                                                    pos[1] * screen_res[1]), scale)
 
 class TexturedRect(BaseUIElem):
     """Rectangle with specified texture."""
@@ -91,8 +73,9 @@ class TexturedRect(BaseUIElem):
         blend_dst = GL.glGetIntegerv(GL.GL_BLEND_DST_ALPHA)
         GL.glEnable(GL.GL_BLEND)
         GL.glBlendFunc(GL.GL_ONE_MINUS_SRC_ALPHA, GL.GL_SRC_ALPHA)
-        GL.glUniform4f(app_state().shader_manager.get_uniform('pos_size'),
-                        pos[0], 1.0-pos[1], *self.get_relative_size())
+        offset, rect = app_state().frame_data.alloc((4,))
+        rect[:] = (pos[0], 1.0-pos[1], *self.get_relative_size())
+        app_state().frame_data.bind_range(GL.GL_UNIFORM_BUFFER, RECT_BLOCK, offset, rect.nbytes)
         app_state().shader_manager.set_texture('source', self.tex_id)
         app_state().mesh_manager.draw_quad()
         if not blend:
@@ -129,25 +112,13 @@ class Button:
         self.callback = callback
         self.pos = (pos_size[0], pos_size[1])
 
-    def render(self, background_tex: int) -> None:
-        """Render button."""
-        app_state().shader_manager.use_program('button_background')
-        GL.glUniform4f(app_state().shader_manager.get_uniform('pos_size'),
-                            self.pos[0], 1.0 - self.pos[1], *self.size)
-        if self.mouse_over():
-            GL.glUniform3f(app_state().shader_manager.get_uniform('background_color'),
-                                *self.descr.pressed_color)
-        else:
-            GL.glUniform3f(app_state().shader_manager.get_uniform('background_color'),
-                                *self.descr.background_color)
-        GL.glUniform3f(app_state().shader_manager.get_uniform('frame_color'),
-                                *self.descr.frame_color)
-        GL.glUniform2f(app_state().shader_manager.get_uniform('screen_size'),
-                                *app_state().screen_res)
-        GL.glUniform1f(app_state().shader_manager.get_uniform('frame'), self.frame_pix)
-        GL.glUniform1f(app_state().shader_manager.get_uniform('corner'), self.corner_pix)
-        app_state().shader_manager.set_texture('source', background_tex)
-        app_state().mesh_manager.draw_quad()
+    def instances(self) -> List[Tuple[float, ...]]:
+        """Get per-instance data of button background for WidgetBatch."""
+        color = self.descr.pressed_color if self.mouse_over() else self.descr.background_color
+        return [(self.pos[0], 1.0 - self.pos[1], *self.size, *color, *self.descr.frame_color,
+                    self.frame_pix, self.corner_pix)]
+    def render_content(self) -> None:
+        """Render inner element, background is rendered by WidgetBatch."""
         self.elem.render(self.pos)
     def mouse_over(self) -> bool:
         """Check if mouse is over button."""
@@ -185,39 +156,32 @@ class SliderDescr:
 class Slider:
     """GUI slider element. Supports both rendering and user interaction."""
 
-    def __init__(self, s_descr: SliderDescr, pos: Tuple[float, float], state: float = 0.5,
+    def __init__(self, s_descr: SliderDescr, pos: Tuple[float, float], value: float = 0.5,
                 callback: Callable = None):
-        """Create slider."""
+        """Create slider with value in [0, 1] range."""
         self.frame_pix = s_descr.frame_size * app_state().screen_res[0]
         self.corner_pix = s_descr.corner_r * app_state().screen_res[0]
         self.descr = s_descr
         self.callback = callback
         self.pos = pos
         self.size = s_descr.size
-        self.state = state
-    def render(self, background_tex: int) -> None:
-        """Render slider."""
-        app_state().shader_manager.use_program('button_background')
-        GL.glUniform4f(app_state().shader_manager.get_uniform('pos_size'),
-                            self.pos[0], 1.0 - self.pos[1], *self.size)
-        GL.glUniform3f(app_state().shader_manager.get_uniform('background_color'),
-                            *self.descr.frame_color)
-        GL.glUniform3f(app_state().shader_manager.get_uniform('frame_color'),
-                            *self.descr.frame_color)
-        GL.glUniform2f(app_state().shader_manager.get_uniform('screen_size'),
-                            *app_state().screen_res)
-        GL.glUniform1f(app_state().shader_manager.get_uniform('frame'), self.frame_pix)
-        GL.glUniform1f(app_state().shader_manager.get_uniform('corner'), self.corner_pix)
-        app_state().shader_manager.set_texture('source', background_tex)
-        app_state().mesh_manager.draw_quad()
-        GL.glUniform4f(app_state().shader_manager.get_uniform('pos_size'),
-                        self.pos[0] + (self.state - 0.5) * self.size[0],
-                        1.0 - self.pos[1],
-                        self.size[0] * self.descr.inner_fract[0],
-                        self.size[1] * self.descr.inner_fract[1])
-        GL.glUniform3f(app_state().shader_manager.get_uniform('background_color'),
-                            *self.descr.background_color)
-        app_state().mesh_manager.draw_quad()
+        self.set_value(value)
+    def set_value(self, value: float) -> None:
+        """Move slider to value in [0, 1] range, callback is not called."""
+        half_inner = self.descr.inner_fract[0] * 0.5
+        self.state = half_inner + min(max(value, 0.0), 1.0) * (1.0 - 2.0 * half_inner)
+    def get_value(self) -> float:
+        """Get value in [0, 1] range, the same as passed to callback."""
+        return (self.state - self.descr.inner_fract[0] * 0.5) / (1.0 - self.descr.inner_fract[0])
+    def instances(self) -> List[Tuple[float, ...]]:
+        """Get per-instance data of slider track and knob for WidgetBatch."""
+        frame_corner = (self.frame_pix, self.corner_pix)
+        return [(self.pos[0], 1.0 - self.pos[1], *self.size, *self.descr.frame_color,
+                    *self.descr.frame_color, *frame_corner),
+                (self.pos[0] + (self.state - 0.5) * self.size[0], 1.0 - self.pos[1],
+                    self.size[0] * self.descr.inner_fract[0],
+                    self.size[1] * self.descr.inner_fract[1],
+                    *self.descr.background_color, *self.descr.frame_color, *frame_corner)]
     def process_input(self) -> None:
         """Update slider if user interacts with it."""
         x_pos, y_pos = pg.mouse.get_pos()
@@ -235,5 +199,105 @@ class Slider:
             elif self.state > 1.0 - self.descr.inner_fract[0] * 0.5:
                 self.state = 1.0 - self.descr.inner_fract[0] * 0.5
             if self.callback is not None:
-                self.callback((self.state - self.descr.inner_fract[0] * 0.5)
-                                / (1.0 - self.descr.inner_fract[0]))
+                self.callback(self.get_value())
+
+class WidgetBatch:
+    """Backgrounds of buttons and sliders drawn with one instanced call.
+
+    Instance buffer is uploaded only when instance data changes,
+    i.e. when hover state or slider position is changed.
+    """
+
+    # pos_size, background color, frame color, frame and corner sizes in pixels
+    INSTANCE_FLOATS = 12
+
+    def __init__(self):
+        """Create empty batch, OpenGL objects are created on first render."""
+        self.vao = None
+        self.vbo = None
+        self.uploaded = None
+    def _create(self) -> None:
+        """Create vertex array with per-instance attributes."""
+        self.vao = GL.glGenVertexArrays(1)
+        self.vbo = GL.glGenBuffers(1)
+        GL.glBindVertexArray(self.vao)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        stride = self.INSTANCE_FLOATS * 4
+        offset = 0
+        for location, components in enumerate([4, 3, 3, 2]):
+            GL.glEnableVertexAttribArray(location)
+            GL.glVertexAttribPointer(location, components, GL.GL_FLOAT, GL.GL_FALSE, stride,
+                                        ctypes.c_void_p(offset))
+            GL.glVertexAttribDivisor(location, 1)
+            offset += components * 4
+        GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+    def render(self, buttons: List[Button], sliders: List[Slider], background_tex: int) -> None:
+        """Render backgrounds of all widgets over background_tex, then their content."""
+        instances = []
+        for widget in buttons + sliders:
+            instances += widget.instances()
+        if len(instances) == 0:
+            return
+        if self.vao is None:
+            self._create()
+        if instances != self.uploaded:
+            data = np.array(instances, dtype=np.float32)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, data.nbytes, data, GL.GL_DYNAMIC_DRAW)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+            self.uploaded = instances
+        app_state().shader_manager.use_program('button_background_instanced')
+        GL.glUniform2f(app_state().shader_manager.get_uniform('screen_size'),
+                        *app_state().screen_res)
+        app_state().shader_manager.set_texture('source', background_tex)
+        GL.glBindVertexArray(self.vao)
+        GL.glDrawArraysInstanced(GL.GL_TRIANGLES, 0, 6, len(instances))
+        GL.glBindVertexArray(0)
+        for button in buttons:
+            button.render_content()
+    def __del__(self):
+        """Delete instance buffer and vertex array."""
+        if self.vao is not None:
+            GL.glDeleteBuffers(1, [self.vbo])
+            GL.glDeleteVertexArrays(1, [self.vao])
+
+class ProfilerOverlay:
+    """Text overlay with CPU and GPU time of every render pass."""
+
+    REFRESH_PERIOD = 0.5
+    FONT = 'consolas,couriernew,monospace'
+
+    def __init__(self, font_size: int = 18, color: Tuple[int,int,int,int] = (255, 255, 0, 255)):
+        """Create overlay, text is rebuilt every REFRESH_PERIOD seconds."""
+        self.font_size = font_size
+        self.color = color
+        self.lines = []
+        self.last_update = None
+    def update(self) -> None:
+        """Rebuild text from current profiler timings."""
+        timings = app_state().profiler.timings()
+        total_cpu = sum(timing.cpu_ms for timing in timings.values())
+        total_gpu = sum(timing.gpu_ms for timing in timings.values())
+        text = [f'{"pass":<16}{"cpu ms":>8}{"gpu ms":>8}']
+        text += [f'{name:<16}{timing.cpu_ms:>8.2f}{timing.gpu_ms:>8.2f}'
+                    for name, timing in timings.items()]
+        text.append(f'{"total":<16}{total_cpu:>8.2f}{total_gpu:>8.2f}')
+        for i, line in enumerate(text):
+            if i < len(self.lines):
+                self.lines[i].set_text(line)
+            else:
+                self.lines.append(TextRect(line, self.font_size, self.color,
+                                            font_name=self.FONT))
+        del self.lines[len(text):]
+    def render(self) -> None:
+        """Render overlay at top left corner of the screen."""
+        now = pg.time.get_ticks() / 1000.0
+        if self.last_update is None or now - self.last_update > self.REFRESH_PERIOD:
+            self.last_update = now
+            self.update()
+        y_pos = 0.01
+        for line in self.lines:
+            width, height = line.get_relative_size()
+            line.render((0.01 + width * 0.5, y_pos + height * 0.5))
+            y_pos += height
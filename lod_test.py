@@ -0,0 +1,51 @@
+"""LOD test is responsible for testing mesh simplification and LOD selection."""
+
+import unittest
+import numpy as np
+from .render.lod import simplify, build_lods, select_lod
+
+
+
+def sphere(rings: int, segments: int) -> np.ndarray:
+    """Get triangle list of unit UV sphere with normal and position per vertex."""
+    theta = np.linspace(0.0, np.pi, rings + 1)
+    phi = np.linspace(0.0, 2.0 * np.pi, segments + 1)
+    points = np.stack([np.outer(np.sin(theta), np.cos(phi)),
+                       np.outer(np.cos(theta), np.ones_like(phi)),
+                       np.outer(np.sin(theta), np.sin(phi))], axis=-1)
+    triangles = []
+    for i in range(rings):
+        for j in range(segments):
+            quad = [points[i, j], points[i + 1, j], points[i + 1, j + 1], points[i, j + 1]]
+            triangles += [quad[0], quad[1], quad[2], quad[0], quad[2], quad[3]]
+    positions = np.array(triangles)
+    return np.concatenate([positions, positions], axis=1).reshape(-1).astype(np.float32)
+
+
+class LODTest(unittest.TestCase):
+    """Test class for validating LOD generation."""
+
+    def test_simplify(self):
+        """Checking that simplified sphere has less triangles and keeps its shape."""
+        vertices = sphere(32, 64)
+        simplified = simplify(vertices, 6, 8).reshape(-1, 6)
+        self.assertLess(len(simplified), len(vertices) // 6 // 4)
+        self.assertEqual(len(simplified) % 3, 0)
+        radii = np.linalg.norm(simplified[:, 3:], axis=1)
+        self.assertLess(np.abs(radii - 1.0).max(), 0.15)
+
+    def test_chain(self):
+        """Checking that every LOD is smaller than the previous one."""
+        lods = build_lods(sphere(32, 64), 6)
+        self.assertGreater(len(lods), 1)
+        for finer, coarser in zip(lods, lods[1:]):
+            self.assertLess(len(coarser), len(finer))
+
+    def test_select(self):
+        """Checking LOD choice by projected size."""
+        thresholds = [0.3, 0.1]
+        self.assertEqual(select_lod(0.5, thresholds, 3), 0)
+        self.assertEqual(select_lod(0.2, thresholds, 3), 1)
+        self.assertEqual(select_lod(0.01, thresholds, 3), 2)
+        self.assertEqual(select_lod(0.01, thresholds, 2), 1)
+        self.assertEqual(select_lod(0.01, thresholds, 1), 0)
@@ -1,19 +1,19 @@
 import glm
 from math import sin, cos
 from app_state import app_state, init_app_state, delete_app_state
-from render.shaders import ShaderManager
-from ui_descr import menu_ui, pause_ui, game_ui
+from ui_descr import menu_ui, pause_ui, game_ui, UICache, UI
 from scene import Scene, Light, Camera
 from renderer import draw
 from audiomanager import AudioManager
+from audioqueue import AudioCommandQueue
 import pygame as pg
 
 
 def sound_callback(l: float):
-    AudioManager().set_sounds_volume(l)
+    audio.set_sounds_volume(l)
     print('Sound', l)
 def music_callback(l: float):
-    AudioManager().set_background_volume(l)
+    audio.set_background_volume(l)
     print('Music', l)
 
 
@@ -30,21 +30,21 @@ should_stop = False
 
 def exit_callback():
     if click_sound_handle != -1:
-        AudioManager().play_sound(click_sound_handle)
+        audio.play_sound(click_sound_handle)
 
     global should_stop
     should_stop = True
 
 def play_callback():
     if click_sound_handle != -1:
-        AudioManager().play_sound(click_sound_handle)
+        audio.play_sound(click_sound_handle)
 
     global cur_state
     cur_state = GAME
 
 def menu_callback():
     if click_sound_handle != -1:
-        AudioManager().play_sound(click_sound_handle)
+        audio.play_sound(click_sound_handle)
 
     global cur_state
     cur_state = MENU
@@ -74,6 +74,13 @@ def process_mouse():
     mouse_x = x
     mouse_y = y
 
+def reload_shaders(force: bool = False):
+    programs = set(app_state().shader_manager.programs)
+    app_state().shader_manager.poll_changes(force)
+    if set(app_state().shader_manager.programs) != programs:
+        # passes with optional programs are declared again
+        app_state().render_graph.clear()
+
 scene = None
 def process_keyboard():
     global cur_state
@@ -84,14 +91,12 @@ def process_keyboard():
         pos += dir * 0.001
     elif keys[pg.K_s]:
         pos -= dir * 0.001
-    elif keys[pg.K_r]:
-        app_state().shader_manager = ShaderManager('shaders')
-        scene = Scene('assets/scene.json')
     elif keys[pg.K_ESCAPE]:
         cur_state = PAUSE
 
 def logic():
     global should_stop
+    global scene
     if cur_state == GAME:
         process_keyboard()
         process_mouse()
@@ -100,14 +105,40 @@ def logic():
     for e in pg.event.get():
         if e.type == pg.QUIT:
             should_stop = True
+        elif e.type == pg.KEYDOWN and e.key == pg.K_r and cur_state == GAME:
+            reload_shaders(force=True)
+            scene = Scene('assets/scene.json')
+        elif e.type == pg.KEYDOWN and e.key == pg.K_F3:
+            app_state().profiler.overlay = not app_state().profiler.overlay
+        elif e.type == pg.KEYDOWN and e.key == pg.K_F12:
+            if app_state().frame_capture.recording:
+                app_state().frame_capture.stop()
+                print('Capture', app_state().frame_capture.stats)
+            else:
+                app_state().frame_capture.start('captures')
+        elif e.type == pg.KEYDOWN and e.key == pg.K_F11:
+            app_state().frame_capture.screenshot(f'captures/screenshot_{pg.time.get_ticks()}.png')
         else:
             for b in interface.buttons:
                 b.process_event(e)
 
+def show_ui(state: int) -> UI:
+    if state == MENU:
+        ui = ui_cache.get('menu', lambda: menu_ui(play_callback, exit_callback, music_callback, sound_callback, (audio.get_background_volume(), audio.get_sounds_volume())))
+    elif state == PAUSE:
+        ui = ui_cache.get('pause', lambda: pause_ui(play_callback, menu_callback, music_callback, sound_callback, (audio.get_background_volume(), audio.get_sounds_volume())))
+    else:
+        ui = ui_cache.get('game', game_ui)
+    if len(ui.sliders) == 2:
+        ui.sliders[0].set_value(audio.get_background_volume())
+        ui.sliders[1].set_value(audio.get_sounds_volume())
+    return ui
+
 audiomanager = AudioManager()
-audiomanager.init_sounds("sounds/", "sounds/")
-audiomanager.play_background_music("soundtrack.mp3")
-click_sound_handle = AudioManager().get_sound_handle("click_button.wav")
+audiomanager.init_sounds("sounds/", "sounds/", pcm_cache_dir=AudioManager.PCM_CACHE_DIR)
+audio = AudioCommandQueue(audiomanager)
+audio.play_background_music("soundtrack.mp3")
+click_sound_handle = audio.get_sound_handle("click_button.wav")
 
 pg.init()
 pg.display.gl_set_attribute(pg.GL_CONTEXT_MAJOR_VERSION, 4)
@@ -115,27 +146,28 @@ pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 1)
 pg.display.gl_set_attribute(pg.GL_CONTEXT_PROFILE_MASK, pg.GL_CONTEXT_PROFILE_CORE)
 pg.display.set_mode((1920, 1080), pg.OPENGL|pg.DOUBLEBUF)
 init_app_state((1920, 1080), 'shaders', 'assets/textures', 'assets/meshes')
-interface = menu_ui(play_callback, exit_callback, music_callback, sound_callback, (AudioManager().get_background_volume(), AudioManager().get_sounds_volume()))
+ui_cache = UICache()
+interface = show_ui(MENU)
 scene = Scene('assets/scene.json')
 FPS = 60
 clock = pg.time.Clock()
 while True:
     if cur_state != prev_state:
-        if cur_state == MENU:
-            interface = menu_ui(play_callback, exit_callback, music_callback, sound_callback, (AudioManager().get_background_volume(), AudioManager().get_sounds_volume()))
-        elif cur_state == PAUSE:
-            interface = pause_ui(play_callback, menu_callback, music_callback, sound_callback, (AudioManager().get_background_volume(), AudioManager().get_sounds_volume()))
-        elif cur_state == GAME:
-            interface = game_ui()
+        interface = show_ui(cur_state)
         prev_state = cur_state
     clock.tick(FPS)
+    reload_shaders()
     scene.before_render()
     # scene.add_bilboard('test.png', (0.05, 0.05), (0.1, 0.1))
     logic()
     if should_stop:
         break
     draw(scene, interface, Camera(pos, dir))
+    audio.flush()
+    app_state().dynamic_resolution.update(max(clock.get_rawtime(),
+                                            app_state().profiler.last_frame_gpu_ms))
     pg.display.flip()
 interface = None
+audio.stop()
 delete_app_state()
 pg.quit()
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""Module is responsible for keeping decoded audio on disk, so it is not decoded on every start."""
+
+import hashlib
+import mmap
+import os
+import time
+import wave
+
+from pygame import mixer
+
+
+class PCMCache:
+    """
+    Cache of decoded samples in the format of initialized mixer.
+
+    Files are keyed by hash of source file content and mixer format, so changed
+    sources and mixer settings get new entries. Sounds are stored as raw samples and
+    created from memory mapped files, music is stored as WAV which mixer.music
+    streams without decoding.
+
+    :param cache_dir: path to folder with cached files
+    :param stats: hits, misses and milliseconds spent on cold (decoding) and warm loads
+    """
+
+    HASH_CHUNK = 1024 * 1024
+
+    def __init__(self, cache_dir: str):
+        """
+        Initialize cache in a folder, the folder is created if it does not exist.
+
+        :param cache_dir: path to folder with cached files
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.stats = {'hits': 0, 'misses': 0, 'cold_ms': 0.0, 'warm_ms': 0.0}
+
+    def key(self, path: str) -> str:
+        """
+        Get cache key of a source file for current mixer format.
+
+        :param path: source file path
+
+        :return: hex digest of file content and mixer format
+        """
+        digest = hashlib.sha256(repr(mixer.get_init()).encode())
+        with open(path, 'rb') as file:
+            while chunk := file.read(self.HASH_CHUNK):
+                digest.update(chunk)
+        return digest.hexdigest()[:32]
+
+    def _write(self, path: str, data: bytes | None = None,
+               sound: mixer.Sound | None = None) -> bool:
+        """
+        Write cache file atomically, readers never see partially written file.
+
+        :param path: cache file path
+        :param data: raw samples
+        :param sound: sound written as WAV if data is None
+
+        :return: False if file could not be written, e.g. cache folder is read-only
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            if data is not None:
+                with open(tmp_path, 'wb') as file:
+                    file.write(data)
+            else:
+                frequency, sample_format, channels = mixer.get_init()
+                with wave.open(tmp_path, 'wb') as file:
+                    file.setnchannels(channels)
+                    file.setsampwidth(abs(sample_format) // 8)
+                    file.setframerate(frequency)
+                    file.writeframes(sound.get_raw())
+            os.replace(tmp_path, path)
+        except OSError as error:
+            print(f'PCM cache file {path} not written: {error}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        return True
+
+    def _count(self, hit: bool, start: float):
+        """
+        Update statistics of a load.
+
+        :param hit: load was served from cache
+        :param start: time.perf_counter() at the start of the load
+        """
+        elapsed = (time.perf_counter() - start) * 1000.0
+        if hit:
+            self.stats['hits'] += 1
+            self.stats['warm_ms'] += elapsed
+        else:
+            self.stats['misses'] += 1
+            self.stats['cold_ms'] += elapsed
+
+    def load_sound(self, path: str) -> mixer.Sound:
+        """
+        Get sound from cache, decode and store it on miss.
+
+        Unreadable source is passed to mixer, so it raises pygame.error as without cache.
+
+        :param path: source file path
+
+        :return: decoded sound
+        """
+        start = time.perf_counter()
+        try:
+            cache_path = os.path.join(self.cache_dir, self.key(path) + '.pcm')
+        except OSError:
+            return mixer.Sound(path)
+        if os.path.exists(cache_path) and os.path.getsize(cache_path) > 0:
+            with open(cache_path, 'rb') as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as samples:
+                    # samples are copied by mixer, file is not kept open
+                    sound = mixer.Sound(buffer=samples)
+            self._count(True, start)
+            return sound
+
+        sound = mixer.Sound(path)
+        self._write(cache_path, data=sound.get_raw())
+        self._count(False, start)
+        return sound
+
+    def music_file(self, path: str) -> str:
+        """
+        Get path of music transcoded to WAV, transcode it on miss.
+
+        WAV keeps only signed 16 bit samples, with other mixer formats source path is returned.
+        Source path is returned for unreadable source too, so mixer.music raises pygame.error
+        as without cache, and when WAV cannot be written.
+
+        :param path: source file path
+
+        :return: path which can be loaded by mixer.music
+        """
+        if mixer.get_init()[1] != -16:
+            return path
+        start = time.perf_counter()
+        try:
+            cache_path = os.path.join(self.cache_dir, self.key(path) + '.wav')
+        except OSError:
+            return path
+        if os.path.exists(cache_path):
+            self._count(True, start)
+            return cache_path
+
+        written = self._write(cache_path, sound=mixer.Sound(path))
+        self._count(False, start)
+        return cache_path if written else path
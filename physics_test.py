@@ -1,8 +1,11 @@
 """Game initialization and game loop."""
 
 
+import os
+
 import pygame
 import esper
+from OpenGL.error import GLError
 
 from .physics import aabb
 from .physics import ceiling_bump
@@ -14,6 +17,9 @@ from . import input_data
 from . import player
 from . import enemy
 from . import death_manager
+from . import sound_emitter
+from .audiomanager import AudioManager
+from .audioqueue import AudioCommandQueue
 
 
 # Constants
@@ -21,17 +27,43 @@ SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 GAME_NAME = "PyPlatformGame"
 FPS=60
+# debug view with OpenGL instanced draws instead of surface per AABB, needs OpenGL 4.3
+USE_GL_DEBUG_RENDERER = False
+
+
+def create_render_processor() -> esper.Processor:
+    """
+    Open window and create debug render processor for it.
+
+    OpenGL renderer falls back to surface renderer if its context or program cannot be created.
+
+    :return: render processor
+    """
+    if USE_GL_DEBUG_RENDERER:
+        try:
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 4)
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 3)
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK,
+                                            pygame.GL_CONTEXT_PROFILE_CORE)
+            pygame.display.set_mode([SCREEN_WIDTH, SCREEN_HEIGHT],
+                                    pygame.OPENGL | pygame.DOUBLEBUF)
+            return debug_renderer.GLRenderProcessor((SCREEN_WIDTH, SCREEN_HEIGHT))
+        except (pygame.error, GLError, RuntimeError) as error:
+            print(f'OpenGL debug renderer is not available, using surfaces: {error}')
+    screen = pygame.display.set_mode([SCREEN_WIDTH, SCREEN_HEIGHT])
+    return debug_renderer.RenderProcessor(screen)
+
 
 # Setup
 def main():
     """Program entry point."""
     pygame.init()
-    screen = pygame.display.set_mode([SCREEN_WIDTH, SCREEN_HEIGHT])
+    render_processor = create_render_processor()
     pygame.display.set_caption(GAME_NAME)
 
     world = esper.World()
 
-    world.add_processor(debug_renderer.RenderProcessor(screen))
+    world.add_processor(render_processor)
     world.add_processor(player.PhysicsProcessor(), priority=2)
     world.add_processor(death_manager.DeathProcessor(), priority=3)
     world.add_processor(collision.CollisionProcessor(), priority=4)
@@ -43,14 +75,20 @@ def main():
     input_entity = world.create_entity(input_data.InputComponent())
     world.add_processor(player.InputProcessor(input_entity), priority=9)
 
+    audiomanager = AudioManager()
+    sounds_folder = os.path.join(os.path.dirname(__file__), 'sounds')
+    audiomanager.init_sounds(sounds_folder, sounds_folder)
+    audio = AudioCommandQueue(audiomanager)
+
     # Player
-    world.create_entity(aabb.AABBComponent(pos=(200, 300), dim=(50, 50)),
+    player_entity = world.create_entity(aabb.AABBComponent(pos=(200, 300), dim=(50, 50)),
             debug_renderer.ColorComponent(color=(255, 0, 0)),
             collision.ActiveCollisionComponent(),
             velocity.VelocityComponent(direction=(0, 0)),
             gravity.SusceptibleToGravityComponent(),
             input_data.SusceptibleToInputComponent(),
             player.StateComponent())
+    world.add_processor(sound_emitter.SoundEmitterProcessor(audio, player_entity), priority=1)
 
     # Enemies
     world.create_entity(aabb.AABBComponent(pos=(500, 300), dim=(50, 100)),
@@ -58,7 +96,8 @@ def main():
             collision.ActiveCollisionComponent(),
             collision.HurtComponent(),
             enemy.TimerComponent(),
-            enemy.SettingsComponent(direction=(100, 0), mirror_time=2.0, mirror_axis=(1,0)))
+            enemy.SettingsComponent(direction=(100, 0), mirror_time=2.0, mirror_axis=(1,0)),
+            sound_emitter.SoundEmitterComponent(audio.get_sound_handle('pop1.wav'), volume=0.5))
 
     world.create_entity(aabb.AABBComponent(pos=(50, 50), dim=(144, 100)),
             debug_renderer.ColorComponent(color=(0, 0, 255)),
@@ -108,9 +147,11 @@ def main():
 
         # Game logic and Render
         world.process(delta_time)
+        audio.flush()
 
         pygame.display.flip()
 
+    audio.stop()
     pygame.quit()
 
 main()
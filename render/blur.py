@@ -0,0 +1,134 @@
+"""Configurable blur chains built from render graph passes."""
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+from OpenGL import GL
+from app_state import app_state
+from render.graph import RenderGraph, PassContext, SizeDescr
+
+BLUR_MODES = ['box', 'gaussian', 'kawase']
+
+@dataclass
+class BlurDescr:
+    """Blur chain description.
+
+    mode is 'box' (9 taps per iteration), 'gaussian' (separable, 5 bilinear taps
+    per direction) or 'kawase' (dual Kawase: iterations levels down and up).
+    downsample is 1, 2 or 4: blur is done at reduced resolution.
+    Consumers sample the result with linear filtering, so bilinear upsample is free.
+    Set upsample to make an explicit copy to source resolution.
+    """
+
+    mode: str = 'box'
+    downsample: int = 1
+    iterations: int = 1
+    spread: float = 1.5
+    upsample: bool = False
+
+# presets for every filtered image of the frame. 'high' is the original box filtering
+BLUR_PRESETS = {
+    'high': {
+        'shadow': BlurDescr('box', 1, 2, 1.5),
+        'dof': BlurDescr('box', 1, 1, 1.5),
+        'ssao': BlurDescr('box', 1, 1, 1.5)
+    },
+    'medium': {
+        'shadow': BlurDescr('gaussian', 1, 1, 1.0),
+        'dof': BlurDescr('gaussian', 2, 1, 1.0),
+        'ssao': BlurDescr('gaussian', 1, 1, 1.0)
+    },
+    'low': {
+        'shadow': BlurDescr('gaussian', 2, 1, 1.0),
+        'dof': BlurDescr('kawase', 2, 2, 1.0),
+        'ssao': BlurDescr('kawase', 1, 1, 1.0)
+    }
+}
+
+# offsets in texels, scaled by spread, and weights of center and two symmetric bilinear taps of
+# separable modes, as sampled by blur.frag and blur_sep.frag along one direction
+SEPARABLE_TAPS = {
+    'box': ((0.0, 1.0, 0.0), (1.0 / 3.0, 1.0 / 3.0, 0.0)),
+    'gaussian': ((0.0, 1.3846153846, 3.2307692308), (0.2270270270, 0.3162162162, 0.0702702703))
+}
+
+def scaled_size(size: SizeDescr, divider: int) -> Callable[[], Tuple[int, int]]:
+    """Get size descriptor divided by divider."""
+    def resolve() -> Tuple[int, int]:
+        width, height = size() if callable(size) else size
+        return (max(1, width // divider), max(1, height // divider))
+    return resolve
+
+def filter_pass(program: str, source: str, offset_texels: Tuple[float, float]) -> Callable:
+    """Create pass which applies fullscreen program to source with offset in source texels."""
+    def execute(ctx: PassContext) -> None:
+        width, height = ctx.size(source)
+        app_state().shader_manager.use_program(program)
+        GL.glUniform2f(app_state().shader_manager.get_uniform('offset'),
+                        offset_texels[0] / width, offset_texels[1] / height)
+        app_state().shader_manager.set_texture('source', ctx.tex(source))
+        app_state().mesh_manager.draw_fullscreen_triangle()
+    return execute
+
+class BlurChain:
+    """Passes of one blur: optional downsample, filtering and optional upsample."""
+
+    def __init__(self, graph: RenderGraph, name: str, source: str, output: str,
+                    size: SizeDescr, fmt: GL.Constant, descr: BlurDescr):
+        """Declare targets and passes of blur chain. output target is declared too."""
+        if descr.mode not in BLUR_MODES:
+            raise ValueError(f'Unknown blur mode "{descr.mode}"')
+        self.name = name
+        self.descr = descr
+        self.passes = []
+        self.fmt = fmt
+        base_size = scaled_size(size, descr.downsample)
+        current = source
+        if descr.downsample > 1:
+            current = self._add(graph, f'{name}_down', 'downsample', current, base_size,
+                                (descr.downsample / 4.0, descr.downsample / 4.0))
+        if descr.mode == 'box':
+            for i in range(descr.iterations):
+                current = self._add(graph, f'{name}_box{i}', 'blur', current, base_size,
+                                    (descr.spread, descr.spread))
+        elif descr.mode == 'gaussian':
+            for i in range(descr.iterations):
+                current = self._add(graph, f'{name}_h{i}', 'blur_sep', current, base_size,
+                                    (descr.spread, 0.0))
+                current = self._add(graph, f'{name}_v{i}', 'blur_sep', current, base_size,
+                                    (0.0, descr.spread))
+        else:
+            for i in range(descr.iterations):
+                current = self._add(graph, f'{name}_kdown{i}', 'kawase_down', current,
+                            scaled_size(size, descr.downsample * 2 ** (i + 1)),
+                            (0.5 * descr.spread, 0.5 * descr.spread))
+            for i in reversed(range(descr.iterations)):
+                current = self._add(graph, f'{name}_kup{i}', 'kawase_up', current,
+                            scaled_size(size, descr.downsample * 2 ** i),
+                            (0.5 * descr.spread, 0.5 * descr.spread))
+        if descr.upsample and descr.downsample > 1:
+            current = self._add(graph, f'{name}_up', 'downsample', current, size, (0.0, 0.0))
+        self._rename_last(graph, current, output)
+    def _add(self, graph: RenderGraph, target: str, program: str, source: str, size: SizeDescr,
+                offset_texels: Tuple[float, float]) -> str:
+        """Declare pass writing new intermediate target, return name of the target."""
+        graph.add_target(target, size, self.fmt)
+        graph.add_pass(target, filter_pass(program, source, offset_texels),
+                        reads=[source], writes=[target])
+        self.passes.append(target)
+        return target
+    def _rename_last(self, graph: RenderGraph, last: str, output: str) -> None:
+        """Make last pass of the chain write to output."""
+        render_pass = graph.passes[-1]
+        if len(self.passes) == 0 or render_pass.name != last:
+            raise ValueError(f'Blur chain "{self.name}" has no passes')
+        graph.targets[output] = graph.targets.pop(last)
+        render_pass.writes = [output]
+    def gpu_ms(self) -> float:
+        """Get averaged GPU time of all passes of the chain."""
+        timings = app_state().profiler.timings()
+        return sum(timings[name].gpu_ms for name in self.passes if name in timings)
+
+def blur_timings(chains: List[BlurChain]) -> Dict[str, float]:
+    """Get GPU time of every chain and their total."""
+    result = {chain.name: chain.gpu_ms() for chain in chains}
+    result['total'] = sum(result.values())
+    return result
@@ -0,0 +1,235 @@
+"""Asynchronous capture of rendered frames for recording and screenshots."""
+import ctypes
+import json
+import os
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import BinaryIO, List, Optional, Tuple
+import numpy as np
+from OpenGL import GL
+
+CAPTURE_FORMATS = ['png', 'raw']
+# zlib level of encoded PNG, low levels are several times faster to encode
+PNG_COMPRESS_LEVEL = 1
+
+@dataclass
+class CaptureSlot:
+    """Pixel buffer object receiving one frame."""
+
+    buffer: int
+    # mapped memory of persistently mapped buffer
+    memory: Optional[np.ndarray] = None
+    # fence of readback in flight, None if slot is free
+    fence: Optional[int] = None
+    # frame index in raw video, None if frame is not written to video
+    index: Optional[int] = None
+    # PNG files of recorded frame and requested screenshots
+    filenames: List[str] = field(default_factory=list)
+
+@dataclass
+class CaptureJob:
+    """Frame copied from pixel buffer and waiting for encoding."""
+
+    pixels: np.ndarray
+    index: Optional[int]
+    filenames: List[str]
+
+class FrameCapture:
+    """Reads backbuffer into a ring of pixel buffer objects, encodes frames on worker threads.
+
+    glReadPixels into a bound pixel pack buffer returns immediately, pixels
+    are copied when the fence of the slot is signaled on one of next frames.
+    Frames are never waited for during recording: if all slots are still in
+    flight or encoders fall behind, the frame is dropped and counted instead.
+    Recording writes numbered PNG files or one raw RGBA video file, e.g.
+        ffmpeg -f rawvideo -pix_fmt rgba -s 1920x1080 -r 60 -i capture.rgba capture.mp4
+    """
+
+    BUFFERS = 3
+
+    def __init__(self, workers: int = 2, queue_size: int = 8):
+        """Create idle capture, buffers and threads are created on first use."""
+        self.workers = workers
+        self.size = None
+        self.slots = []
+        # slots with readback in flight, oldest first
+        self.pending = deque()
+        self.queue = queue.Queue(queue_size)
+        self.threads = []
+        self.folder = None
+        self.raw_file: Optional[BinaryIO] = None
+        self.raw_lock = threading.Lock()
+        self.frames = 0
+        self.screenshots = []
+        self.stats_lock = threading.Lock()
+        self.stats = {'captured': 0, 'dropped': 0, 'encoded': 0}
+    @property
+    def recording(self) -> bool:
+        """Check if every frame is captured."""
+        return self.folder is not None
+    @property
+    def active(self) -> bool:
+        """Check if capture pass has work: recording, requested screenshots or frames in flight."""
+        return self.recording or len(self.screenshots) > 0 or len(self.pending) > 0
+    def start(self, folder: str, fmt: str = 'png') -> None:
+        """Start recording frames to folder as PNG files or raw video."""
+        if fmt not in CAPTURE_FORMATS:
+            print(f'Capture format {fmt} not found')
+            return
+        if self.recording:
+            self.stop()
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.frames = 0
+        if fmt == 'raw':
+            self.raw_file = open(os.path.join(folder, 'capture.rgba'), 'wb')
+        self._start_workers()
+    def stop(self) -> None:
+        """Finish recording: wait for frames in flight and encoders, write raw video description."""
+        folder = self.folder
+        self.folder = None
+        self.collect(wait=True)
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.raw_file is not None:
+            self.raw_file.close()
+            self.raw_file = None
+            with open(os.path.join(folder, 'capture.json'), 'w', encoding='utf-8') as file:
+                json.dump({'size': list(self.size), 'pixel_format': 'rgba',
+                            'frames': self.frames}, file, indent=4)
+    def screenshot(self, filename: str) -> None:
+        """Save next frame as PNG file."""
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.screenshots.append(filename)
+        self._start_workers()
+    def _start_workers(self) -> None:
+        """Start encoder threads if they are not running."""
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._encode, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    def _allocate(self, size: Tuple[int, int]) -> None:
+        """Create pixel buffers for frames of specified size."""
+        self.collect(wait=True)
+        self._delete_buffers()
+        self.size = size
+        frame_bytes = size[0] * size[1] * 4
+        persistent = bool(GL.glBufferStorage)
+        flags = GL.GL_MAP_READ_BIT | GL.GL_MAP_PERSISTENT_BIT | GL.GL_MAP_COHERENT_BIT
+        for buffer in GL.glGenBuffers(self.BUFFERS):
+            slot = CaptureSlot(int(buffer))
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, slot.buffer)
+            if persistent:
+                GL.glBufferStorage(GL.GL_PIXEL_PACK_BUFFER, frame_bytes, None,
+                                    flags | GL.GL_CLIENT_STORAGE_BIT)
+                pointer = GL.glMapBufferRange(GL.GL_PIXEL_PACK_BUFFER, 0, frame_bytes, flags)
+                slot.memory = np.frombuffer((ctypes.c_ubyte * frame_bytes).from_address(pointer),
+                                            dtype=np.uint8)
+            else:
+                GL.glBufferData(GL.GL_PIXEL_PACK_BUFFER, frame_bytes, None, GL.GL_STREAM_READ)
+            self.slots.append(slot)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+    def capture(self, size: Tuple[int, int]) -> None:
+        """Collect finished readbacks and start readback of bound framebuffer if needed."""
+        self.collect()
+        if not self.recording and len(self.screenshots) == 0:
+            return
+        if self.raw_file is not None and self.frames > 0 and size != self.size:
+            print('Frame size changed, raw video recording is stopped')
+            self.stop()
+            return
+        if size != self.size:
+            self._allocate(size)
+        free = [slot for slot in self.slots if slot.fence is None]
+        if len(free) == 0:
+            with self.stats_lock:
+                self.stats['dropped'] += 1
+            return
+        slot = free[0]
+        slot.index = None
+        slot.filenames = self.screenshots
+        self.screenshots = []
+        if self.raw_file is not None:
+            slot.index = self.frames
+        elif self.recording:
+            slot.filenames.append(os.path.join(self.folder, f'frame_{self.frames:06d}.png'))
+        if self.recording:
+            self.frames += 1
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, slot.buffer)
+        GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, 0)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        GL.glReadPixels(0, 0, size[0], size[1], GL.GL_RGBA, GL.GL_UNSIGNED_BYTE,
+                        ctypes.c_void_p(0))
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        slot.fence = GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.pending.append(slot)
+        with self.stats_lock:
+            self.stats['captured'] += 1
+    def collect(self, wait: bool = False) -> None:
+        """Pass finished readbacks to encoders in capture order.
+
+        Without wait, readbacks stay in flight while GPU writes them or encoder queue is full.
+        """
+        while len(self.pending) > 0:
+            slot = self.pending[0]
+            if not wait and self.queue.full():
+                return
+            status = GL.glClientWaitSync(slot.fence, GL.GL_SYNC_FLUSH_COMMANDS_BIT,
+                                            1000000 if wait else 0)
+            if status == GL.GL_TIMEOUT_EXPIRED:
+                if wait:
+                    continue
+                return
+            GL.glDeleteSync(slot.fence)
+            slot.fence = None
+            self.pending.popleft()
+            self.queue.put(CaptureJob(self._read(slot), slot.index, slot.filenames))
+    def _read(self, slot: CaptureSlot) -> np.ndarray:
+        """Copy pixels of finished readback, bottom row first."""
+        if slot.memory is not None:
+            pixels = slot.memory.copy()
+        else:
+            frame_bytes = self.size[0] * self.size[1] * 4
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, slot.buffer)
+            pointer = GL.glMapBufferRange(GL.GL_PIXEL_PACK_BUFFER, 0, frame_bytes,
+                                            GL.GL_MAP_READ_BIT)
+            pixels = np.frombuffer((ctypes.c_ubyte * frame_bytes).from_address(pointer),
+                                    dtype=np.uint8).copy()
+            GL.glUnmapBuffer(GL.GL_PIXEL_PACK_BUFFER)
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        return pixels.reshape(self.size[1], self.size[0], 4)
+    def _encode(self) -> None:
+        """Encode frames from queue until None is received. Runs on worker thread."""
+        from PIL import Image
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            image = np.ascontiguousarray(job.pixels[::-1])
+            if job.index is not None:
+                # frames are written concurrently, every one has fixed place in file
+                with self.raw_lock:
+                    self.raw_file.seek(job.index * image.nbytes)
+                    self.raw_file.write(image.tobytes())
+            for filename in job.filenames:
+                Image.fromarray(image).save(filename, compress_level=PNG_COMPRESS_LEVEL)
+            with self.stats_lock:
+                self.stats['encoded'] += 1
+    def _delete_buffers(self) -> None:
+        """Delete pixel buffers, they must not be in flight."""
+        for slot in self.slots:
+            slot.memory = None
+        if len(self.slots) > 0:
+            GL.glDeleteBuffers(len(self.slots), [slot.buffer for slot in self.slots])
+        self.slots = []
+    def __del__(self):
+        """Delete pixel buffers and fences."""
+        for slot in self.pending:
+            GL.glDeleteSync(slot.fence)
+        self.pending.clear()
+        self._delete_buffers()
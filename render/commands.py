@@ -0,0 +1,145 @@
+"""Recording of draw commands of a pass into a command list replayed on next frames."""
+import ctypes
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager, Hashable, Iterator, List
+import numpy as np
+from OpenGL import GL
+
+# command opcodes, index of the function in REPLAY table
+BIND_TEXTURE = 0
+BIND_VERTEX_ARRAY = 1
+BIND_BUFFER = 2
+BIND_BUFFER_RANGE = 3
+DRAW_ARRAYS = 4
+MULTI_DRAW_ARRAYS_INDIRECT = 5
+# opcode and arguments of the longest command
+COMMAND_INTS = 6
+
+def _bind_texture(unit: int, texture: int, location: int, *_) -> None:
+    """Bind 2D texture to unit and point sampler uniform to it."""
+    GL.glActiveTexture(GL.GL_TEXTURE0 + unit)
+    GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
+    GL.glUniform1i(location, unit)
+
+def _bind_vertex_array(vao: int, *_) -> None:
+    """Bind vertex array."""
+    GL.glBindVertexArray(vao)
+
+def _bind_buffer(target: int, buffer: int, *_) -> None:
+    """Bind buffer to target."""
+    GL.glBindBuffer(target, buffer)
+
+def _bind_buffer_range(target: int, index: int, buffer: int, offset: int, size: int) -> None:
+    """Bind buffer range to indexed target."""
+    GL.glBindBufferRange(target, index, buffer, offset, size)
+
+def _draw_arrays(mode: int, first: int, count: int, *_) -> None:
+    """Draw range of vertices."""
+    GL.glDrawArrays(mode, first, count)
+
+def _multi_draw_arrays_indirect(mode: int, offset: int, draw_count: int, stride: int, *_) -> None:
+    """Draw commands stored at offset of bound indirect buffer."""
+    GL.glMultiDrawArraysIndirect(mode, ctypes.c_void_p(offset), draw_count, stride)
+
+REPLAY: List[Callable] = [_bind_texture, _bind_vertex_array, _bind_buffer, _bind_buffer_range,
+                            _draw_arrays, _multi_draw_arrays_indirect]
+
+class CommandList:
+    """Draw commands of a pass recorded once and replayed while the key stays the same.
+
+    Submit code issues state changes and draws through methods of the list.
+    They are executed at once and, inside record(), appended as opcode and
+    integer arguments to a growing array. Replay dispatches rows of the array
+    through a fixed table without Python work which produced them, only
+    commands listed above can be recorded, so queries are never replayed.
+    Recorded commands may only reference objects and buffer ranges which stay
+    valid, so per-frame ring buffer data cannot be used, indirect draw
+    commands are kept in the own buffer of the list. Recording starts only
+    when the key repeats, so a pass changing every frame is not recorded.
+    """
+
+    def __init__(self, capacity: int = 256):
+        """Create empty list."""
+        self.key = None
+        # key of previous submission, recording starts when it repeats
+        self.last_key = None
+        self.commands = np.zeros((capacity, COMMAND_INTS), dtype=np.int64)
+        self.count = 0
+        self.recording = False
+        # rows of recorded commands as Python ints, converted once after recording
+        self.rows = []
+        self.indirect_buffer = GL.glGenBuffers(1)
+        self.stats = {'records': 0, 'replays': 0, 'calls': 0}
+    def valid(self, key: Hashable) -> bool:
+        """Check if list was recorded with the same key."""
+        return self.key is not None and self.key == key
+    def invalidate(self) -> None:
+        """Drop recorded commands."""
+        self.key = None
+        self.count = 0
+        self.rows = []
+    def record_if_stable(self, key: Hashable) -> ContextManager:
+        """Record commands inside the block if previous submission had the same key.
+
+        Otherwise commands are only executed, e.g. every frame while camera moves.
+        """
+        if key == self.last_key:
+            return self.record(key)
+        self.last_key = key
+        return nullcontext(self)
+    @contextmanager
+    def record(self, key: Hashable) -> Iterator['CommandList']:
+        """Execute and record commands issued inside the block."""
+        self.invalidate()
+        self.recording = True
+        try:
+            yield self
+        finally:
+            self.recording = False
+        self.rows = self.commands[:self.count].tolist()
+        self.key = key
+        self.stats['records'] += 1
+        self.stats['calls'] = self.count
+    def _emit(self, opcode: int, *args: int) -> None:
+        """Execute command and append it to the list while recording."""
+        REPLAY[opcode](*args)
+        if not self.recording:
+            return
+        if self.count == len(self.commands):
+            self.commands = np.concatenate([self.commands, np.zeros_like(self.commands)])
+        self.commands[self.count, 0] = opcode
+        self.commands[self.count, 1:len(args) + 1] = args
+        self.count += 1
+    def bind_texture(self, unit: int, texture: int, location: int) -> None:
+        """Bind 2D texture to unit and point sampler uniform at location to it."""
+        self._emit(BIND_TEXTURE, unit, texture, location)
+    def bind_vertex_array(self, vao: int) -> None:
+        """Bind vertex array."""
+        self._emit(BIND_VERTEX_ARRAY, vao)
+    def bind_buffer(self, target: GL.Constant, buffer: int) -> None:
+        """Bind buffer to target."""
+        self._emit(BIND_BUFFER, int(target), buffer)
+    def bind_buffer_range(self, target: GL.Constant, index: int, buffer: int,
+                            offset: int, size: int) -> None:
+        """Bind buffer range to indexed target."""
+        self._emit(BIND_BUFFER_RANGE, int(target), index, buffer, offset, size)
+    def draw_arrays(self, mode: GL.Constant, first: int, count: int) -> None:
+        """Draw range of vertices of bound vertex array."""
+        self._emit(DRAW_ARRAYS, int(mode), first, count)
+    def multi_draw_arrays_indirect(self, mode: GL.Constant, offset: int, draw_count: int,
+                                    stride: int = 0) -> None:
+        """Draw commands at byte offset of bound indirect buffer."""
+        self._emit(MULTI_DRAW_ARRAYS_INDIRECT, int(mode), offset, draw_count, stride)
+    def replay(self) -> None:
+        """Execute recorded commands."""
+        for opcode, *args in self.rows:
+            REPLAY[opcode](*args)
+        self.stats['replays'] += 1
+    def upload_indirect(self, commands: np.ndarray) -> None:
+        """Store indirect draw commands, they are read by offset in own buffer."""
+        GL.glBindBuffer(GL.GL_DRAW_INDIRECT_BUFFER, self.indirect_buffer)
+        GL.glBufferData(GL.GL_DRAW_INDIRECT_BUFFER, commands.nbytes, commands, GL.GL_DYNAMIC_DRAW)
+        GL.glBindBuffer(GL.GL_DRAW_INDIRECT_BUFFER, 0)
+    def __del__(self):
+        """Delete indirect buffer."""
+        GL.glDeleteBuffers(1, [self.indirect_buffer])
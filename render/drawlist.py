@@ -0,0 +1,69 @@
+"""Draw list sorted by render state with front to back order of opaque draws."""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+@dataclass
+class DrawItem:
+    """Single draw of a scene element."""
+
+    program: str
+    texture: str
+    mesh_name: str
+    # render.meshes.Mesh, only its vertex array and LOD ranges are used
+    mesh: Any
+    lod: int
+    # distance along view direction, nearest draws go first for early depth test
+    depth: float
+    # index of element in frame data, selects its model matrix
+    index: int
+
+    def sort_key(self) -> Tuple[str, str, str, float]:
+        """Get key grouping draws by program, texture and mesh, nearest first inside group."""
+        return (self.program, self.texture or '', self.mesh_name, self.depth)
+
+def state_changes(items: List[DrawItem]) -> Dict[str, int]:
+    """Count program, texture, mesh and vertex array switches when items are drawn in order.
+
+    Meshes of merged geometry share vertex array, so mesh switches do not bind anything.
+    """
+    changes = {'program': 0, 'texture': 0, 'mesh': 0, 'vao': 0}
+    prev = None
+    for item in items:
+        if prev is None or item.program != prev.program:
+            changes['program'] += 1
+        if prev is None or item.texture != prev.texture:
+            changes['texture'] += 1
+        if prev is None or item.mesh_name != prev.mesh_name:
+            changes['mesh'] += 1
+        if prev is None or item.mesh.vao != prev.mesh.vao:
+            changes['vao'] += 1
+        prev = item
+    return changes
+
+class DrawList:
+    """Draws of a pass collected during the frame and sorted before submission.
+
+    State changes are counted for submission order and sorted order,
+    so the gain of sorting is visible per frame.
+    """
+
+    def __init__(self):
+        """Create empty list."""
+        self.items = []
+        self.stats = {}
+    def clear(self) -> None:
+        """Remove draws of previous frame."""
+        self.items = []
+    def add(self, item: DrawItem) -> None:
+        """Add draw in submission order."""
+        self.items.append(item)
+    def sort(self) -> List[DrawItem]:
+        """Sort draws by state key and update state change counts."""
+        before = state_changes(self.items)
+        self.items.sort(key=DrawItem.sort_key)
+        after = state_changes(self.items)
+        self.stats = {'draws': len(self.items)}
+        for name, count in before.items():
+            self.stats[f'{name}_unsorted'] = count
+            self.stats[name] = after[name]
+        return self.items
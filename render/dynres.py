@@ -0,0 +1,53 @@
+"""Dynamic resolution scaling driven by frame time."""
+from collections import deque
+from typing import Tuple
+
+class DynamicResolution:
+    """Controller of internal render scale.
+
+    Scale goes down by step when average frame time exceeds the target and goes up
+    when there is enough headroom. Scale is quantized by step, so only a few target
+    sizes ever exist and pooled render targets are reused instead of reallocated.
+    """
+
+    def __init__(self, target_ms: float = 1000.0 / 60.0, min_scale: float = 0.5,
+                    max_scale: float = 1.0, step: float = 0.125, history: int = 30,
+                    headroom: float = 0.8, settle_frames: int = 120):
+        """Set frame time budget and scale bounds."""
+        self.target_ms = target_ms
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.step = step
+        self.headroom = headroom
+        self.settle_frames = settle_frames
+        self.samples = deque(maxlen=history)
+        self.scale = max_scale
+        self.enabled = True
+        self.frames_since_change = 0
+    def update(self, frame_ms: float) -> bool:
+        """Add frame time sample and adjust scale. Return True if scale was changed."""
+        self.frames_since_change += 1
+        if not self.enabled:
+            return False
+        self.samples.append(frame_ms)
+        if len(self.samples) < self.samples.maxlen:
+            return False
+        average = sum(self.samples) / len(self.samples)
+        scale = self.scale
+        if average > self.target_ms:
+            scale = max(self.min_scale, self.scale - self.step)
+        elif average < self.target_ms * self.headroom:
+            scale = min(self.max_scale, self.scale + self.step)
+        if scale == self.scale:
+            return False
+        self.scale = scale
+        self.samples.clear()
+        self.frames_since_change = 0
+        return True
+    def settled(self) -> bool:
+        """Check if scale has just stayed unchanged for settle_frames frames."""
+        return self.frames_since_change == self.settle_frames
+    def scaled(self, resolution: Tuple[int, int]) -> Tuple[int, int]:
+        """Get internal resolution for native resolution."""
+        scale = self.scale if self.enabled else self.max_scale
+        return (max(1, int(resolution[0] * scale)), max(1, int(resolution[1] * scale)))
@@ -0,0 +1,231 @@
+"""Declarative render graph with pass culling and render targets aliasing."""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple, Union
+from OpenGL import GL
+from render.rtargets import RTarget, RTargetManager
+from render.profiler import GpuProfiler
+
+# name of the resource which stands for default framebuffer
+BACKBUFFER = 'backbuffer'
+
+DEPTH_FORMATS = [GL.GL_DEPTH24_STENCIL8, GL.GL_DEPTH_COMPONENT32F]
+
+SizeDescr = Union[Tuple[int, int], Callable[[], Tuple[int, int]]]
+
+@dataclass
+class TargetDescr:
+    """Transient render target description."""
+
+    size: SizeDescr
+    fmt: GL.Constant
+
+    def resolve_size(self) -> Tuple[int, int]:
+        """Get actual size of the target for current frame."""
+        size = self.size() if callable(self.size) else self.size
+        return (int(size[0]), int(size[1]))
+
+@dataclass
+class RenderPass:
+    """Render pass description: what it reads, what it writes and how to execute it."""
+
+    name: str
+    execute: Callable[['PassContext'], None]
+    reads: List[str] = field(default_factory=list)
+    writes: List[str] = field(default_factory=list)
+    depth: str = None
+    enabled: bool = True
+    compute: bool = False
+
+@dataclass
+class CompiledGraph:
+    """Result of graph compilation: ordered live passes and physical targets for resources."""
+
+    passes: List[RenderPass]
+    sizes: Dict[str, Tuple[int, int]]
+    slots: Dict[str, Tuple[Tuple[int, int, GL.Constant], int]]
+
+class PassContext:
+    """Data available to the pass during its execution."""
+
+    def __init__(self, graph: 'RenderGraph', compiled: CompiledGraph, params: Any):
+        """Save graph, compiled schedule and user frame parameters."""
+        self.graph = graph
+        self.compiled = compiled
+        self.params = params
+    def tex(self, name: str) -> int:
+        """Get texture id of the resource."""
+        return self.graph.physical_target(*self.compiled.slots[name]).get_tex().get_id()
+    def size(self, name: str) -> Tuple[int, int]:
+        """Get resolution of the resource."""
+        return self.compiled.sizes[name]
+
+class RenderGraph:
+    """Render graph: passes declare their inputs and outputs, graph orders and executes them.
+
+    Compilation culls passes which outputs are not used by anything that reaches backbuffer
+    and assigns physical render targets to transient resources so resources with
+    non-overlapping lifetimes share the same texture.
+    Compiled schedules are cached, so compilation happens only when the set of
+    enabled passes or target sizes change.
+    """
+
+    def __init__(self, rt_manager: RTargetManager, profiler: GpuProfiler = None):
+        """Create empty graph which binds framebuffers with rt_manager and measures passes."""
+        self.rt_manager = rt_manager
+        self.profiler = profiler
+        self.targets = {}
+        self.passes = []
+        self.compiled = {}
+        # physical targets grouped by (width, height, format)
+        self.pool = {}
+        self.last_compiled = None
+    def add_target(self, name: str, size: SizeDescr, fmt: GL.Constant) -> None:
+        """Declare transient render target. size can be callable evaluated every frame."""
+        self.targets[name] = TargetDescr(size, fmt)
+        self.compiled = {}
+    def add_pass(self, name: str, execute: Callable[[PassContext], None],
+                reads: List[str] = None, writes: List[str] = None, depth: str = None,
+                compute: bool = False) -> None:
+        """Declare pass. Passes are executed in declaration order.
+
+        Framebuffer is not bound for compute passes, they write outputs as images.
+        """
+        self.passes.append(RenderPass(name, execute, list(reads or []),
+                                        list(writes or []), depth, compute=compute))
+        self.compiled = {}
+    def clear(self) -> None:
+        """Remove all passes and targets declarations, physical targets are kept for reuse."""
+        self.targets = {}
+        self.passes = []
+        self.compiled = {}
+        self.last_compiled = None
+    def set_enabled(self, name: str, enabled: bool) -> None:
+        """Enable or disable pass with specified name."""
+        for render_pass in self.passes:
+            if render_pass.name == name:
+                render_pass.enabled = enabled
+                return
+        print(f'Render pass {name} not found')
+    def compile(self) -> CompiledGraph:
+        """Get compiled schedule for current enabled passes and target sizes."""
+        sizes = {name: descr.resolve_size() for name, descr in self.targets.items()}
+        key = (tuple(p.name for p in self.passes if p.enabled), tuple(sizes.values()))
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = self._compile(sizes)
+            self.compiled[key] = compiled
+        return compiled
+    def _compile(self, sizes: Dict[str, Tuple[int, int]]) -> CompiledGraph:
+        """Validate, cull passes and alias render targets."""
+        passes = [p for p in self.passes if p.enabled]
+        # validate: every transient resource has one producer declared before its readers
+        producers = {}
+        for idx, render_pass in enumerate(passes):
+            for name in render_pass.reads:
+                if name not in producers:
+                    raise ValueError(f'Pass "{render_pass.name}" reads "{name}" '
+                                        'which is not written by any preceding pass')
+            for name in self._outputs(render_pass):
+                if name == BACKBUFFER:
+                    continue
+                if name not in self.targets:
+                    raise ValueError(f'Pass "{render_pass.name}" writes undeclared "{name}"')
+                if name in producers:
+                    raise ValueError(f'Resource "{name}" is written by several passes')
+                producers[name] = idx
+        # cull: walk backwards from passes writing to backbuffer
+        needed = set()
+        live = []
+        for render_pass in reversed(passes):
+            outputs = self._outputs(render_pass)
+            if BACKBUFFER in outputs or len(needed & set(outputs)) > 0:
+                live.append(render_pass)
+                needed.update(render_pass.reads)
+        live.reverse()
+        # lifetimes of resources in terms of live pass indices
+        first_use = {}
+        last_use = {}
+        for idx, render_pass in enumerate(live):
+            for name in self._outputs(render_pass):
+                if name != BACKBUFFER:
+                    first_use[name] = idx
+                    last_use[name] = idx
+            for name in render_pass.reads:
+                last_use[name] = idx
+        # alias: reuse physical targets of resources which are not needed anymore
+        slots = {}
+        free = {}
+        used = {}
+        for idx, render_pass in enumerate(live):
+            for name, last in last_use.items():
+                if last == idx - 1:
+                    free.setdefault(slots[name][0], []).append(slots[name][1])
+            for name in self._outputs(render_pass):
+                if name == BACKBUFFER:
+                    continue
+                key = (*sizes[name], self.targets[name].fmt)
+                if free.get(key):
+                    slots[name] = (key, free[key].pop())
+                else:
+                    slots[name] = (key, used.get(key, 0))
+                    used[key] = used.get(key, 0) + 1
+        return CompiledGraph(live, {name: sizes[name] for name in first_use}, slots)
+    @staticmethod
+    def _outputs(render_pass: RenderPass) -> List[str]:
+        """Get all resources written by pass."""
+        if render_pass.depth:
+            return render_pass.writes + [render_pass.depth]
+        return render_pass.writes
+    def trim_pool(self) -> None:
+        """Release physical targets which are not used by the last executed schedule."""
+        if self.last_compiled is None:
+            return
+        used = {}
+        for key, idx in self.last_compiled.slots.values():
+            used[key] = max(used.get(key, 0), idx + 1)
+        self.pool = {key: targets[:used[key]] for key, targets in self.pool.items()
+                        if key in used}
+    def physical_target(self, key: Tuple[int, int, GL.Constant], idx: int) -> RTarget:
+        """Get physical render target from pool, create it on first use."""
+        targets = self.pool.setdefault(key, [])
+        while len(targets) <= idx:
+            rtarget = RTarget(*key)
+            if key[2] not in DEPTH_FORMATS:
+                self.rt_manager.set_linear_filter(rtarget.get_tex().get_id())
+            targets.append(rtarget)
+        return targets[idx]
+    def execute(self, params: Any = None) -> None:
+        """Run compiled schedule. params are available to passes as PassContext.params."""
+        compiled = self.compile()
+        self.last_compiled = compiled
+        context = PassContext(self, compiled, params)
+        if self.profiler:
+            self.profiler.begin_frame()
+        on_backbuffer = False
+        for render_pass in compiled.passes:
+            if self.profiler:
+                self.profiler.begin(render_pass.name)
+            if BACKBUFFER in render_pass.writes:
+                if not on_backbuffer:
+                    self.rt_manager.bind_fb0()
+                    on_backbuffer = True
+            elif not render_pass.compute:
+                on_backbuffer = False
+                outputs = render_pass.writes + ([render_pass.depth] if render_pass.depth else [])
+                width, height = compiled.sizes[outputs[0]]
+                textures = [self.physical_target(*compiled.slots[name]).get_tex()
+                                for name in render_pass.writes]
+                depth = None
+                if render_pass.depth:
+                    depth = self.physical_target(*compiled.slots[render_pass.depth]).get_tex()
+                self.rt_manager.bind_textures(width, height, textures, depth)
+            render_pass.execute(context)
+            if self.profiler:
+                self.profiler.end()
+        if not on_backbuffer:
+            self.rt_manager.bind_fb0()
+    def __del__(self):
+        """Release all physical targets."""
+        self.compiled = {}
+        self.last_compiled = None
+        self.pool = {}
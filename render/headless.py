@@ -0,0 +1,127 @@
+"""Offscreen OpenGL context without a window, works with Mesa llvmpipe.
+
+PYOPENGL_PLATFORM environment variable should be set to 'egl' or 'osmesa'
+before OpenGL is imported for the first time.
+"""
+import ctypes
+import os
+from typing import Callable, Dict, Tuple
+import numpy as np
+from OpenGL import GL
+from render.profiler import GpuProfiler
+
+# key of GL calls made outside of render passes
+NO_PASS = '(no pass)'
+
+class HeadlessContext:
+    """Core profile context rendering to an offscreen surface of specified size."""
+
+    def __init__(self, size: Tuple[int, int], version: Tuple[int, int] = (4, 3)):
+        """Create and make current context of PYOPENGL_PLATFORM kind."""
+        self.size = size
+        self.platform = os.environ.get('PYOPENGL_PLATFORM', 'egl')
+        if self.platform == 'egl':
+            self._create_egl(version)
+        elif self.platform == 'osmesa':
+            self._create_osmesa(version)
+        else:
+            raise RuntimeError(f'Headless context is not supported on "{self.platform}" platform')
+    def _create_egl(self, version: Tuple[int, int]) -> None:
+        """Create context with pbuffer surface through EGL."""
+        from OpenGL import EGL
+        self.egl = EGL
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(self.display, None, None):
+            raise RuntimeError('Failed to initialize EGL display')
+        attribs = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                    EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                    EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+                    EGL.EGL_ALPHA_SIZE, 8, EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_NONE]
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        EGL.eglChooseConfig(self.display, (EGL.EGLint * len(attribs))(*attribs),
+                            ctypes.pointer(config), 1, ctypes.pointer(count))
+        if count.value == 0:
+            raise RuntimeError('No EGL config with pbuffer and OpenGL support')
+        surface_attribs = [EGL.EGL_WIDTH, self.size[0], EGL.EGL_HEIGHT, self.size[1], EGL.EGL_NONE]
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config,
+                                (EGL.EGLint * len(surface_attribs))(*surface_attribs))
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context_attribs = [EGL.EGL_CONTEXT_MAJOR_VERSION, version[0],
+                            EGL.EGL_CONTEXT_MINOR_VERSION, version[1],
+                            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK,
+                            EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT, EGL.EGL_NONE]
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT,
+                                (EGL.EGLint * len(context_attribs))(*context_attribs))
+        if self.context == EGL.EGL_NO_CONTEXT:
+            raise RuntimeError(f'Failed to create OpenGL {version[0]}.{version[1]} EGL context')
+        EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context)
+    def _create_osmesa(self, version: Tuple[int, int]) -> None:
+        """Create context rendering to client memory through OSMesa."""
+        from OpenGL import osmesa
+        self.osmesa = osmesa
+        attribs = [osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA, osmesa.OSMESA_DEPTH_BITS, 24,
+                    osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+                    osmesa.OSMESA_CONTEXT_MAJOR_VERSION, version[0],
+                    osmesa.OSMESA_CONTEXT_MINOR_VERSION, version[1], 0]
+        self.context = osmesa.OSMesaCreateContextAttribs(attribs, None)
+        if not self.context:
+            raise RuntimeError(f'Failed to create OpenGL {version[0]}.{version[1]} OSMesa context')
+        self.buffer = np.zeros((self.size[1], self.size[0], 4), dtype=np.uint8)
+        if not osmesa.OSMesaMakeCurrent(self.context, self.buffer, GL.GL_UNSIGNED_BYTE,
+                                        self.size[0], self.size[1]):
+            raise RuntimeError('Failed to make OSMesa context current')
+    def read_pixels(self) -> np.ndarray:
+        """Get RGBA pixels of default framebuffer, bottom row first."""
+        GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, 0)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        pixels = GL.glReadPixels(0, 0, self.size[0], self.size[1], GL.GL_RGBA, GL.GL_UNSIGNED_BYTE)
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(self.size[1], self.size[0], 4)
+    def destroy(self) -> None:
+        """Release context and surface."""
+        if self.platform == 'egl':
+            self.egl.eglMakeCurrent(self.display, self.egl.EGL_NO_SURFACE,
+                                    self.egl.EGL_NO_SURFACE, self.egl.EGL_NO_CONTEXT)
+            self.egl.eglDestroySurface(self.display, self.surface)
+            self.egl.eglDestroyContext(self.display, self.context)
+            self.egl.eglTerminate(self.display)
+        else:
+            self.osmesa.OSMesaDestroyContext(self.context)
+
+class GLCallCounter:
+    """Counts calls of OpenGL.GL functions, grouped by pass measured by profiler.
+
+    Functions are replaced in OpenGL.GL module, so calls through GL.gl* attribute
+    are counted. Feature checks like bool(GL.glBufferStorage) should be done
+    before install().
+    """
+
+    def __init__(self, profiler: GpuProfiler):
+        """Create counter with no wrapped functions."""
+        self.profiler = profiler
+        self.counts = {}
+        self.originals = {}
+    def install(self) -> None:
+        """Wrap all GL functions."""
+        for name in dir(GL):
+            func = getattr(GL, name)
+            if name.startswith('gl') and callable(func) and name not in self.originals:
+                self.originals[name] = func
+                setattr(GL, name, self._wrap(func))
+    def uninstall(self) -> None:
+        """Restore original GL functions."""
+        for name, func in self.originals.items():
+            setattr(GL, name, func)
+        self.originals = {}
+    def _wrap(self, func: Callable) -> Callable:
+        """Get function counting calls of func."""
+        def counted(*args, **kwargs):
+            key = self.profiler.active or NO_PASS
+            self.counts[key] = self.counts.get(key, 0) + 1
+            return func(*args, **kwargs)
+        return counted
+    def reset(self) -> Dict[str, int]:
+        """Get counts since previous reset and start from zero."""
+        counts = self.counts
+        self.counts = {}
+        return counts
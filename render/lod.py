@@ -0,0 +1,110 @@
+"""Mesh simplification into levels of detail and LOD selection."""
+import hashlib
+import os
+import tempfile
+from typing import List
+import numpy as np
+
+# clustering grid resolution along the largest side of bounding box for LOD 1, 2, ...
+LOD_GRIDS = [32, 16, 8]
+# minimal projected size (fraction of screen height) of bounding sphere for LOD 0, 1, ...
+LOD_THRESHOLDS = [0.3, 0.12, 0.05]
+# the same for shadow pass, as fraction of shadow map side
+SHADOW_LOD_THRESHOLDS = [0.15, 0.06, 0.02]
+LOD_CACHE_FOLDER = '.mesh_cache'
+# change when simplification output changes to invalidate cached LODs
+LOD_VERSION = 1
+
+def simplify(vertices: np.ndarray, vertex_size: int, grid: int) -> np.ndarray:
+    """Simplify triangle list with vertex clustering and quadric error metrics.
+
+    Vertices are grouped by cells of uniform grid, every cluster is moved to
+    the point minimizing sum of squared distances to planes of adjacent faces.
+    Triangles which collapse are dropped. Attributes other than position (last
+    three floats of vertex) are kept from original vertices.
+    """
+    vertices = vertices.reshape(-1, vertex_size)
+    positions = vertices[:, -3:].astype(np.float64)
+    low = positions.min(axis=0)
+    cell = max(float((positions.max(axis=0) - low).max()) / grid, 1e-12)
+    cells = np.clip(((positions - low) / cell).astype(np.int64), 0, grid - 1)
+    cell_ids = (cells[:, 0] * grid + cells[:, 1]) * grid + cells[:, 2]
+    _, clusters = np.unique(cell_ids, return_inverse=True)
+    clusters = clusters.reshape(-1)
+    cluster_count = clusters.max() + 1
+    # area weighted plane quadric of every face added to clusters of its vertices
+    corners = positions.reshape(-1, 3, 3)
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    unit = normals / np.maximum(areas, 1e-30)[:, None]
+    planes = np.concatenate([unit, -np.sum(unit * corners[:, 0], axis=1)[:, None]], axis=1)
+    quadrics = areas[:, None, None] * planes[:, :, None] * planes[:, None, :]
+    cluster_quadrics = np.zeros((cluster_count, 4, 4))
+    for corner in range(3):
+        np.add.at(cluster_quadrics, clusters[corner::3], quadrics)
+    # optimal position, mean of cluster if quadric is degenerate or optimum leaves the cell
+    counts = np.bincount(clusters, minlength=cluster_count)[:, None]
+    mean = np.zeros((cluster_count, 3))
+    np.add.at(mean, clusters, positions)
+    mean /= counts
+    matrices = cluster_quadrics[:, :3, :3]
+    solvable = np.abs(np.linalg.det(matrices)) > 1e-12 * cell ** 6
+    result = mean.copy()
+    if solvable.any():
+        optimal = np.linalg.solve(matrices[solvable], -cluster_quadrics[solvable, :3, 3:])[..., 0]
+        cluster_low = low + np.floor((mean[solvable] - low) / cell) * cell
+        inside = np.all((optimal >= cluster_low - 0.5 * cell) &
+                        (optimal <= cluster_low + 1.5 * cell), axis=1)
+        result[np.flatnonzero(solvable)[inside]] = optimal[inside]
+    faces = clusters.reshape(-1, 3)
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & \
+            (faces[:, 0] != faces[:, 2])
+    # drop faces merged into the same cluster triple
+    _, unique_faces = np.unique(np.sort(faces[keep], axis=1), axis=0, return_index=True)
+    kept = np.flatnonzero(keep)[np.sort(unique_faces)]
+    indices = (kept[:, None] * 3 + np.arange(3)).reshape(-1)
+    simplified = vertices[indices].copy()
+    simplified[:, -3:] = result[clusters[indices]]
+    return simplified.reshape(-1).astype(np.float32)
+
+def build_lods(vertices: np.ndarray, vertex_size: int) -> List[np.ndarray]:
+    """Get LOD chain, level 0 is the original mesh. Levels which do not reduce much are skipped."""
+    lods = [vertices]
+    for grid in LOD_GRIDS:
+        lod = simplify(vertices, vertex_size, grid)
+        if len(lod) < 3 or len(lod) > len(lods[-1]) * 0.8:
+            continue
+        lods.append(lod)
+    return lods
+
+def load_lods(filename: str, vertices: np.ndarray, vertex_size: int) -> List[np.ndarray]:
+    """Get LOD chain of mesh file from disk cache, build and save it on miss."""
+    digest = hashlib.sha256()
+    digest.update(f'{LOD_VERSION}|{LOD_GRIDS}|{vertex_size}|'.encode('utf-8'))
+    digest.update(vertices.tobytes())
+    name = os.path.splitext(os.path.basename(filename))[0]
+    path = os.path.join(LOD_CACHE_FOLDER, f'{name}_{digest.hexdigest()[:32]}.npz')
+    if os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                return [vertices] + [data[f'lod{i}'] for i in range(1, len(data.files) + 1)]
+        except (OSError, ValueError, KeyError) as error:
+            print(f'Failed to read LODs of "{filename}" from cache: {error}')
+    lods = build_lods(vertices, vertex_size)
+    try:
+        os.makedirs(LOD_CACHE_FOLDER, exist_ok=True)
+        # meshes can be loaded by several threads, write to unique file and rename
+        with tempfile.NamedTemporaryFile(dir=LOD_CACHE_FOLDER, suffix='.tmp',
+                                            delete=False) as file:
+            np.savez(file, **{f'lod{i}': lod for i, lod in enumerate(lods) if i > 0})
+        os.replace(file.name, path)
+    except OSError as error:
+        print(f'Failed to save LODs of "{filename}" to cache: {error}')
+    return lods
+
+def select_lod(projected_size: float, thresholds: List[float], lod_count: int) -> int:
+    """Get LOD index for projected size of bounding sphere."""
+    for lod, threshold in enumerate(thresholds):
+        if projected_size >= threshold or lod == lod_count - 1:
+            return lod
+    return lod_count - 1
@@ -1,65 +1,233 @@
 """Meshes load, processing and management."""
 import os
 import ctypes
+from dataclasses import dataclass
+from typing import List, Tuple
 from OpenGL import GL
 import numpy as np
 import pywavefront
+from render.lod import load_lods
+
+# vertex of merged geometry: texcoord, normal, position
+MERGED_VERTEX_FLOATS = 8
+
+@dataclass
+class MeshData:
+    """Vertex data of all LODs read from file, ready for upload."""
+
+    lods: List[np.ndarray]
+    vertex_size: int
+    has_normals: bool
+    has_uvs: bool
+    # radius of bounding sphere centered at model origin
+    radius: float
+
+def read_mesh(filename: str) -> MeshData:
+    """Read vertex data from .obj and get its LODs.
+
+    Does not use OpenGL, so can be called from any thread.
+    """
+    scene = pywavefront.Wavefront(filename, collect_faces=True)
+    if len(scene.materials) != 1:
+        print(f'Incorrect number of matrials per object: {len(scene.materials)}')
+    material = scene.materials[list(scene.materials.keys())[0]]
+    vertices = np.array(material.vertices, dtype='float32')
+    positions = vertices.reshape(-1, material.vertex_size)[:, -3:]
+    radius = float(np.linalg.norm(positions, axis=1).max()) if len(positions) > 0 else 0.0
+    return MeshData(load_lods(filename, vertices, material.vertex_size), material.vertex_size,
+                    material.has_normals, material.has_uvs, radius)
+
+def merged_vertices(data: MeshData) -> np.ndarray:
+    """Convert vertices of all LODs to merged geometry layout, missing attributes are zero."""
+    source = np.concatenate(data.lods).reshape(-1, data.vertex_size)
+    vertices = np.zeros((source.shape[0], MERGED_VERTEX_FLOATS), dtype=np.float32)
+    if data.has_uvs:
+        vertices[:, 0:2] = source[:, 0:2]
+    if data.has_normals:
+        vertices[:, 2:5] = source[:, -6:-3]
+    vertices[:, 5:8] = source[:, -3:]
+    return vertices
+
+class MergedGeometry:
+    """Vertex buffer and vertex array shared by all meshes.
+
+    Meshes get ranges of the buffer with first fit allocation, released ranges
+    are merged with neighbours. If there is no room, buffer grows twice and
+    its content is copied on GPU.
+    """
+
+    def __init__(self, capacity: int = 1 << 20):
+        """Create buffer for capacity vertices."""
+        self.capacity = capacity
+        # sorted (first vertex, vertex count) of unused ranges
+        self.free = [(0, capacity)]
+        self.vao = GL.glGenVertexArrays(1)
+        self.vbo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, capacity * MERGED_VERTEX_FLOATS * 4,
+                        None, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        self._setup_attributes()
+    def _setup_attributes(self) -> None:
+        """Point vertex array attributes to current buffer."""
+        GL.glBindVertexArray(self.vao)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        size = MERGED_VERTEX_FLOATS * 4
+        GL.glEnableVertexAttribArray(0)
+        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, size, ctypes.c_void_p(20))
+        GL.glEnableVertexAttribArray(1)
+        GL.glVertexAttribPointer(1, 3, GL.GL_FLOAT, GL.GL_FALSE, size, ctypes.c_void_p(8))
+        GL.glEnableVertexAttribArray(2)
+        GL.glVertexAttribPointer(2, 2, GL.GL_FLOAT, GL.GL_FALSE, size, ctypes.c_void_p(0))
+        GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+    def alloc(self, vertices: np.ndarray) -> int:
+        """Upload vertices in merged layout to unused range, return its first vertex."""
+        count = vertices.shape[0]
+        fitting = [i for i, (_, size) in enumerate(self.free) if size >= count]
+        if len(fitting) == 0:
+            self._grow(count)
+            return self.alloc(vertices)
+        first, size = self.free[fitting[0]]
+        if size == count:
+            del self.free[fitting[0]]
+        else:
+            self.free[fitting[0]] = (first + count, size - count)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, first * MERGED_VERTEX_FLOATS * 4,
+                            vertices.nbytes, vertices)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        return first
+    def release(self, first: int, count: int) -> None:
+        """Return range to unused ones."""
+        self.free.append((first, count))
+        self.free.sort()
+        merged = [self.free[0]]
+        for start, size in self.free[1:]:
+            if merged[-1][0] + merged[-1][1] == start:
+                merged[-1] = (merged[-1][0], merged[-1][1] + size)
+            else:
+                merged.append((start, size))
+        self.free = merged
+    def _grow(self, count: int) -> None:
+        """Enlarge buffer so a range of count vertices fits at its end."""
+        capacity = max(self.capacity * 2, self.capacity + count)
+        vbo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, vbo)
+        GL.glBufferData(GL.GL_COPY_WRITE_BUFFER, capacity * MERGED_VERTEX_FLOATS * 4,
+                        None, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_COPY_READ_BUFFER, self.vbo)
+        GL.glCopyBufferSubData(GL.GL_COPY_READ_BUFFER, GL.GL_COPY_WRITE_BUFFER, 0, 0,
+                                self.capacity * MERGED_VERTEX_FLOATS * 4)
+        GL.glBindBuffer(GL.GL_COPY_READ_BUFFER, 0)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+        GL.glDeleteBuffers(1, [self.vbo])
+        self.vbo = vbo
+        self.release(self.capacity, capacity - self.capacity)
+        self.capacity = capacity
+        self._setup_attributes()
+    def __del__(self):
+        """Delete buffer and vertex array."""
+        GL.glDeleteBuffers(1, [self.vbo])
+        GL.glDeleteVertexArrays(1, [self.vao])
 
 class Mesh:
     """Class for 3D model vertex data storage and rendering."""
 
-    def __init__(self, filename: str):
-        """Read data from .obj and create a vertex array."""
-        scene = pywavefront.Wavefront(filename, collect_faces=True)
-        if len(scene.materials) != 1:
-            print(f'Incorrect number of matrials per object: {len(scene.materials)}')
-        material = scene.materials[list(scene.materials.keys())[0]]
-        vertices = np.array(material.vertices, dtype='float32')
-        self.vertex_count = vertices.shape[0] // material.vertex_size
+    def __init__(self, data: MeshData, merged: MergedGeometry = None):
+        """Create a vertex array with all LODs in one vertex buffer.
+
+        If merged geometry is passed, vertices are stored in its buffer instead.
+        """
+        vertices = np.concatenate(data.lods)
+        self.radius = data.radius
+        # first vertex and vertex count of every LOD
+        self.lods = []
+        first = 0
+        for lod in data.lods:
+            self.lods.append((first, lod.shape[0] // data.vertex_size))
+            first += self.lods[-1][1]
+        self.merged = merged
+        if merged is not None:
+            vertices = merged_vertices(data)
+            self.size_bytes = vertices.nbytes
+            self.base = merged.alloc(vertices)
+            self.lods = [(self.base + first, count) for first, count in self.lods]
+            self.vao = merged.vao
+            return
+        self.size_bytes = vertices.nbytes
         self.vao = GL.glGenVertexArrays(1)
         GL.glBindVertexArray(self.vao)
         self.vbo = GL.glGenBuffers(1)
         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
         GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.shape[0] * 4, vertices, GL.GL_STATIC_DRAW)
-        size = material.vertex_size * 4
+        size = data.vertex_size * 4
         GL.glEnableVertexAttribArray(0)
         GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, size,
-                                    ctypes.c_void_p((material.vertex_size - 3)*4))
-        if material.has_normals:
+                                    ctypes.c_void_p((data.vertex_size - 3)*4))
+        if data.has_normals:
             GL.glEnableVertexAttribArray(1)
             GL.glVertexAttribPointer(1, 3, GL.GL_FLOAT, GL.GL_FALSE, size,
-                                        ctypes.c_void_p((material.vertex_size - 6)*4))
-            if material.has_uvs:
+                                        ctypes.c_void_p((data.vertex_size - 6)*4))
+            if data.has_uvs:
                 GL.glEnableVertexAttribArray(2)
                 GL.glVertexAttribPointer(2, 2, GL.GL_FLOAT, GL.GL_FALSE, size, ctypes.c_void_p(0))
-        elif material.has_uvs:
+        elif data.has_uvs:
             GL.glEnableVertexAttribArray(2)
             GL.glVertexAttribPointer(2, 0, GL.GL_FLOAT, GL.GL_FALSE, size, ctypes.c_void_p(0))
         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
         GL.glBindVertexArray(0)
-    def draw(self) -> None:
-        """Render the model."""
+    def draw(self, lod: int = 0) -> None:
+        """Render the model with specified level of detail."""
         GL.glBindVertexArray(self.vao)
-        GL.glDrawArrays(GL.GL_TRIANGLES, 0, self.vertex_count)
+        self.draw_bound(lod)
         GL.glBindVertexArray(0)
+    def draw_bound(self, lod: int = 0) -> None:
+        """Render level of detail, vertex array should be bound by caller."""
+        GL.glDrawArrays(GL.GL_TRIANGLES, *self.lod_range(lod))
+    def lod_range(self, lod: int) -> Tuple[int, int]:
+        """Get first vertex and vertex count of level of detail, clamped to the coarsest one."""
+        return self.lods[min(lod, len(self.lods) - 1)]
     def __del__(self):
         """Delete owned OpenGL.GL objects."""
+        if self.merged is not None:
+            self.merged.release(self.base, sum(count for _, count in self.lods))
+            return
         GL.glDeleteBuffers(1, [self.vbo])
         GL.glDeleteVertexArrays(1, [self.vao])
 
 class MeshManager:
     """Manager for all used meshes."""
 
-    def __init__(self, base_folder: str):
-        """Init manager to load meshes from base_folder and create empty vao."""
+    def __init__(self, base_folder: str, merge: bool = True):
+        """Init manager to load meshes from base_folder and create empty vao.
+
+        If merge is set and multi-draw indirect is supported (GL 4.3), meshes are
+        stored in one merged geometry buffer.
+        """
         self.base_folder = base_folder
         self.meshes = {}
         self.empty_vao = GL.glGenVertexArrays(1)
-    def draw(self, filename: str) -> None:
-        """Render the mesh with specified name."""
+        self.merged = MergedGeometry() if merge and bool(GL.glMultiDrawArraysIndirect) else None
+    def get(self, filename: str) -> Mesh:
+        """Get mesh by name, load it if needed."""
         if filename not in self.meshes:
-            self.meshes[filename] = Mesh(os.path.join(self.base_folder, filename))
-        self.meshes[filename].draw()
+            self.meshes[filename] = Mesh(read_mesh(os.path.join(self.base_folder, filename)),
+                                            self.merged)
+        return self.meshes[filename]
+    def draw(self, filename: str, lod: int = 0) -> None:
+        """Render the mesh with specified name and level of detail."""
+        self.get(filename).draw(lod)
+    def path(self, filename: str) -> str:
+        """Get full path of mesh file."""
+        return os.path.join(self.base_folder, filename)
+    def add(self, filename: str, data: MeshData) -> int:
+        """Upload mesh read in advance, return its size in bytes."""
+        self.meshes[filename] = Mesh(data, self.merged)
+        return self.meshes[filename].size_bytes
+    def remove(self, filename: str) -> None:
+        """Delete mesh, it is loaded again on next draw."""
+        self.meshes.pop(filename, None)
     def draw_fullscreen_triangle(self) -> None:
         """Render fullscreen triangle."""
         GL.glBindVertexArray(self.empty_vao)
@@ -73,4 +241,5 @@ class MeshManager:
     def __del__(self):
         """Remove all managed meshes and empty vao."""
         self.meshes = {}
+        self.merged = None
         GL.glDeleteVertexArrays(1, [self.empty_vao])
@@ -0,0 +1,103 @@
+"""CPU and GPU timings of render passes."""
+import ctypes
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict
+from OpenGL import GL
+
+@dataclass
+class PassTiming:
+    """Averaged timings of a pass in milliseconds."""
+
+    cpu_ms: float
+    gpu_ms: float
+
+class GpuProfiler:
+    """Per-pass GL_TIME_ELAPSED queries with rolling averages.
+
+    Queries are kept for FRAMES_IN_FLIGHT frames before being read back,
+    so reading results never waits for GPU. Results that are still not available
+    when their slot is reused are dropped instead of stalling.
+    """
+
+    FRAMES_IN_FLIGHT = 3
+
+    def __init__(self, history: int = 60):
+        """Create empty profiler averaging over history frames."""
+        self.history = history
+        self.enabled = True
+        self.overlay = False
+        self.frame = 0
+        # queries of every frame in flight: name -> query id
+        self.frame_queries = [{} for _ in range(self.FRAMES_IN_FLIGHT)]
+        self.free_queries = []
+        self.cpu_samples = {}
+        self.gpu_samples = {}
+        self.order = []
+        self.active = None
+        self.cpu_start = 0.0
+        # total GPU time of the most recent frame with collected results
+        self.last_frame_gpu_ms = 0.0
+    def begin_frame(self) -> None:
+        """Switch to next frame slot and collect results of the oldest frame."""
+        self.frame += 1
+        queries = self.frame_queries[self.frame % self.FRAMES_IN_FLIGHT]
+        frame_gpu_ms = 0.0
+        for name, query in queries.items():
+            if GL.glGetQueryObjectuiv(query, GL.GL_QUERY_RESULT_AVAILABLE) == GL.GL_TRUE:
+                elapsed = ctypes.c_uint64()
+                GL.glGetQueryObjectui64v(query, GL.GL_QUERY_RESULT, ctypes.byref(elapsed))
+                self._samples(self.gpu_samples, name).append(elapsed.value / 1000000.0)
+                frame_gpu_ms += elapsed.value / 1000000.0
+            self.free_queries.append(query)
+        if len(queries) > 0:
+            self.last_frame_gpu_ms = frame_gpu_ms
+        queries.clear()
+    def begin(self, name: str) -> None:
+        """Start measuring pass with specified name."""
+        if not self.enabled:
+            return
+        if name not in self.order:
+            self.order.append(name)
+        if len(self.free_queries) == 0:
+            self.free_queries.append(int(GL.glGenQueries(1)[0]))
+        query = self.free_queries.pop()
+        self.frame_queries[self.frame % self.FRAMES_IN_FLIGHT][name] = query
+        GL.glBeginQuery(GL.GL_TIME_ELAPSED, query)
+        self.active = name
+        self.cpu_start = time.perf_counter()
+    def end(self) -> None:
+        """Finish measuring current pass."""
+        if self.active is None:
+            return
+        cpu_ms = (time.perf_counter() - self.cpu_start) * 1000.0
+        GL.glEndQuery(GL.GL_TIME_ELAPSED)
+        self._samples(self.cpu_samples, self.active).append(cpu_ms)
+        self.active = None
+    def _samples(self, samples: Dict[str, deque], name: str) -> deque:
+        """Get rolling window of samples for pass."""
+        if name not in samples:
+            samples[name] = deque(maxlen=self.history)
+        return samples[name]
+    def timings(self) -> Dict[str, PassTiming]:
+        """Get averaged timings of all measured passes in execution order."""
+        result = {}
+        for name in self.order:
+            cpu = self.cpu_samples.get(name)
+            gpu = self.gpu_samples.get(name)
+            result[name] = PassTiming(sum(cpu) / len(cpu) if cpu else 0.0,
+                                        sum(gpu) / len(gpu) if gpu else 0.0)
+        return result
+    def reset(self) -> None:
+        """Forget collected samples."""
+        self.cpu_samples = {}
+        self.gpu_samples = {}
+        self.order = []
+    def __del__(self):
+        """Delete OpenGL query objects."""
+        queries = self.free_queries
+        for frame_queries in self.frame_queries:
+            queries += list(frame_queries.values())
+        if len(queries) > 0:
+            GL.glDeleteQueries(len(queries), queries)
@@ -0,0 +1,98 @@
+"""Ring buffer for per-frame dynamic data."""
+import ctypes
+from typing import Tuple
+from OpenGL import GL
+import numpy as np
+
+# uniform block and storage buffer bindings of ranges, the same as in shaders
+FRAME_BLOCK = 0
+OBJECT_BLOCK = 1
+# Rect block of tex_rect program, per-draw data as Object block of scene programs
+RECT_BLOCK = 1
+OBJECTS_BUFFER = 2
+
+class RingBuffer:
+    """Buffer split into FRAMES regions, one is written by CPU while GPU reads the others.
+
+    With GL 4.4 or ARB_buffer_storage the buffer is mapped once persistently and
+    coherently, allocations are NumPy views of the mapped memory, so data is
+    written straight to the buffer. Otherwise allocations are views of a staging
+    array and written range is uploaded with glBufferSubData before binding.
+    Fences make sure a region is not overwritten while GPU still reads it.
+    """
+
+    FRAMES = 3
+
+    def __init__(self, frame_size: int = 4 * 1024 * 1024):
+        """Create buffer with frame_size bytes for every frame."""
+        self.alignment = max(int(GL.glGetIntegerv(GL.GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT)),
+                            int(GL.glGetIntegerv(GL.GL_SHADER_STORAGE_BUFFER_OFFSET_ALIGNMENT)))
+        self.frame_size = self.align(frame_size)
+        size = self.frame_size * self.FRAMES
+        self.buffer = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, self.buffer)
+        self.persistent = bool(GL.glBufferStorage)
+        if self.persistent:
+            flags = GL.GL_MAP_WRITE_BIT | GL.GL_MAP_PERSISTENT_BIT | GL.GL_MAP_COHERENT_BIT
+            GL.glBufferStorage(GL.GL_COPY_WRITE_BUFFER, size, None, flags)
+            pointer = GL.glMapBufferRange(GL.GL_COPY_WRITE_BUFFER, 0, size, flags)
+            self.memory = np.frombuffer((ctypes.c_ubyte * size).from_address(pointer),
+                                        dtype=np.uint8)
+        else:
+            GL.glBufferData(GL.GL_COPY_WRITE_BUFFER, size, None, GL.GL_STREAM_DRAW)
+            self.memory = np.zeros(size, dtype=np.uint8)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+        self.fences = [None] * self.FRAMES
+        self.frame = 0
+        self.cursor = 0
+        # start of data which is not uploaded yet, used without persistent mapping
+        self.uploaded = 0
+    def align(self, offset: int) -> int:
+        """Round offset up to binding offset alignment."""
+        return (offset + self.alignment - 1) // self.alignment * self.alignment
+    def begin_frame(self) -> None:
+        """Switch to next region, wait until GPU finishes reading it."""
+        self.frame = (self.frame + 1) % self.FRAMES
+        fence = self.fences[self.frame]
+        if fence is not None:
+            while GL.glClientWaitSync(fence, GL.GL_SYNC_FLUSH_COMMANDS_BIT,
+                                        1000000) == GL.GL_TIMEOUT_EXPIRED:
+                pass
+            GL.glDeleteSync(fence)
+            self.fences[self.frame] = None
+        self.cursor = self.frame * self.frame_size
+        self.uploaded = self.cursor
+    def end_frame(self) -> None:
+        """Mark region as used by commands submitted in this frame."""
+        self.fences[self.frame] = GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+    def alloc(self, shape: Tuple[int, ...], dtype: np.dtype = np.float32) -> Tuple[int, np.ndarray]:
+        """Allocate array in current region. Return its offset in buffer and writable view."""
+        offset = self.align(self.cursor)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if offset + size > (self.frame + 1) * self.frame_size:
+            raise RuntimeError(f'Ring buffer frame size of {self.frame_size} bytes is exceeded')
+        self.cursor = offset + size
+        return offset, self.memory[offset:offset + size].view(dtype).reshape(shape)
+    def _upload(self) -> None:
+        """Upload data written since previous upload, if buffer is not mapped."""
+        if not self.persistent and self.cursor > self.uploaded:
+            GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, self.buffer)
+            GL.glBufferSubData(GL.GL_COPY_WRITE_BUFFER, self.uploaded, self.cursor - self.uploaded,
+                                self.memory[self.uploaded:self.cursor])
+            GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+            self.uploaded = self.cursor
+    def bind_range(self, target: GL.Constant, index: int, offset: int, size: int) -> None:
+        """Bind allocated range to indexed target, e.g. uniform block binding."""
+        self._upload()
+        GL.glBindBufferRange(target, index, self.buffer, offset, size)
+    def bind(self, target: GL.Constant) -> None:
+        """Bind whole buffer to target, e.g. for indirect draws by offset."""
+        self._upload()
+        GL.glBindBuffer(target, self.buffer)
+    def __del__(self):
+        """Delete buffer and fences."""
+        for fence in self.fences:
+            if fence is not None:
+                GL.glDeleteSync(fence)
+        self.memory = None
+        GL.glDeleteBuffers(1, [self.buffer])
@@ -104,16 +104,6 @@ class RTargetManager:
     def bind(self, width: int, height: int, formats: List[GL.Constant] = None,
                 needs_depth: bool = False) -> None:
         """Find, setup and bind framebuffer with specified propierties."""
-        found = list(filter(lambda fb_descr: fb_descr[0] == width
-                                    and fb_descr[1] == height, self.framebuffers))
-        if len(found) == 0:
-            found = Framebuffer()
-            self.framebuffers.append((width, height, found))
-        else:
-            found = found[0][2]
-        if self.active:
-            self.active.unbind()
-        self.active = found
         textures = []
         depth = None
         if formats:
@@ -139,6 +129,21 @@ class RTargetManager:
                 self.dtargets.append(depth_target)
                 found_tex = depth_target.get_tex()
             depth = found_tex
+        self.bind_textures(width, height, textures, depth)
+    def bind_textures(self, width: int, height: int, textures: List[TexHolder],
+                        depth: TexHolder = None) -> None:
+        """Bind framebuffer with explicitly specified textures, which are owned by caller."""
+        found = list(filter(lambda fb_descr: fb_descr[0] == width
+                                    and fb_descr[1] == height, self.framebuffers))
+        if len(found) == 0:
+            found = Framebuffer()
+            self.framebuffers.append((width, height, found))
+        else:
+            found = found[0][2]
+        if self.active:
+            self.active.unbind()
+        self.active = found
+        if depth:
             GL.glEnable(GL.GL_DEPTH_TEST)
             GL.glDepthMask(GL.GL_TRUE)
         self.active.bind(textures, depth)
@@ -1,6 +1,12 @@
 """Shaders management."""
+import ctypes
+import hashlib
 import os
+import struct
+import time
+from typing import Dict, List, Tuple
 from OpenGL import GL
+from OpenGL.error import GLError
 
 class Shader:
     """Storage and management of OpenGL program object."""
@@ -10,10 +16,12 @@ class Shader:
         self.program = program
         self.uniforms = {}
         self.active_tex_slot = 0
+        self.active_image_slot = 0
     def use(self) -> None:
         """Use current program."""
         GL.glUseProgram(self.program)
         self.active_tex_slot = 0
+        self.active_image_slot = 0
     def uniform(self, name: str) -> int:
         """Get uniform locationby name."""
         if name in self.uniforms:
@@ -25,15 +33,29 @@ class Shader:
             self.uniforms[name] = uniform
             return uniform
         return -1
+    def texture_slot(self, name: str) -> Tuple[int, int] | None:
+        """Reserve texture unit for sampler uniform. Return unit and uniform location or None."""
+        uniform = self.uniform(name)
+        if uniform == -1:
+            return None
+        self.active_tex_slot += 1
+        return (self.active_tex_slot - 1, uniform)
     def set_texture(self, name: str, tex_id: int) -> None:
         """Set texture uniform."""
+        slot = self.texture_slot(name)
+        if slot is None:
+            return
+        GL.glActiveTexture(GL.GL_TEXTURE0 + slot[0])
+        GL.glBindTexture(GL.GL_TEXTURE_2D, tex_id)
+        GL.glUniform1i(slot[1], slot[0])
+    def set_image(self, name: str, tex_id: int, access: GL.Constant, fmt: GL.Constant) -> None:
+        """Set image uniform for load/store operations."""
         uniform = self.uniform(name)
         if uniform == -1:
             return
-        GL.glActiveTexture(GL.GL_TEXTURE0 + self.active_tex_slot)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, tex_id)
-        GL.glUniform1i(uniform, self.active_tex_slot)
-        self.active_tex_slot += 1
+        GL.glBindImageTexture(self.active_image_slot, tex_id, 0, GL.GL_FALSE, 0, access, fmt)
+        GL.glUniform1i(uniform, self.active_image_slot)
+        self.active_image_slot += 1
 
 class ShaderManager:
     """Management of all shaders, used by app."""
@@ -54,22 +76,113 @@ class ShaderManager:
     # if tessellation is enabled it should be used by both shaders
     TESSELLATION_SHADERS = [GL.GL_TESS_CONTROL_SHADER, GL.GL_TESS_EVALUATION_SHADER]
     COMPUTE_PIPELINE_SHADERS = [GL.GL_COMPUTE_SHADER]
+    # seconds between checks of shader files modification
+    POLL_PERIOD = 0.5
+    # stages without own file taken from other pipeline: name -> {shader type: pipeline name}
+    SHARED_STAGES = {
+        'mesh_render_mdi': {GL.GL_FRAGMENT_SHADER: 'mesh_render'},
+        'shadows_mdi': {GL.GL_FRAGMENT_SHADER: 'shadows'}
+    }
+
+    def __init__(self, shaders_folder_name: str, cache_folder: str = '.shader_cache'):
+        """Load all shaders from specified folder.
 
-    def __init__(self, shaders_folder_name: str):
-        """Load all shaders from specified folder."""
+        Linked program binaries are stored in cache_folder and reused on next start
+        if sources and driver are the same. Pass None to always compile from sources.
+        """
+        start = time.perf_counter()
         self.folder = shaders_folder_name
+        self.cache_folder = cache_folder
         self.program = None
+        self.stats = {'cached': 0, 'compiled': 0}
+        if self.cache_folder is not None:
+            if GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) == 0:
+                print('Program binaries are not supported by driver, cache is disabled')
+                self.cache_folder = None
+            else:
+                os.makedirs(self.cache_folder, exist_ok=True)
+        self.driver = '|'.join(GL.glGetString(name).decode('utf-8', 'replace')
+                                for name in [GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION])
+        # finally try to build pipelines and link programs
+        self.mtimes = self.file_mtimes()
+        self.last_poll = time.perf_counter()
+        self.programs = {}
+        for name, shaders in self.collect_pipelines().items():
+            program = self.build_program(name, shaders)
+            if program is not None:
+                self.programs[name] = Shader(program)
+        self.load_time = (time.perf_counter() - start) * 1000.0
+        print(f'Shaders loaded in {self.load_time:.1f} ms: {self.stats["cached"]} from cache, '
+                f'{self.stats["compiled"]} compiled')
+    def file_mtimes(self) -> Dict[str, float]:
+        """Get modification time of every shader file."""
+        mtimes = {}
+        for file in os.listdir(self.folder):
+            if os.path.splitext(file)[1] in self.SHADER_EXTENSIONS:
+                mtimes[file] = os.path.getmtime(os.path.join(self.folder, file))
+        return mtimes
+    def poll_changes(self, force: bool = False) -> List[str]:
+        """Rebuild pipelines which files were changed. Return names of replaced and removed ones.
+
+        Folder is checked at most once per POLL_PERIOD unless force is set.
+        If new version fails to build, previous program stays in use.
+        Programs which files were deleted or which pipeline became incomplete are removed.
+        """
+        now = time.perf_counter()
+        if not force and now - self.last_poll < self.POLL_PERIOD:
+            return []
+        self.last_poll = now
+        mtimes = self.file_mtimes()
+        if mtimes == self.mtimes:
+            return []
+        changed = set(os.path.splitext(file)[0] for file in set(mtimes) ^ set(self.mtimes))
+        changed.update(os.path.splitext(file)[0] for file, mtime in mtimes.items()
+                        if file in self.mtimes and self.mtimes[file] != mtime)
+        self.mtimes = mtimes
+        changed.update(name for name, stages in self.SHARED_STAGES.items()
+                        if len(changed & set(stages.values())) > 0)
+        reloaded = []
+        pipelines = self.collect_pipelines()
+        removed = sorted(name for name in changed
+                            if name in self.programs and name not in pipelines)
+        for name in removed:
+            GL.glDeleteProgram(self.programs.pop(name).program)
+            if self.program == name:
+                self.program = None
+        if len(removed) > 0:
+            print('Removed shaders:', ', '.join(removed))
+        for name, shaders in pipelines.items():
+            if name not in changed:
+                continue
+            program = self.build_program(name, shaders)
+            if program is None:
+                print(f'Previous version of "{name}" is kept')
+                continue
+            if name in self.programs:
+                GL.glDeleteProgram(self.programs[name].program)
+            self.programs[name] = Shader(program)
+            reloaded.append(name)
+        if len(reloaded) > 0:
+            print('Reloaded shaders:', ', '.join(reloaded))
+        return reloaded + removed
+    def collect_pipelines(self) -> Dict[str, List[GL.Constant]]:
+        """Find all complete pipelines in shaders folder and report on errors."""
         # load all possible pipelines grouped with shader names
         pipelines = {}
-        for _, _, files in os.walk(self.folder):
-            for file in files:
-                filename, ext = os.path.splitext(file)
-                if ext in self.SHADER_EXTENSIONS:
-                    shader_type = self.SHADER_EXTENSIONS[ext]
-                    if pipelines.get(filename):
-                        pipelines[filename].append(shader_type)
-                    else:
-                        pipelines[filename] = [shader_type]
+        for file in os.listdir(self.folder):
+            filename, ext = os.path.splitext(file)
+            if ext in self.SHADER_EXTENSIONS:
+                shader_type = self.SHADER_EXTENSIONS[ext]
+                if pipelines.get(filename):
+                    pipelines[filename].append(shader_type)
+                else:
+                    pipelines[filename] = [shader_type]
+        for name, stages in self.SHARED_STAGES.items():
+            for shader_type in stages:
+                if (name in pipelines and shader_type not in pipelines[name]
+                        and os.path.exists(os.path.join(self.folder,
+                                                        self.stage_file(name, shader_type)))):
+                    pipelines[name].append(shader_type)
         # filter not complete pipelines and report on errors
         filtered_pipelines = {}
         for name, shaders in pipelines.items():
@@ -92,37 +205,103 @@ class ShaderManager:
                             'but only one of tessellation stages has a shader')
                     failed = True
             if not failed:
-                filtered_pipelines[name] = shaders
-        # finally try to build pipelines and link programs
-        self.programs = {}
-        for name, shaders in filtered_pipelines.items():
-            failed = False
-            shader_ids = []
-            for sh_type in shaders:
-                filename = name + self.SHADER_EXTENSIONS_REV[sh_type]
-                with open(os.path.join(self.folder, filename), 'r', encoding='utf-8') as file:
-                    source = file.read()
-                shader = GL.glCreateShader(sh_type)
-                GL.glShaderSource(shader, source)
-                GL.glCompileShader(shader)
-                if GL.glGetShaderiv(shader, GL.GL_COMPILE_STATUS) != GL.GL_TRUE:
-                    print(f'Shader compilation of "{filename}" failed with error:')
-                    print(GL.glGetShaderInfoLog(shader).decode('ascii'))
-                    failed = True
-                else:
-                    shader_ids.append(shader)
-            if not failed:
-                program = GL.glCreateProgram()
-                for shader_id in shader_ids:
-                    GL.glAttachShader(program, shader_id)
-                    GL.glDeleteShader(shader_id)
-                GL.glLinkProgram(program)
-                if GL.glGetProgramiv(program, GL.GL_LINK_STATUS) != GL.GL_TRUE:
-                    print(f'Program linkage of "{filename}" failed with error:')
-                    print(GL.glGetProgramInfoLog(program).decode('ascii'))
-                    GL.glDeleteProgram(program)
-                else:
-                    self.programs[name] = Shader(program)
+                filtered_pipelines[name] = sorted(shaders)
+        return filtered_pipelines
+    def stage_file(self, name: str, sh_type: GL.Constant) -> str:
+        """Get file name of pipeline stage, own file or file of pipeline it is shared with."""
+        ext = self.SHADER_EXTENSIONS_REV[sh_type]
+        shared = self.SHARED_STAGES.get(name, {}).get(sh_type)
+        if shared is not None and not os.path.exists(os.path.join(self.folder, name + ext)):
+            return shared + ext
+        return name + ext
+    def build_program(self, name: str, shaders: List[GL.Constant]) -> int:
+        """Build program from cached binary or from sources. Return None on failure."""
+        sources = {}
+        for sh_type in shaders:
+            filename = self.stage_file(name, sh_type)
+            with open(os.path.join(self.folder, filename), 'r', encoding='utf-8') as file:
+                sources[sh_type] = file.read()
+        cache_file = None
+        if self.cache_folder is not None:
+            key = hashlib.sha256(self.driver.encode('utf-8'))
+            for sh_type, source in sources.items():
+                key.update(self.SHADER_EXTENSIONS_REV[sh_type].encode('utf-8'))
+                key.update(source.encode('utf-8'))
+            cache_file = os.path.join(self.cache_folder, f'{name}_{key.hexdigest()[:32]}.bin')
+            program = self.load_binary(cache_file)
+            if program is not None:
+                self.stats['cached'] += 1
+                return program
+        failed = False
+        shader_ids = []
+        for sh_type, source in sources.items():
+            filename = self.stage_file(name, sh_type)
+            shader = GL.glCreateShader(sh_type)
+            GL.glShaderSource(shader, source)
+            GL.glCompileShader(shader)
+            if GL.glGetShaderiv(shader, GL.GL_COMPILE_STATUS) != GL.GL_TRUE:
+                print(f'Shader compilation of "{filename}" failed with error:')
+                print(GL.glGetShaderInfoLog(shader).decode('ascii'))
+                GL.glDeleteShader(shader)
+                failed = True
+            else:
+                shader_ids.append(shader)
+        if failed:
+            for shader_id in shader_ids:
+                GL.glDeleteShader(shader_id)
+            return None
+        program = GL.glCreateProgram()
+        for shader_id in shader_ids:
+            GL.glAttachShader(program, shader_id)
+            GL.glDeleteShader(shader_id)
+        if cache_file is not None:
+            GL.glProgramParameteri(program, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
+        GL.glLinkProgram(program)
+        if GL.glGetProgramiv(program, GL.GL_LINK_STATUS) != GL.GL_TRUE:
+            print(f'Program linkage of "{name}" failed with error:')
+            print(GL.glGetProgramInfoLog(program).decode('ascii'))
+            GL.glDeleteProgram(program)
+            return None
+        self.stats['compiled'] += 1
+        if cache_file is not None:
+            self.save_binary(program, cache_file)
+        return program
+    @staticmethod
+    def load_binary(cache_file: str) -> int:
+        """Create program from cached binary. Return None if there is no valid binary."""
+        if not os.path.exists(cache_file):
+            return None
+        with open(cache_file, 'rb') as file:
+            data = file.read()
+        if len(data) <= 4:
+            return None
+        binary_format = struct.unpack('<I', data[:4])[0]
+        program = GL.glCreateProgram()
+        try:
+            GL.glProgramBinary(program, binary_format, data[4:], len(data) - 4)
+        except GLError:
+            # unknown binary format
+            GL.glDeleteProgram(program)
+            return None
+        if GL.glGetProgramiv(program, GL.GL_LINK_STATUS) != GL.GL_TRUE:
+            # driver rejected the binary, e.g. after driver update
+            GL.glDeleteProgram(program)
+            return None
+        return program
+    @staticmethod
+    def save_binary(program: int, cache_file: str) -> None:
+        """Store linked program binary."""
+        length = GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH)
+        if length <= 0:
+            return
+        binary = (ctypes.c_ubyte * length)()
+        binary_format = GL.GLenum()
+        written = GL.GLsizei()
+        GL.glGetProgramBinary(program, length, ctypes.byref(written),
+                                ctypes.byref(binary_format), binary)
+        with open(cache_file, 'wb') as file:
+            file.write(struct.pack('<I', binary_format.value))
+            file.write(bytes(binary)[:written.value])
     def use_program(self, shader_name: str) -> None:
         """Use shader with specified name."""
         if shader_name in self.programs:
@@ -140,6 +319,19 @@ class ShaderManager:
         """Bind texture to currently active shader."""
         if self.program is not None:
             self.programs[self.program].set_texture(uniform_name, tex_id)
+    def texture_slot(self, uniform_name: str) -> Tuple[int, int] | None:
+        """Reserve texture unit of currently active shader, see Shader.texture_slot."""
+        if self.program is not None:
+            return self.programs[self.program].texture_slot(uniform_name)
+        return None
+    def set_image(self, uniform_name: str, tex_id: int, access: GL.Constant,
+                    fmt: GL.Constant) -> None:
+        """Bind image to currently active shader."""
+        if self.program is not None:
+            self.programs[self.program].set_image(uniform_name, tex_id, access, fmt)
+    def has_program(self, shader_name: str) -> bool:
+        """Check if program with specified name was successfully built."""
+        return shader_name in self.programs
     def __del__(self):
         """Delete OpenGL program objects."""
         for program in self.programs.values():
@@ -0,0 +1,251 @@
+"""Asynchronous streaming of scene chunks around the camera."""
+import math
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple
+import glm
+from app_state import app_state
+from render.meshes import read_mesh
+from render.textures import read_image
+
+ChunkKey = Tuple[int, int]
+# resource is identified by its kind ('mesh' or 'texture') and file name
+ResourceKey = Tuple[str, str]
+
+@dataclass
+class StreamingDescr:
+    """Streaming settings. Distances are in world units on XZ plane."""
+
+    chunk_size: float = 1.0
+    load_radius: float = 2.0
+    # larger than load_radius, so chunks on the border do not reload every frame
+    unload_radius: float = 3.0
+    prefetch_distance: float = 1.0
+    budget_mb: float = 256.0
+    uploads_per_frame: int = 2
+    workers: int = 2
+
+@dataclass
+class StreamedResource:
+    """Mesh or texture shared by several chunks."""
+
+    refs: int = 0
+    size_bytes: int = 0
+    # estimated size while read is in flight
+    pending_bytes: int = 0
+    resident: bool = False
+    failed: bool = False
+    last_use: int = 0
+
+class SceneStreamer:
+    """Loads and unloads chunks of scene elements depending on camera position.
+
+    Files are read and decoded by worker threads, GL upload happens in update()
+    on the main thread. Meshes and textures are reference counted by requested
+    chunks. Unreferenced ones stay cached until memory budget is exceeded.
+    Reads in flight are counted against the budget with estimated sizes.
+    A chunk is drawn only when all its resources are loaded. Resources which
+    failed to load are forgotten when no chunk uses them, so they are read again
+    when their chunk is requested next time.
+    """
+
+    def __init__(self, elems: List, descr: StreamingDescr):
+        """Split elements with pos attribute into chunks."""
+        self.descr = descr
+        self.chunks = {}
+        for elem in elems:
+            self.chunks.setdefault(self.chunk_key(elem.pos), []).append(elem)
+        self.chunk_resources = {key: self._resources_of(chunk_elems)
+                                    for key, chunk_elems in self.chunks.items()}
+        self.requested = set()
+        self.resources = {}
+        self.futures = {}
+        self.executor = ThreadPoolExecutor(descr.workers)
+        self.frame = 0
+        self.prev_pos = None
+        self.over_budget = False
+        # incremented when set of visible elements can change
+        self.version = 0
+    @staticmethod
+    def _resources_of(elems: List) -> Set[ResourceKey]:
+        """Get all resources used by elements."""
+        return set([('mesh', elem.mesh_name) for elem in elems] +
+                    [('texture', elem.tex_name) for elem in elems])
+    def chunk_key(self, pos: glm.vec3) -> ChunkKey:
+        """Get key of the chunk containing position."""
+        return (math.floor(pos.x / self.descr.chunk_size),
+                math.floor(pos.z / self.descr.chunk_size))
+    def chunk_distance(self, key: ChunkKey, pos: glm.vec3) -> float:
+        """Get distance on XZ plane from position to chunk bounds."""
+        size = self.descr.chunk_size
+        d_x = max(key[0] * size - pos.x, 0.0, pos.x - (key[0] + 1) * size)
+        d_z = max(key[1] * size - pos.z, 0.0, pos.z - (key[1] + 1) * size)
+        return math.sqrt(d_x * d_x + d_z * d_z)
+    def chunks_around(self, pos: glm.vec3, radius: float) -> Set[ChunkKey]:
+        """Get non-empty chunks closer than radius to position."""
+        size = self.descr.chunk_size
+        result = set()
+        for i in range(math.floor((pos.x - radius) / size),
+                        math.floor((pos.x + radius) / size) + 1):
+            for j in range(math.floor((pos.z - radius) / size),
+                            math.floor((pos.z + radius) / size) + 1):
+                if (i, j) in self.chunks and self.chunk_distance((i, j), pos) <= radius:
+                    result.add((i, j))
+        return result
+    def chunks_along(self, pos: glm.vec3, direction: glm.vec3, distance: float) -> Set[ChunkKey]:
+        """Get non-empty chunks on the segment from position along direction."""
+        flat = glm.vec3(direction.x, 0.0, direction.z)
+        if glm.length(flat) == 0.0:
+            return set()
+        flat = glm.normalize(flat)
+        step = self.descr.chunk_size * 0.5
+        result = set()
+        for i in range(int(distance / step) + 1):
+            key = self.chunk_key(pos + flat * (i * step))
+            if key in self.chunks:
+                result.add(key)
+        return result
+    def prefetch(self, pos: glm.vec3, direction: glm.vec3, distance: float) -> None:
+        """Request chunks along direction of travel, they are loaded in background."""
+        self._request(sorted(self.chunks_along(pos, direction, distance),
+                                key=lambda key: self.chunk_distance(key, pos)))
+    def update(self, pos: glm.vec3, blocking: bool = False) -> None:
+        """Request chunks near position, release far ones and upload finished loads.
+
+        Chunks along movement since previous update are prefetched.
+        If blocking is set, waits until all requested chunks are loaded.
+        """
+        self.frame += 1
+        wanted = self.chunks_around(pos, self.descr.load_radius)
+        for key in list(self.requested):
+            if key not in wanted and self.chunk_distance(key, pos) > self.descr.unload_radius:
+                self._release(key)
+        self._request(sorted(wanted, key=lambda key: self.chunk_distance(key, pos)))
+        if self.prev_pos is not None:
+            self.prefetch(pos, pos - self.prev_pos, self.descr.prefetch_distance)
+        self.prev_pos = glm.vec3(pos)
+        self._collect(blocking)
+        self._evict()
+        if self.referenced_bytes() + self.pending_bytes() <= self.descr.budget_mb * 1024 * 1024:
+            self.over_budget = False
+    def _request(self, keys: Iterable[ChunkKey]) -> None:
+        """Reference resources of chunks and start loading missing ones, nearest first."""
+        for key in keys:
+            if key in self.requested:
+                continue
+            if self.referenced_bytes() + self.pending_bytes() > self.descr.budget_mb * 1024 * 1024:
+                if not self.over_budget:
+                    print(f'Streaming budget of {self.descr.budget_mb} MB exceeded, '
+                            'far chunks are not loaded')
+                self.over_budget = True
+                return
+            self.requested.add(key)
+            self.version += 1
+            for res_key in self.chunk_resources[key]:
+                resource = self.resources.setdefault(res_key, StreamedResource())
+                resource.refs += 1
+                if not resource.resident and not resource.failed and res_key not in self.futures:
+                    self.futures[res_key] = self._read(res_key)
+    def _release(self, key: ChunkKey) -> None:
+        """Drop references of chunk to its resources."""
+        self.requested.discard(key)
+        self.version += 1
+        for res_key in self.chunk_resources[key]:
+            resource = self.resources[res_key]
+            resource.refs -= 1
+            if resource.refs == 0 and resource.failed:
+                del self.resources[res_key]
+    def _read(self, res_key: ResourceKey) -> Future:
+        """Start reading and decoding resource file by worker thread."""
+        kind, name = res_key
+        if kind == 'mesh':
+            path = app_state().mesh_manager.path(name)
+        else:
+            path = app_state().texture_manager.path(name)
+        self.resources[res_key].pending_bytes = self._estimate(kind, path)
+        return self.executor.submit(read_mesh if kind == 'mesh' else read_image, path)
+    def _estimate(self, kind: str, path: str) -> int:
+        """Estimate uploaded size as average of resident resources of the kind or file size."""
+        sizes = [resource.size_bytes for res_key, resource in self.resources.items()
+                    if res_key[0] == kind and resource.resident]
+        if len(sizes) > 0:
+            return sum(sizes) // len(sizes)
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    def _collect(self, blocking: bool) -> None:
+        """Upload resources which were read by workers."""
+        uploads = 0
+        for res_key, future in list(self.futures.items()):
+            if not blocking and (uploads >= self.descr.uploads_per_frame or not future.done()):
+                continue
+            del self.futures[res_key]
+            resource = self.resources[res_key]
+            resource.pending_bytes = 0
+            try:
+                data = future.result()
+            except Exception as error:
+                print(f'Failed to load {res_key[0]} "{res_key[1]}": {error}')
+                resource.failed = True
+                self.version += 1
+                continue
+            if res_key[0] == 'mesh':
+                resource.size_bytes = app_state().mesh_manager.add(res_key[1], data)
+            else:
+                resource.size_bytes = app_state().texture_manager.add(res_key[1], data)
+            resource.resident = True
+            resource.last_use = self.frame
+            uploads += 1
+            self.version += 1
+    def _evict(self) -> None:
+        """Delete least recently used unreferenced resources while over budget."""
+        budget = self.descr.budget_mb * 1024 * 1024
+        unused = sorted([(resource.last_use, res_key) for res_key, resource
+                            in self.resources.items() if resource.resident and resource.refs == 0])
+        # room is made for reads in flight too
+        resident = self.resident_bytes() + self.pending_bytes()
+        for _, res_key in unused:
+            if resident <= budget:
+                break
+            resource = self.resources.pop(res_key)
+            if res_key[0] == 'mesh':
+                app_state().mesh_manager.remove(res_key[1])
+            else:
+                app_state().texture_manager.remove(res_key[1])
+            resident -= resource.size_bytes
+            self.version += 1
+    def visible_elems(self) -> List:
+        """Get elements of requested chunks which have finished loading.
+
+        Elements which mesh or texture failed to load are skipped.
+        """
+        result = []
+        for key in self.requested:
+            resources = [self.resources[res_key] for res_key in self.chunk_resources[key]]
+            if any(not resource.resident and not resource.failed for resource in resources):
+                continue
+            for resource in resources:
+                resource.last_use = self.frame
+            result += [elem for elem in self.chunks[key]
+                        if self.resources[('mesh', elem.mesh_name)].resident and
+                            self.resources[('texture', elem.tex_name)].resident]
+        return result
+    def resident_bytes(self) -> int:
+        """Get size of all uploaded resources."""
+        return sum(resource.size_bytes for resource in self.resources.values())
+    def pending_bytes(self) -> int:
+        """Get estimated size of resources which are being read."""
+        return sum(resource.pending_bytes for resource in self.resources.values())
+    def referenced_bytes(self) -> int:
+        """Get size of uploaded resources used by requested chunks."""
+        return sum(resource.size_bytes for resource in self.resources.values()
+                    if resource.refs > 0)
+    def stats(self) -> Dict[str, int]:
+        """Get number of requested chunks, pending loads and resident memory."""
+        return {'chunks': len(self.requested), 'pending': len(self.futures),
+                'pending_bytes': self.pending_bytes(), 'resident_bytes': self.resident_bytes()}
+    def __del__(self):
+        """Stop worker threads, pending reads are cancelled."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,192 @@
+"""Text rendering with a shared glyph atlas and single batched draw."""
+import ctypes
+from typing import Dict, Tuple
+from OpenGL import GL
+import numpy as np
+import pygame as pg
+from render.shaders import ShaderManager
+
+# vertex: screen position in pixels, atlas position in texels, color
+VERTEX_FLOATS = 8
+# empty texels around every glyph so linear filtering does not bleed into neighbours
+GLYPH_PADDING = 1
+
+class GlyphAtlas:
+    """Single channel texture with glyphs of all fonts, packed in shelves.
+
+    CPU copy of the atlas is kept, so the texture can grow without rasterizing
+    glyphs again. Texture coordinates are stored in texels, so growth does not
+    invalidate already laid out text.
+    """
+
+    def __init__(self, width: int = 1024, height: int = 512):
+        """Create empty atlas texture."""
+        self.pixels = np.zeros((height, width), dtype=np.uint8)
+        # glyph key -> (x, y, width, height) in atlas texels
+        self.glyphs = {}
+        self.shelf_x = 0
+        self.shelf_y = 0
+        self.shelf_height = 0
+        self.tex_id = GL.glGenTextures(1)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.tex_id)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self._upload_all()
+    def get(self, font: pg.font.Font, key: Tuple, char: str) -> Tuple[int, int, int, int]:
+        """Get glyph rectangle in atlas, rasterize and add glyph on first use."""
+        rect = self.glyphs.get(key)
+        if rect is None:
+            rect = self._add(font.render(char, True, (255, 255, 255)))
+            self.glyphs[key] = rect
+        return rect
+    def _add(self, surface: pg.Surface) -> Tuple[int, int, int, int]:
+        """Pack glyph surface into atlas."""
+        width, height = surface.get_size()
+        if self.shelf_x + width + GLYPH_PADDING > self.pixels.shape[1]:
+            self.shelf_x = 0
+            self.shelf_y += self.shelf_height
+            self.shelf_height = 0
+        while self.shelf_y + height + GLYPH_PADDING > self.pixels.shape[0]:
+            self._grow()
+        x_pos, y_pos = self.shelf_x, self.shelf_y
+        if width > 0 and height > 0:
+            coverage = pg.surfarray.array_alpha(surface).T
+            self.pixels[y_pos:y_pos + height, x_pos:x_pos + width] = coverage
+            GL.glBindTexture(GL.GL_TEXTURE_2D, self.tex_id)
+            GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+            GL.glTexSubImage2D(GL.GL_TEXTURE_2D, 0, x_pos, y_pos, width, height,
+                                GL.GL_RED, GL.GL_UNSIGNED_BYTE, np.ascontiguousarray(coverage))
+            GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
+            GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self.shelf_x += width + GLYPH_PADDING
+        self.shelf_height = max(self.shelf_height, height + GLYPH_PADDING)
+        return (x_pos, y_pos, width, height)
+    def _grow(self) -> None:
+        """Double atlas height keeping packed glyphs."""
+        pixels = np.zeros((self.pixels.shape[0] * 2, self.pixels.shape[1]), dtype=np.uint8)
+        pixels[:self.pixels.shape[0]] = self.pixels
+        self.pixels = pixels
+        self._upload_all()
+    def _upload_all(self) -> None:
+        """Upload whole CPU copy to texture."""
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.tex_id)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_R8, self.pixels.shape[1], self.pixels.shape[0],
+                            0, GL.GL_RED, GL.GL_UNSIGNED_BYTE, self.pixels)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+    def __del__(self):
+        """Delete atlas texture."""
+        GL.glDeleteTextures(1, [self.tex_id])
+
+class TextLayout:
+    """Quads of a string, laid out around its center in pixels."""
+
+    def __init__(self, vertices: np.ndarray, size: Tuple[int, int]):
+        """Save vertices and size of the string in pixels."""
+        self.vertices = vertices
+        self.size = size
+
+class TextRenderer:
+    """Font cache, glyph atlas and per-frame batch of text quads.
+
+    Text is queued during the frame and flushed with one draw call.
+    """
+
+    def __init__(self):
+        """Create empty font cache and atlas."""
+        if not pg.font.get_init():
+            pg.font.init()
+        self.fonts = {}
+        self.atlas = GlyphAtlas()
+        self.queue = []
+        self.vbo_size = 0
+        self.vao = GL.glGenVertexArrays(1)
+        self.vbo = GL.glGenBuffers(1)
+        GL.glBindVertexArray(self.vao)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        stride = VERTEX_FLOATS * 4
+        GL.glEnableVertexAttribArray(0)
+        GL.glVertexAttribPointer(0, 2, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(0))
+        GL.glEnableVertexAttribArray(1)
+        GL.glVertexAttribPointer(1, 2, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(8))
+        GL.glEnableVertexAttribArray(2)
+        GL.glVertexAttribPointer(2, 4, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(16))
+        GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+    def font(self, name: str, size: int) -> pg.font.Font:
+        """Get system font, fonts are looked up only once."""
+        key = (name, size)
+        if key not in self.fonts:
+            self.fonts[key] = pg.font.SysFont(name, size)
+        return self.fonts[key]
+    def layout(self, text: str, font_name: str, font_size: int,
+                color: Tuple[int, int, int, int]) -> TextLayout:
+        """Lay out string into quads, missing glyphs are added to atlas."""
+        font = self.font(font_name, font_size)
+        rects = [self.atlas.get(font, (font_name, font_size, char), char) for char in text]
+        width = sum(rect[2] for rect in rects)
+        height = max([font.get_height()] + [rect[3] for rect in rects])
+        vertices = np.zeros((len(rects) * 6, VERTEX_FLOATS), dtype=np.float32)
+        vertices[:, 4:8] = np.array(color, dtype=np.float32) / 255.0
+        x_pos = -width // 2
+        y_pos = -height // 2
+        for i, (atlas_x, atlas_y, glyph_w, glyph_h) in enumerate(rects):
+            left, right = x_pos, x_pos + glyph_w
+            top, bottom = y_pos, y_pos + glyph_h
+            corners = [(left, top, atlas_x, atlas_y),
+                        (left, bottom, atlas_x, atlas_y + glyph_h),
+                        (right, bottom, atlas_x + glyph_w, atlas_y + glyph_h),
+                        (right, top, atlas_x + glyph_w, atlas_y)]
+            vertices[i * 6:i * 6 + 6, 0:4] = [corners[j] for j in (0, 1, 2, 0, 2, 3)]
+            x_pos += glyph_w
+        return TextLayout(vertices, (width, height))
+    def add(self, layout: TextLayout, center: Tuple[float, float],
+            scale: Tuple[float, float] = (1.0, 1.0)) -> None:
+        """Queue laid out text with center in pixels for the next flush."""
+        if len(layout.vertices) == 0:
+            return
+        vertices = layout.vertices.copy()
+        vertices[:, 0] = vertices[:, 0] * scale[0] + round(center[0])
+        vertices[:, 1] = vertices[:, 1] * scale[1] + round(center[1])
+        self.queue.append(vertices)
+    def flush(self, shader_manager: ShaderManager, screen_res: Tuple[int, int]) -> None:
+        """Render all queued text with one draw call."""
+        if len(self.queue) == 0:
+            return
+        vertices = np.concatenate(self.queue)
+        self.queue = []
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        if vertices.nbytes > self.vbo_size:
+            self.vbo_size = max(vertices.nbytes, 2 * self.vbo_size)
+        # orphan previous storage, so the upload does not wait for last frame draw
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, self.vbo_size, None, GL.GL_STREAM_DRAW)
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        shader_manager.use_program('text')
+        GL.glUniform2f(shader_manager.get_uniform('screen_size'), *screen_res)
+        shader_manager.set_texture('atlas', self.atlas.tex_id)
+        blend = GL.glGetBooleanv(GL.GL_BLEND)
+        blend_src = GL.glGetIntegerv(GL.GL_BLEND_SRC_ALPHA)
+        blend_dst = GL.glGetIntegerv(GL.GL_BLEND_DST_ALPHA)
+        GL.glEnable(GL.GL_BLEND)
+        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+        GL.glBindVertexArray(self.vao)
+        GL.glDrawArrays(GL.GL_TRIANGLES, 0, len(vertices))
+        GL.glBindVertexArray(0)
+        if not blend:
+            GL.glDisable(GL.GL_BLEND)
+        else:
+            GL.glBlendFunc(blend_src, blend_dst)
+    def stats(self) -> Dict[str, int]:
+        """Get number of cached fonts and glyphs and atlas height."""
+        return {'fonts': len(self.fonts), 'glyphs': len(self.atlas.glyphs),
+                'atlas_height': self.atlas.pixels.shape[0]}
+    def __del__(self):
+        """Delete vertex buffer and array."""
+        GL.glDeleteBuffers(1, [self.vbo])
+        GL.glDeleteVertexArrays(1, [self.vao])
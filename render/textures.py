@@ -1,14 +1,30 @@
 """Textures management."""
 import os
+from dataclasses import dataclass
 from PIL import Image
 from OpenGL import GL
 
+@dataclass
+class ImageData:
+    """Decoded RGBA image, ready for upload."""
+
+    width: int
+    height: int
+    pixels: bytes
+
+def read_image(filename: str) -> ImageData:
+    """Decode image file. Does not use OpenGL, so can be called from any thread."""
+    img = Image.open(filename, 'r')
+    channels = len(img.getbands())
+    return ImageData(img.size[0], img.size[1],
+                        img.tobytes("raw", "RGBX") if channels == 3 else img.tobytes("raw"))
+
 class Texture:
     """Texture creation and storage control."""
 
-    def __init__(self, filename: str, wrap_mode: GL.Constant, filtering: GL.Constant, mips: bool):
-        """Load texture from filename and set filtering mode."""
-        img = Image.open(filename, 'r')
+    def __init__(self, image: ImageData, wrap_mode: GL.Constant, filtering: GL.Constant,
+                    mips: bool):
+        """Create texture from decoded image and set filtering mode."""
         self.tex_id = GL.glGenTextures(1)
         GL.glActiveTexture(GL.GL_TEXTURE0)
         GL.glBindTexture(GL.GL_TEXTURE_2D, self.tex_id)
@@ -23,9 +39,11 @@ class Texture:
                 min_f = GL.GL_NEAREST_MIPMAP_LINEAR
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, min_f)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, mag_f)
-        channels = len(img.getbands())
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, img.size[0], img.size[1], 0, GL.GL_RGBA,
-         GL.GL_UNSIGNED_BYTE, img.tobytes("raw", "RGBX") if channels == 3 else img.tobytes("raw"))
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, image.width, image.height, 0, GL.GL_RGBA,
+                        GL.GL_UNSIGNED_BYTE, image.pixels)
+        self.size_bytes = image.width * image.height * 4
+        if mips:
+            self.size_bytes = self.size_bytes * 4 // 3
         if mips:
             GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
         GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
@@ -48,8 +66,19 @@ class TextureManager:
         """Get texture id by name. Load new if none found."""
         if filename not in self.textures:
             self.textures[filename] = Texture(
-                os.path.join(self.folder_name, filename), wrap_mode, filtering, mips)
+                read_image(os.path.join(self.folder_name, filename)), wrap_mode, filtering, mips)
         return self.textures[filename].get()
+    def path(self, filename: str) -> str:
+        """Get full path of texture file."""
+        return os.path.join(self.folder_name, filename)
+    def add(self, filename: str, image: ImageData, wrap_mode: GL.Constant = GL.GL_REPEAT,
+            filtering: GL.Constant = GL.GL_LINEAR, mips: bool = True) -> int:
+        """Upload image decoded in advance, return texture size in bytes."""
+        self.textures[filename] = Texture(image, wrap_mode, filtering, mips)
+        return self.textures[filename].size_bytes
+    def remove(self, filename: str) -> None:
+        """Delete texture, it is loaded again on next request."""
+        self.textures.pop(filename, None)
     def __del__(self):
         """Cleanup."""
         self.textures = {}
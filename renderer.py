@@ -1,115 +1,232 @@
 """Main draw call."""
+from dataclasses import dataclass
 from OpenGL import GL
 from app_state import app_state
+from render.graph import RenderGraph, PassContext, BACKBUFFER
+from render.blur import BlurChain, BLUR_PRESETS, SEPARABLE_TAPS, blur_timings, filter_pass
 from scene import Scene, Camera
 from ui_descr import UI
+from gui import ProfilerOverlay
 
-def draw(scene : Scene, interface: UI, camera: Camera):
-    """Render current scene and interface."""
-    # shadows
-    app_state().rt_manager.bind(1024, 1024, [GL.GL_RG32F], True)
+SHADOW_RES = (1024, 1024)
+
+BLUR_QUALITY = 'medium'
+# occlusion and its filtering in one compute dispatch if 'ssao_fused' program is available
+USE_COMPUTE_SSAO = True
+SSAO_TILE = 16
+# occlusion and DoF blur in one half resolution compute dispatch if 'post_fused' program
+# is available and DoF preset is a single separable blur at half resolution, as 'medium'
+USE_COMPUTE_POST = True
+POST_TILE = 32
+# texels around the tile kept by post_fused.comp for color blur, R of the shader
+POST_APRON = 4
+FAR_DOF_RANGE = (0.85, 0.9)
+BLUR_CHAINS = []
+# GPU time of blur chains measured for every used preset
+BLUR_PRESET_TIMINGS = {}
+# passes computing occlusion or DoF blur outside of blur chains, counted with the chains,
+# so presets which use fused compute passes compare with the others
+BLUR_PASSES = ['ssao', 'post']
+
+@dataclass
+class FrameParams:
+    """Per-frame data passed to render passes."""
+
+    scene: Scene
+    interface: UI
+    camera: Camera
+
+def screen_res():
+    """Get full screen resolution."""
+    return app_state().screen_res
+
+def render_res():
+    """Get internal resolution of scene passes, scaled by dynamic resolution controller."""
+    return app_state().dynamic_resolution.scaled(app_state().screen_res)
+
+def half_render_res():
+    """Get half of internal resolution."""
+    width, height = render_res()
+    return (max(1, width // 2), max(1, height // 2))
+
+def shadow_pass(ctx: PassContext) -> None:
+    """Render scene depth and its square from light view."""
     GL.glClearColor(0.0, 0.0, 0.0, 0.0)
     GL.glClear(GL.GL_DEPTH_BUFFER_BIT|GL.GL_COLOR_BUFFER_BIT)
-    scene.render_to_shadow()
-    depth = app_state().rt_manager.get_color(0)
-    app_state().rt_manager.set_linear_filter(depth.get_id())
-    # step 1 of filtering shadows
-    app_state().rt_manager.bind(1024, 1024, [GL.GL_RG32F], False)
-    app_state().shader_manager.use_program('blur')
-    GL.glUniform2f(app_state().shader_manager.get_uniform('offset'), 1.5 / 1024.0, 1.5 / 1024.0)
-    app_state().shader_manager.set_texture('source', depth.get_id())
-    app_state().mesh_manager.draw_fullscreen_triangle()
-    depth_filtered = app_state().rt_manager.get_color(0)
-    app_state().rt_manager.set_linear_filter(depth_filtered.get_id())
-    depth = None
-    # step 2 of filtering shadows
-    app_state().rt_manager.bind(1024, 1024, [GL.GL_RG32F], False)
-    app_state().shader_manager.use_program('blur')
-    GL.glUniform2f(app_state().shader_manager.get_uniform('offset'), 1.5 / 1024.0, 1.5 / 1024.0)
-    app_state().shader_manager.set_texture('source', depth_filtered.get_id())
-    app_state().mesh_manager.draw_fullscreen_triangle()
-    depth_filtered2 = app_state().rt_manager.get_color(0)
-    app_state().rt_manager.set_linear_filter(depth_filtered2.get_id())
-    depth_filtered = None
-    # render scene to intermeiate target
-    app_state().rt_manager.bind(*app_state().screen_res, [GL.GL_RGBA8], True)
+    ctx.params.scene.render_to_shadow()
+
+def scene_pass(ctx: PassContext) -> None:
+    """Render scene to intermediate target."""
     GL.glClearColor(0.3,0.3,0.6,0)
     GL.glClear(GL.GL_COLOR_BUFFER_BIT|GL.GL_DEPTH_BUFFER_BIT)
-    scene.render(camera, depth_filtered2.get_id())
-    depth_filtered2 = None
-    result = app_state().rt_manager.get_color(0)
-    depth = app_state().rt_manager.get_depth()
-    app_state().rt_manager.set_linear_filter(result.get_id())
-    # box blur for DoF
-    app_state().rt_manager.bind(*app_state().screen_res, [GL.GL_RGBA8], False)
-    app_state().shader_manager.use_program('blur')
-    GL.glUniform2f(app_state().shader_manager.get_uniform('offset'),
-                    1.5 / app_state().screen_res[0], 1.5 / app_state().screen_res[1])
-    app_state().shader_manager.set_texture('source', result.get_id())
-    app_state().mesh_manager.draw_fullscreen_triangle()
-    result_blurred = app_state().rt_manager.get_color(0)
-    app_state().rt_manager.set_linear_filter(result_blurred.get_id())
-    # ssao
-    app_state().rt_manager.bind(app_state().screen_res[0] // 2,
-                                app_state().screen_res[1] // 2, [GL.GL_R8], False)
+    ctx.params.scene.render(ctx.params.camera, ctx.tex('shadow_map'))
+
+def ssao_pass(ctx: PassContext) -> None:
+    """Compute screen space ambient occlusion at half resolution."""
     app_state().shader_manager.use_program('ssao')
-    app_state().shader_manager.set_texture('depthTex', depth.get_id())
-    app_state().mesh_manager.draw_fullscreen_triangle()
-    ssao = app_state().rt_manager.get_color(0)
-    app_state().rt_manager.set_linear_filter(ssao.get_id())
-    # ssao filtering
-    app_state().rt_manager.bind(app_state().screen_res[0] // 2,
-                                app_state().screen_res[1] // 2, [GL.GL_R8], False)
-    app_state().shader_manager.use_program('blur')
-    GL.glUniform2f(app_state().shader_manager.get_uniform('offset'),
-                    3.0 / app_state().screen_res[0], 3.0 / app_state().screen_res[1])
-    app_state().shader_manager.set_texture('source', ssao.get_id())
+    app_state().shader_manager.set_texture('depthTex', ctx.tex('scene_depth'))
     app_state().mesh_manager.draw_fullscreen_triangle()
-    ssao_blurred = app_state().rt_manager.get_color(0)
-    app_state().rt_manager.set_linear_filter(ssao_blurred.get_id())
-    ssao = None
-    if len(interface.buttons) > 0 or len(interface.sliders) > 0:
-        # vertical gauss blur (for UI)
-        app_state().rt_manager.bind(app_state().screen_res[0],
-                                    app_state().screen_res[1], [GL.GL_RGBA8], False)
-        app_state().shader_manager.use_program('blur_v')
-        GL.glUniform2f(app_state().shader_manager.get_uniform('offset'),
-                    1.0 / app_state().screen_res[0], 1.0 / app_state().screen_res[1])
-        app_state().shader_manager.set_texture('source', result.get_id())
-        app_state().mesh_manager.draw_fullscreen_triangle()
-        blur_v = app_state().rt_manager.get_color(0)
-        app_state().rt_manager.set_linear_filter(blur_v.get_id())
-        # horizontal gauss blur (for UI)
-        app_state().rt_manager.bind(app_state().screen_res[0],
-                                    app_state().screen_res[1], [GL.GL_RGBA8], False)
-        app_state().shader_manager.use_program('blur_h')
-        GL.glUniform2f(app_state().shader_manager.get_uniform('offset'),
-                    1.0 / app_state().screen_res[0], 1.0 / app_state().screen_res[1])
-        app_state().shader_manager.set_texture('source', blur_v.get_id())
-        app_state().mesh_manager.draw_fullscreen_triangle()
-        blur_g = app_state().rt_manager.get_color(0)
-        app_state().rt_manager.set_linear_filter(blur_g.get_id())
-        blur_v = None
-    else:
-        blur_g = None
-    # combine everything and render to screen
-    app_state().rt_manager.bind_fb0()
+
+def ssao_fused_pass(ctx: PassContext) -> None:
+    """Compute and filter ambient occlusion with single compute dispatch."""
+    width, height = ctx.size('ssao_blur')
+    app_state().shader_manager.use_program('ssao_fused')
+    app_state().shader_manager.set_texture('depthTex', ctx.tex('scene_depth'))
+    app_state().shader_manager.set_image('result', ctx.tex('ssao_blur'),
+                                            GL.GL_WRITE_ONLY, GL.GL_R8)
+    GL.glDispatchCompute((width + SSAO_TILE - 1) // SSAO_TILE,
+                            (height + SSAO_TILE - 1) // SSAO_TILE, 1)
+    GL.glMemoryBarrier(GL.GL_TEXTURE_FETCH_BARRIER_BIT)
+
+def resolve_pass(ctx: PassContext) -> None:
+    """Combine everything and render to screen."""
     app_state().shader_manager.use_program('resolve')
-    GL.glUniform2f(app_state().shader_manager.get_uniform('far_dof_range'), 0.85, 0.9)
-    app_state().shader_manager.set_texture('source', result.get_id())
-    app_state().shader_manager.set_texture('source_blurred', result_blurred.get_id())
-    app_state().shader_manager.set_texture('depth', depth.get_id())
-    app_state().shader_manager.set_texture('ssao', ssao_blurred.get_id())
+    GL.glUniform2f(app_state().shader_manager.get_uniform('far_dof_range'), *FAR_DOF_RANGE)
+    app_state().shader_manager.set_texture('source', ctx.tex('scene_color'))
+    app_state().shader_manager.set_texture('source_blurred', ctx.tex('dof_blur'))
+    app_state().shader_manager.set_texture('depth', ctx.tex('scene_depth'))
+    app_state().shader_manager.set_texture('ssao', ctx.tex('ssao_blur'))
     app_state().mesh_manager.draw_fullscreen_triangle()
-    depth = None
-    result = None
-    result_blurred = None
-    ssao_blurred = None
-    # UI
-    for button in interface.buttons:
-        button.render(blur_g.get_id())
-    for slider in interface.sliders:
-        slider.render(blur_g.get_id())
-    for obj in interface.others:
+
+def post_fused_pass(ctx: PassContext) -> None:
+    """Compute occlusion and downsampled DoF blur with single compute dispatch."""
+    width, height = ctx.size('dof_blur')
+    dof = BLUR_PRESETS[BLUR_QUALITY]['dof']
+    offsets, weights = SEPARABLE_TAPS[dof.mode]
+    app_state().shader_manager.use_program('post_fused')
+    GL.glUniform3f(app_state().shader_manager.get_uniform('tap_offsets'),
+                    *(offset * dof.spread for offset in offsets))
+    GL.glUniform3f(app_state().shader_manager.get_uniform('tap_weights'), *weights)
+    app_state().shader_manager.set_texture('source', ctx.tex('scene_color'))
+    app_state().shader_manager.set_texture('depth', ctx.tex('scene_depth'))
+    app_state().shader_manager.set_image('dof_result', ctx.tex('dof_blur'),
+                                            GL.GL_WRITE_ONLY, GL.GL_RGBA8)
+    app_state().shader_manager.set_image('ssao_result', ctx.tex('ssao_blur'),
+                                            GL.GL_WRITE_ONLY, GL.GL_R8)
+    GL.glDispatchCompute((width + POST_TILE - 1) // POST_TILE,
+                            (height + POST_TILE - 1) // POST_TILE, 1)
+    GL.glMemoryBarrier(GL.GL_TEXTURE_FETCH_BARRIER_BIT)
+
+def capture_pass(_: PassContext) -> None:
+    """Start asynchronous readback of resolved frame for recording and screenshots."""
+    app_state().frame_capture.capture(app_state().screen_res)
+
+def ui_widgets_pass(ctx: PassContext) -> None:
+    """Render buttons and sliders over blurred scene."""
+    interface = ctx.params.interface
+    interface.widget_batch.render(interface.buttons, interface.sliders, ctx.tex('ui_blur'))
+
+def ui_others_pass(ctx: PassContext) -> None:
+    """Render standalone UI elements."""
+    for obj in ctx.params.interface.others:
         obj[0].render((obj[1], obj[2]))
-    blur_g = None
+
+def ui_text_pass(_: PassContext) -> None:
+    """Render all text queued by UI elements with one draw."""
+    app_state().text_renderer.flush(app_state().shader_manager, app_state().screen_res)
+
+def use_compute_post() -> bool:
+    """Check if fused compute pass replaces DoF blur chain and occlusion passes.
+
+    Bilinear taps of the blur have to stay inside the apron, so wider blurs use the chain.
+    """
+    dof = BLUR_PRESETS[BLUR_QUALITY]['dof']
+    if not (USE_COMPUTE_POST and app_state().shader_manager.has_program('post_fused')
+            and dof.mode in SEPARABLE_TAPS and dof.downsample == 2 and dof.iterations == 1
+            and not dof.upsample):
+        return False
+    return max(SEPARABLE_TAPS[dof.mode][0]) * dof.spread <= POST_APRON - 0.5
+
+def declare_passes(graph: RenderGraph) -> None:
+    """Declare all targets and passes of the frame."""
+    graph.add_target('shadow_raw', SHADOW_RES, GL.GL_RG32F)
+    graph.add_target('shadow_zbuffer', SHADOW_RES, GL.GL_DEPTH24_STENCIL8)
+    graph.add_target('scene_color', render_res, GL.GL_RGBA8)
+    graph.add_target('scene_depth', render_res, GL.GL_DEPTH24_STENCIL8)
+    graph.add_target('ssao', half_render_res, GL.GL_R8)
+    graph.add_target('ui_blur_v', screen_res, GL.GL_RGBA8)
+    graph.add_target('ui_blur', screen_res, GL.GL_RGBA8)
+    preset = BLUR_PRESETS[BLUR_QUALITY]
+    BLUR_CHAINS.clear()
+    graph.add_pass('shadow', shadow_pass, writes=['shadow_raw'], depth='shadow_zbuffer')
+    BLUR_CHAINS.append(BlurChain(graph, 'shadow_blur', 'shadow_raw', 'shadow_map',
+                                    SHADOW_RES, GL.GL_RG32F, preset['shadow']))
+    graph.add_pass('scene', scene_pass, reads=['shadow_map'],
+                    writes=['scene_color'], depth='scene_depth')
+    if use_compute_post():
+        graph.add_target('dof_blur', half_render_res, GL.GL_RGBA8)
+        graph.add_target('ssao_blur', half_render_res, GL.GL_R8)
+        graph.add_pass('post', post_fused_pass, reads=['scene_color', 'scene_depth'],
+                        writes=['dof_blur', 'ssao_blur'], compute=True)
+    else:
+        BLUR_CHAINS.append(BlurChain(graph, 'dof_blur', 'scene_color', 'dof_blur',
+                                        render_res, GL.GL_RGBA8, preset['dof']))
+        if USE_COMPUTE_SSAO and app_state().shader_manager.has_program('ssao_fused'):
+            graph.add_target('ssao_blur', half_render_res, GL.GL_R8)
+            graph.add_pass('ssao', ssao_fused_pass, reads=['scene_depth'], writes=['ssao_blur'],
+                            compute=True)
+        else:
+            graph.add_pass('ssao', ssao_pass, reads=['scene_depth'], writes=['ssao'])
+            BLUR_CHAINS.append(BlurChain(graph, 'ssao_blur', 'ssao', 'ssao_blur',
+                                            half_render_res, GL.GL_R8, preset['ssao']))
+    graph.add_pass('resolve', resolve_pass,
+                    reads=['scene_color', 'dof_blur', 'scene_depth', 'ssao_blur'],
+                    writes=[BACKBUFFER])
+    # reads backbuffer, declared as its writer to be ordered after resolve and not culled
+    graph.add_pass('capture', capture_pass, writes=[BACKBUFFER])
+    # separable gauss blur for UI, culled if there are no widgets
+    graph.add_pass('ui_blur_v', filter_pass('blur_v', 'scene_color', (1.0, 1.0)),
+                    reads=['scene_color'], writes=['ui_blur_v'])
+    graph.add_pass('ui_blur_h', filter_pass('blur_h', 'ui_blur_v', (1.0, 1.0)),
+                    reads=['ui_blur_v'], writes=['ui_blur'])
+    graph.add_pass('ui_widgets', ui_widgets_pass, reads=['ui_blur'], writes=[BACKBUFFER])
+    graph.add_pass('ui_others', ui_others_pass, writes=[BACKBUFFER])
+    overlay = ProfilerOverlay()
+    graph.add_pass('profiler_overlay', lambda ctx: overlay.render(), writes=[BACKBUFFER])
+    graph.add_pass('ui_text', ui_text_pass, writes=[BACKBUFFER])
+
+def draw(scene : Scene, interface: UI, camera: Camera):
+    """Render current scene and interface."""
+    graph = app_state().render_graph
+    if len(graph.passes) == 0:
+        declare_passes(graph)
+    graph.set_enabled('ui_widgets', len(interface.buttons) > 0 or len(interface.sliders) > 0)
+    graph.set_enabled('profiler_overlay', app_state().profiler.overlay)
+    graph.set_enabled('capture', app_state().frame_capture.active)
+    app_state().frame_data.begin_frame()
+    scene.stream(camera)
+    scene.upload_frame_data()
+    graph.execute(FrameParams(scene, interface, camera))
+    app_state().frame_data.end_frame()
+    if app_state().dynamic_resolution.settled():
+        graph.trim_pool()
+
+def set_blur_quality(preset: str) -> None:
+    """Select blur preset, passes are redeclared on next draw."""
+    global BLUR_QUALITY
+    if preset not in BLUR_PRESETS:
+        print(f'Blur preset {preset} not found')
+        return
+    # samples of the outgoing preset are dropped by profiler reset
+    record_blur_timings()
+    BLUR_QUALITY = preset
+    app_state().render_graph.clear()
+    app_state().profiler.reset()
+
+def record_blur_timings() -> None:
+    """Store GPU time of blur chains of active preset if any frame was measured with it."""
+    timings = blur_timings(BLUR_CHAINS)
+    total = timings.pop('total')
+    measured = app_state().profiler.timings()
+    for name in BLUR_PASSES:
+        if name in measured:
+            timings[name] = measured[name].gpu_ms
+            total += timings[name]
+    timings['total'] = total
+    if total > 0.0:
+        BLUR_PRESET_TIMINGS[BLUR_QUALITY] = timings
+
+def blur_report():
+    """Get GPU time of blur chains and BLUR_PASSES for every preset measured so far."""
+    record_blur_timings()
+    return BLUR_PRESET_TIMINGS
@@ -1,10 +1,23 @@
 """Scene data storage and processing."""
+from contextlib import nullcontext
 from dataclasses import dataclass
 import json
-from typing import Tuple
+from typing import Dict, List, Tuple
 from OpenGL import GL
 import glm
+import numpy as np
 from app_state import app_state
+from render.streaming import SceneStreamer, StreamingDescr
+from render.drawlist import DrawItem, DrawList
+from render.commands import CommandList
+from render.lod import select_lod, LOD_THRESHOLDS, SHADOW_LOD_THRESHOLDS
+from render.ringbuffer import FRAME_BLOCK, OBJECT_BLOCK, OBJECTS_BUFFER, RECT_BLOCK
+
+MAT4_SIZE = 64
+# draw merged geometry with multi-draw indirect if '*_mdi' programs are available
+USE_MULTI_DRAW = True
+# replay recorded GL calls of scene passes while scene, light and camera do not change
+USE_COMMAND_LISTS = True
 
 @dataclass
 class SceneElem:
@@ -38,6 +51,28 @@ class Camera:
     pos: glm.vec3
     dir: glm.vec3
 
+def column_major(matrix: glm.mat4) -> np.ndarray:
+    """Get matrix elements in std140 order."""
+    return np.array(matrix, dtype=np.float32).T.reshape(-1)
+
+def model_matrices(elems: List[SceneElem], out: np.ndarray) -> None:
+    """Write column-major model matrices of elements to rows of out.
+
+    Matrices are the same as translate * scale * rotate around Y axis.
+    """
+    transforms = np.array([(elem.pos.x, elem.pos.y, elem.pos.z, elem.scale.x, elem.scale.y,
+                            elem.scale.z, elem.y_rotation) for elem in elems], dtype=np.float32)
+    cos = np.cos(transforms[:, 6])
+    sin = np.sin(transforms[:, 6])
+    out[:, :16] = 0.0
+    out[:, 0] = transforms[:, 3] * cos
+    out[:, 2] = -transforms[:, 5] * sin
+    out[:, 5] = transforms[:, 4]
+    out[:, 8] = transforms[:, 3] * sin
+    out[:, 10] = transforms[:, 5] * cos
+    out[:, 12:15] = transforms[:, 0:3]
+    out[:, 15] = 1.0
+
 class Scene:
     """Scene storage and processing."""
 
@@ -68,7 +103,129 @@ class Scene:
                                                 glm.vec3(position[0], position[1], position[2]),
                                                 float(y_rotation),
                                                 glm.vec3(scale[0], scale[1], scale[2])))
+            self.streamer = SceneStreamer(self.elems, StreamingDescr(**data.get('streaming', {})))
         self.billboard_list = []
+        # incremented by mark_changed() when elements are edited
+        self.edits = 0
+        # visible elements and their matrices, updated when scene version changes
+        self.frame_elems = []
+        self.objects_key = None
+        self.objects_buffer = GL.glGenBuffers(1)
+        self.objects_stride = 0
+        self.shadow_draws = DrawList()
+        self.main_draws = DrawList()
+        self.shadow_commands = CommandList()
+        self.main_commands = CommandList()
+    @property
+    def version(self) -> int:
+        """Get counter which changes when elements or their loaded state change."""
+        return self.edits + self.streamer.version
+    def mark_changed(self) -> None:
+        """Notify that elements were edited, so matrices and recorded passes are rebuilt."""
+        self.edits += 1
+    def stream(self, camera: Camera) -> None:
+        """Update loaded chunks for camera position, first call waits for loading."""
+        self.streamer.update(camera.pos, blocking=self.streamer.frame == 0)
+    @staticmethod
+    def multi_draw() -> bool:
+        """Check if merged geometry and multi-draw programs can be used."""
+        return USE_MULTI_DRAW and app_state().mesh_manager.merged is not None and \
+                app_state().shader_manager.has_program('mesh_render_mdi') and \
+                app_state().shader_manager.has_program('shadows_mdi')
+    def upload_frame_data(self) -> None:
+        """Write model matrices of visible elements to objects buffer if scene version changed.
+
+        Multi-draw path reads them as a tightly packed array, otherwise every
+        matrix is aligned for binding as a separate uniform block.
+        """
+        multi_draw = self.multi_draw()
+        if self.objects_key == (self.version, multi_draw):
+            return
+        self.objects_key = (self.version, multi_draw)
+        self.frame_elems = self.streamer.visible_elems()
+        if len(self.frame_elems) == 0:
+            return
+        self.objects_stride = MAT4_SIZE if multi_draw else app_state().frame_data.align(MAT4_SIZE)
+        objects = np.zeros((len(self.frame_elems), self.objects_stride // 4), dtype=np.float32)
+        model_matrices(self.frame_elems, objects)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, self.objects_buffer)
+        GL.glBufferData(GL.GL_COPY_WRITE_BUFFER, objects.nbytes, objects, GL.GL_DYNAMIC_DRAW)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+    def bind_object(self, commands: CommandList, idx: int) -> None:
+        """Bind model matrix of visible element to object uniform block."""
+        commands.bind_buffer_range(GL.GL_UNIFORM_BUFFER, OBJECT_BLOCK, self.objects_buffer,
+                                    idx * self.objects_stride, MAT4_SIZE)
+    @staticmethod
+    def indirect_commands(items: List[DrawItem]) -> np.ndarray:
+        """Get indirect draw commands of merged meshes.
+
+        Element index goes to base instance and selects the model matrix.
+        """
+        commands = np.zeros((len(items), 4), dtype=np.uint32)
+        for i, item in enumerate(items):
+            first, count = item.mesh.lod_range(item.lod)
+            # count, instance count, first vertex, base instance
+            commands[i] = (count, 1, first, item.index)
+        return commands
+    @staticmethod
+    def bind_texture(commands: CommandList, slot: Tuple[int, int] | None, tex_name: str) -> None:
+        """Bind element texture to reserved unit, draws without texture keep current one."""
+        if tex_name is not None and slot is not None:
+            commands.bind_texture(slot[0], app_state().texture_manager.get(tex_name), slot[1])
+    def submit(self, draw_list: DrawList, commands: CommandList, key: Tuple,
+                multi_draw: bool) -> None:
+        """Render sorted draws, replaying commands recorded with the same key if possible.
+
+        Textures and vertex arrays are bound on change. Multi-draw path makes
+        one indirect call per run of draws with the same texture.
+        """
+        if USE_COMMAND_LISTS and commands.valid(key):
+            commands.replay()
+            return
+        items = draw_list.sort()
+        if multi_draw:
+            commands.upload_indirect(self.indirect_commands(items))
+        with commands.record_if_stable(key) if USE_COMMAND_LISTS else nullcontext():
+            if len(items) == 0:
+                return
+            # one texture unit is reused by all draws
+            slot = None
+            if any(item.texture is not None for item in items):
+                slot = app_state().shader_manager.texture_slot('color_tex')
+            if multi_draw:
+                self.submit_indirect(items, commands, slot)
+                return
+            texture = None
+            vao = None
+            for item in items:
+                if item.texture != texture:
+                    self.bind_texture(commands, slot, item.texture)
+                    texture = item.texture
+                if item.mesh.vao != vao:
+                    commands.bind_vertex_array(item.mesh.vao)
+                    vao = item.mesh.vao
+                self.bind_object(commands, item.index)
+                commands.draw_arrays(GL.GL_TRIANGLES, *item.mesh.lod_range(item.lod))
+            commands.bind_vertex_array(0)
+    def submit_indirect(self, items: List[DrawItem], commands: CommandList,
+                        slot: Tuple[int, int] | None) -> None:
+        """Render draws with commands stored in indirect buffer of the list in the same order."""
+        commands.bind_buffer_range(GL.GL_SHADER_STORAGE_BUFFER, OBJECTS_BUFFER, self.objects_buffer,
+                                    0, len(self.frame_elems) * self.objects_stride)
+        commands.bind_buffer(GL.GL_DRAW_INDIRECT_BUFFER, commands.indirect_buffer)
+        commands.bind_vertex_array(app_state().mesh_manager.merged.vao)
+        start = 0
+        for i in range(1, len(items) + 1):
+            if i == len(items) or items[i].texture != items[start].texture:
+                self.bind_texture(commands, slot, items[start].texture)
+                commands.multi_draw_arrays_indirect(GL.GL_TRIANGLES, start * 16, i - start)
+                start = i
+        commands.bind_vertex_array(0)
+        commands.bind_buffer(GL.GL_DRAW_INDIRECT_BUFFER, 0)
+    def draw_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get draw and state change counts of last recorded frame and command list usage."""
+        return {'shadow': {**self.shadow_draws.stats, **self.shadow_commands.stats},
+                'main': {**self.main_draws.stats, **self.main_commands.stats}}
     def before_render(self) -> None:
         """Prepare for rendering."""
         self.billboard_list = []
@@ -82,15 +239,28 @@ class Scene:
         s_fov = self.shadow_fov
         light_p = glm.ortho(-s_fov, s_fov, -s_fov, s_fov, self.shadow_z_near, self.shadow_z_far)
         light_vp = light_p * light_v
-        app_state().shader_manager.use_program('shadows')
-        GL.glUniformMatrix4fv(app_state().shader_manager.get_uniform('VP'),
-                                1, GL.GL_FALSE, glm.value_ptr(light_vp))
-        for elem in self.elems:
-            matrix = glm.rotate(glm.scale(glm.translate(glm.mat4(1), elem.pos), elem.scale),
-                            elem.y_rotation, glm.vec3(0,1,0))
-            GL.glUniformMatrix4fv(app_state().shader_manager.get_uniform('M'),
-                                1, GL.GL_FALSE, glm.value_ptr(matrix))
-            app_state().mesh_manager.draw(elem.mesh_name)
+        multi_draw = self.multi_draw()
+        program = 'shadows_mdi' if multi_draw else 'shadows'
+        app_state().shader_manager.use_program(program)
+        if not app_state().shader_manager.has_program(program):
+            return
+        offset, frame = app_state().frame_data.alloc((16,))
+        frame[:] = column_major(light_vp)
+        app_state().frame_data.bind_range(GL.GL_UNIFORM_BUFFER, FRAME_BLOCK, offset, MAT4_SIZE)
+        # draws depend on scene, light and program object, which changes on shader reload
+        key = (self.version, multi_draw, app_state().shader_manager.programs[program].program,
+                tuple(self.light.pos), tuple(self.light.dir), s_fov)
+        if not (USE_COMMAND_LISTS and self.shadow_commands.valid(key)):
+            light_dir = glm.normalize(self.light.dir)
+            self.shadow_draws.clear()
+            for idx, elem in enumerate(self.frame_elems):
+                # orthographic projection: size does not depend on distance
+                mesh = app_state().mesh_manager.get(elem.mesh_name)
+                projected = mesh.radius * max(elem.scale) / s_fov
+                self.shadow_draws.add(DrawItem(program, None, elem.mesh_name, mesh,
+                                    select_lod(projected, SHADOW_LOD_THRESHOLDS, len(mesh.lods)),
+                                    glm.dot(elem.pos - self.light.pos, light_dir), idx))
+        self.submit(self.shadow_draws, self.shadow_commands, key, multi_draw)
     def render(self, camera: Camera, shadow_tex_id: int):
         """Render full scene for main pass."""
         # 3d scene elements
@@ -102,22 +272,34 @@ class Scene:
         light_p = glm.ortho(-s_fov, s_fov, -s_fov, s_fov, self.shadow_z_near, self.shadow_z_far)
         light_vp = light_p * light_v
         main_vp = projection * view
-        app_state().shader_manager.use_program('mesh_render')
-        app_state().shader_manager.set_texture('shadow', shadow_tex_id)
-        GL.glUniformMatrix4fv(app_state().shader_manager.get_uniform('VP'),
-                                1, GL.GL_FALSE, glm.value_ptr(main_vp))
-        GL.glUniformMatrix4fv(app_state().shader_manager.get_uniform('lightVP'),
-                                1, GL.GL_FALSE, glm.value_ptr(light_vp))
-        GL.glUniform3fv(app_state().shader_manager.get_uniform('lightPos'),
-                                1, glm.value_ptr(self.light.pos))
-        for elem in self.elems:
-            matrix = glm.rotate(glm.scale(glm.translate(glm.mat4(1), elem.pos), elem.scale),
-                            elem.y_rotation, glm.vec3(0,1,0))
-            GL.glUniformMatrix4fv(app_state().shader_manager.get_uniform('M'),
-                                1, GL.GL_FALSE, glm.value_ptr(matrix))
-            app_state().shader_manager.set_texture('color_tex',
-                                app_state().texture_manager.get(elem.tex_name))
-            app_state().mesh_manager.draw(elem.mesh_name)
+        multi_draw = self.multi_draw()
+        program = 'mesh_render_mdi' if multi_draw else 'mesh_render'
+        app_state().shader_manager.use_program(program)
+        # scene elements are skipped if program failed to build, billboards are still drawn
+        if app_state().shader_manager.has_program(program):
+            app_state().shader_manager.set_texture('shadow', shadow_tex_id)
+            # std140 block: VP, lightVP, lightPos
+            offset, frame = app_state().frame_data.alloc((36,))
+            frame[0:16] = column_major(main_vp)
+            frame[16:32] = column_major(light_vp)
+            frame[32:35] = np.array(self.light.pos)
+            app_state().frame_data.bind_range(GL.GL_UNIFORM_BUFFER, FRAME_BLOCK,
+                                                offset, frame.nbytes)
+            # LOD selection and draw order depend on camera, so moving camera records every frame
+            key = (self.version, multi_draw, app_state().shader_manager.programs[program].program,
+                    tuple(camera.pos), tuple(camera.dir))
+            if not (USE_COMMAND_LISTS and self.main_commands.valid(key)):
+                view_dir = glm.normalize(camera.dir)
+                self.main_draws.clear()
+                for idx, elem in enumerate(self.frame_elems):
+                    # radius of bounding sphere projected to fraction of screen height
+                    mesh = app_state().mesh_manager.get(elem.mesh_name)
+                    distance = max(glm.length(elem.pos - camera.pos), self.z_near)
+                    projected = mesh.radius * max(elem.scale) * abs(projection[1][1]) / distance
+                    self.main_draws.add(DrawItem(program, elem.tex_name, elem.mesh_name, mesh,
+                                        select_lod(projected, LOD_THRESHOLDS, len(mesh.lods)),
+                                        glm.dot(elem.pos - camera.pos, view_dir), idx))
+            self.submit(self.main_draws, self.main_commands, key, multi_draw)
         # billboards
         GL.glDisable(GL.GL_DEPTH_TEST)
         GL.glDepthMask(GL.GL_FALSE)
@@ -128,8 +310,10 @@ class Scene:
         GL.glEnable(GL.GL_BLEND)
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
         for obj in self.billboard_list:
-            GL.glUniform4f(app_state().shader_manager.get_uniform('pos_size'),
-                            obj.pos[0], 1.0-obj.pos[1], obj.size[0], obj.size[1])
+            offset, rect = app_state().frame_data.alloc((4,))
+            rect[:] = (obj.pos[0], 1.0-obj.pos[1], obj.size[0], obj.size[1])
+            app_state().frame_data.bind_range(GL.GL_UNIFORM_BUFFER, RECT_BLOCK,
+                                                offset, rect.nbytes)
             app_state().shader_manager.set_texture('source',
                                     app_state().texture_manager.get(obj.tex_name))
             app_state().mesh_manager.draw_quad()
@@ -137,3 +321,6 @@ class Scene:
             GL.glDisable(GL.GL_BLEND)
         else:
             GL.glBlendFunc(blend_src, blend_dst)
+    def __del__(self):
+        """Delete objects buffer."""
+        GL.glDeleteBuffers(1, [self.objects_buffer])
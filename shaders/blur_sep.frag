@@ -0,0 +1,21 @@
+#version 430 core
+
+in vec2 texcoords;
+
+uniform sampler2D source;
+// texel size along blur direction
+uniform vec2 offset;
+
+out vec4 color;
+
+// 9-tap gauss kernel with linear sampling: neighbouring taps are merged into one bilinear fetch
+const float offsets[3] = float[3](0.0, 1.3846153846, 3.2307692308);
+const float weights[3] = float[3](0.2270270270, 0.3162162162, 0.0702702703);
+
+void main()
+{
+    vec4 res = texture(source, texcoords) * weights[0];
+    for (int i = 1; i < 3; i++)
+        res += (texture(source, texcoords + offset * offsets[i]) + texture(source, texcoords - offset * offsets[i])) * weights[i];
+    color = res;
+}
@@ -0,0 +1,38 @@
+#version 430 core
+
+in vec2 texcoords;
+flat in vec4 widget_pos_size;
+flat in vec3 widget_background;
+flat in vec3 widget_frame_color;
+flat in vec2 widget_frame_corner;
+
+uniform sampler2D source;
+
+uniform vec2 screen_size;
+
+out vec4 color;
+
+void main()
+{
+    color = texture(source, texcoords);
+
+    float frame = widget_frame_corner.x;
+    float corner = widget_frame_corner.y;
+    vec2 crd = gl_FragCoord.xy;
+    vec2 centered = abs(crd - screen_size*widget_pos_size.xy);
+    vec2 to_border_pixels = screen_size * widget_pos_size.zw * 0.5 - centered;
+    vec3 mul = widget_background;
+    if (to_border_pixels.x < corner && to_border_pixels.y < corner)
+    {
+        vec2 rxy = to_border_pixels - corner;
+        float sq_dist = rxy.x * rxy.x + rxy.y * rxy.y;
+        float cf = corner - frame;
+        if (sq_dist > corner * corner)
+            discard;
+        else if (sq_dist > cf * cf)
+            mul = widget_frame_color;
+    }
+    else if (to_border_pixels.x < frame || to_border_pixels.y < frame)
+        mul = widget_frame_color;
+    color *= vec4(mul, 1.0);
+}
\ No newline at end of file
@@ -0,0 +1,23 @@
+#version 430 core
+
+layout(location = 0) in vec4 pos_size;
+layout(location = 1) in vec3 background_color;
+layout(location = 2) in vec3 frame_color;
+layout(location = 3) in vec2 frame_corner;
+
+out vec2 texcoords;
+flat out vec4 widget_pos_size;
+flat out vec3 widget_background;
+flat out vec3 widget_frame_color;
+flat out vec2 widget_frame_corner;
+
+void main()
+{
+    vec2 vertices[6] = vec2[6](vec2(-1, -1), vec2(-1, 1), vec2(1, 1),    vec2(-1, -1), vec2(1, 1), vec2(1, -1));
+    gl_Position = vec4(vertices[gl_VertexID]*pos_size.zw + (pos_size.xy * 2.0 - 1.0), 0, 1);
+    texcoords = 0.5 * gl_Position.xy + vec2(0.5);
+    widget_pos_size = pos_size;
+    widget_background = background_color;
+    widget_frame_color = frame_color;
+    widget_frame_corner = frame_corner;
+}
\ No newline at end of file
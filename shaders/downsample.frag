@@ -0,0 +1,18 @@
+#version 430 core
+
+in vec2 texcoords;
+
+uniform sampler2D source;
+// offset of bilinear taps in source texture coordinates
+uniform vec2 offset;
+
+out vec4 color;
+
+void main()
+{
+    vec4 value = texture(source, texcoords + vec2(-offset.x, -offset.y));
+    value += texture(source, texcoords + vec2(offset.x, -offset.y));
+    value += texture(source, texcoords + vec2(-offset.x, offset.y));
+    value += texture(source, texcoords + vec2(offset.x, offset.y));
+    color = value * 0.25;
+}
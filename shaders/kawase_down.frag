@@ -0,0 +1,19 @@
+#version 430 core
+
+in vec2 texcoords;
+
+uniform sampler2D source;
+// half texel of source texture
+uniform vec2 offset;
+
+out vec4 color;
+
+void main()
+{
+    vec4 sum = texture(source, texcoords) * 4.0;
+    sum += texture(source, texcoords - offset);
+    sum += texture(source, texcoords + offset);
+    sum += texture(source, texcoords + vec2(offset.x, -offset.y));
+    sum += texture(source, texcoords - vec2(offset.x, -offset.y));
+    color = sum / 8.0;
+}
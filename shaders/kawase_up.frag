@@ -0,0 +1,22 @@
+#version 430 core
+
+in vec2 texcoords;
+
+uniform sampler2D source;
+// half texel of source texture
+uniform vec2 offset;
+
+out vec4 color;
+
+void main()
+{
+    vec4 sum = texture(source, texcoords + vec2(-offset.x * 2.0, 0.0));
+    sum += texture(source, texcoords + vec2(-offset.x, offset.y)) * 2.0;
+    sum += texture(source, texcoords + vec2(0.0, offset.y * 2.0));
+    sum += texture(source, texcoords + vec2(offset.x, offset.y)) * 2.0;
+    sum += texture(source, texcoords + vec2(offset.x * 2.0, 0.0));
+    sum += texture(source, texcoords + vec2(offset.x, -offset.y)) * 2.0;
+    sum += texture(source, texcoords + vec2(0.0, -offset.y * 2.0));
+    sum += texture(source, texcoords + vec2(-offset.x, -offset.y)) * 2.0;
+    color = sum / 12.0;
+}
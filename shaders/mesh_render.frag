@@ -1,7 +1,13 @@
 #version 430 core
 
 uniform sampler2D shadow;
-uniform vec3 lightPos;
+
+layout(std140, binding = 0) uniform Frame
+{
+    mat4 VP;
+    mat4 lightVP;
+    vec4 lightPos;
+};
 
 in vec3 nrml;
 in vec2 tcrd;
@@ -30,7 +36,7 @@ void main()
     vec4 lcrd = lightCrd / lightCrd.w;
     vec2 shadowDepth = texture(shadow, lcrd.xy * 0.5 + 0.5).rg;
     float realDepth = lightCrd.z;
-    vec3 lightDir = lightPos - p;
+    vec3 lightDir = lightPos.xyz - p;
     color = vec4(0.3) + clamp(dot(normalize(lightDir), nrml), 0.0, 1.0);
     color *= (0.2 + 0.8 * vsm(shadowDepth, realDepth));
 }
\ No newline at end of file
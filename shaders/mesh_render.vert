@@ -9,9 +9,17 @@ out vec2 tcrd;
 out vec4 lightCrd;
 out vec3 p;
 
-uniform mat4 VP;
-uniform mat4 M;
-uniform mat4 lightVP;
+layout(std140, binding = 0) uniform Frame
+{
+    mat4 VP;
+    mat4 lightVP;
+    vec4 lightPos;
+};
+
+layout(std140, binding = 1) uniform Object
+{
+    mat4 M;
+};
 
 void main()
 {
@@ -0,0 +1,34 @@
+#version 430 core
+#extension GL_ARB_shader_draw_parameters : require
+
+layout(location=0) in vec3 pos;
+layout(location=1) in vec3 normal;
+layout(location=2) in vec2 texcoord;
+
+out vec3 nrml;
+out vec2 tcrd;
+out vec4 lightCrd;
+out vec3 p;
+
+layout(std140, binding = 0) uniform Frame
+{
+    mat4 VP;
+    mat4 lightVP;
+    vec4 lightPos;
+};
+
+// model matrices of all drawn elements, indexed by base instance of draw command
+layout(std430, binding = 2) readonly buffer Objects
+{
+    mat4 models[];
+};
+
+void main()
+{
+    mat4 M = models[gl_BaseInstanceARB];
+    gl_Position = VP * M * vec4(pos, 1);
+    nrml = (M * vec4(normal, 0.0)).xyz;
+    tcrd = texcoord;
+    lightCrd = lightVP * M * vec4(pos, 1);
+    p = (M * vec4(pos, 1)).xyz;
+}
\ No newline at end of file
@@ -2,8 +2,15 @@
 
 layout(location=0) in vec3 pos;
 
-uniform mat4 VP;
-uniform mat4 M;
+layout(std140, binding = 0) uniform Frame
+{
+    mat4 VP;
+};
+
+layout(std140, binding = 1) uniform Object
+{
+    mat4 M;
+};
 
 out float depth;
 
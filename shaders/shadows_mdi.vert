@@ -0,0 +1,24 @@
+#version 430 core
+#extension GL_ARB_shader_draw_parameters : require
+
+layout(location=0) in vec3 pos;
+
+layout(std140, binding = 0) uniform Frame
+{
+    mat4 VP;
+};
+
+// model matrices of all drawn elements, indexed by base instance of draw command
+layout(std430, binding = 2) readonly buffer Objects
+{
+    mat4 models[];
+};
+
+out float depth;
+
+void main()
+{
+    mat4 M = models[gl_BaseInstanceARB];
+    gl_Position = VP * M * vec4(pos, 1);
+    depth = gl_Position.z; 
+}
\ No newline at end of file
@@ -1,6 +1,9 @@
 #version 430 core
 
-uniform vec4 pos_size;
+layout(std140, binding = 1) uniform Rect
+{
+    vec4 pos_size;
+};
 
 out vec2 texcoords;
 
@@ -0,0 +1,14 @@
+#version 430 core
+
+in vec2 texcoords;
+in vec4 text_color;
+
+uniform sampler2D atlas;
+
+out vec4 color;
+
+void main()
+{
+    float coverage = texture(atlas, texcoords / vec2(textureSize(atlas, 0))).r;
+    color = vec4(text_color.rgb, text_color.a * coverage);
+}
\ No newline at end of file
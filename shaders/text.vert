@@ -0,0 +1,18 @@
+#version 430 core
+
+layout(location = 0) in vec2 position;
+layout(location = 1) in vec2 atlas_pos;
+layout(location = 2) in vec4 color;
+
+uniform vec2 screen_size;
+
+out vec2 texcoords;
+out vec4 text_color;
+
+void main()
+{
+    vec2 ndc = position / screen_size * 2.0 - 1.0;
+    gl_Position = vec4(ndc.x, -ndc.y, 0, 1);
+    texcoords = atlas_pos;
+    text_color = color;
+}
\ No newline at end of file
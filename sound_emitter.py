@@ -0,0 +1,164 @@
+"""Module containing positioned sound sources for ECS."""
+
+
+from dataclasses import dataclass, field
+from typing import Tuple
+
+import esper
+import numpy as np
+
+from .physics import aabb
+
+
+# horizontal offset from listener at which sound is played only by one speaker
+PAN_DISTANCE = 400.0
+# smallest change of a speaker gain which is passed to mixer
+VOLUME_THRESHOLD = 0.02
+# frames before an emitter which lost its sound is started again
+RETRY_FRAMES = 30
+
+
+@dataclass
+class SoundEmitterComponent:
+    """
+    Sound emitter component for ECS, sound is positioned at the center of entity AABB.
+
+    :param handle: sound handle
+    :param volume: volume at the listener position
+    :param radius: distance at which sound fades out
+    :param loops: number of repeats after the first play, -1 = endlessly
+    :param playing: sound was started and was not stopped by the processor
+    :param left: last gain of left speaker passed to mixer
+    :param right: last gain of right speaker passed to mixer
+    :param retry_frame: processor frame from which emitter which lost its sound may start again
+    """
+
+    handle: int
+    volume: float = 1.0
+    radius: float = 500.0
+    loops: int = -1
+    playing: bool = field(default=False, compare=False)
+    left: float = field(default=0.0, compare=False)
+    right: float = field(default=0.0, compare=False)
+    retry_frame: int = field(default=0, compare=False)
+
+
+def emitter_gains(centers: np.ndarray, listener: np.ndarray, volumes: np.ndarray,
+                  radii: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute speaker gains of all emitters at once.
+
+    Volume falls quadratically to zero at the emitter radius, horizontal offset is
+    panned with constant power, so the emitter at the listener plays at full volume
+    by both speakers.
+
+    :param centers: emitter positions, array of shape (n, 2)
+    :param listener: listener position, array of shape (2,)
+    :param volumes: emitter volumes, array of shape (n,)
+    :param radii: emitter radii, array of shape (n,)
+
+    :return: gains of left and right speakers, arrays of shape (n,)
+    """
+    offsets = centers - listener
+    distances = np.hypot(offsets[:, 0], offsets[:, 1])
+    attenuation = volumes * np.clip(1.0 - distances / radii, 0.0, 1.0) ** 2
+    angles = (np.clip(offsets[:, 0] / PAN_DISTANCE, -1.0, 1.0) + 1.0) * (np.pi / 4.0)
+    left = np.minimum(np.cos(angles) * np.sqrt(2.0), 1.0) * attenuation
+    right = np.minimum(np.sin(angles) * np.sqrt(2.0), 1.0) * attenuation
+    return left, right
+
+
+class SoundEmitterProcessor(esper.Processor):
+    """
+    Sound emitter processor for ECS.
+
+    Gains of all emitters are computed in one vectorized pass relative to the listener
+    AABB. Mixer is called only for emitters whose gain changed by more than
+    VOLUME_THRESHOLD since the last call, so still emitters cost no audio calls.
+    Only max_voices loudest audible emitters play, so emitters do not steal voices
+    from each other, the others and emitters out of their radius are stopped and
+    free their channels. Sounds of deleted entities are stopped too. Entity id is
+    used as emitter id.
+    Starts are fire-and-forget, emitters whose sound was rejected, stolen or stopped
+    by other code are taken from take_lost_emitters and started again after
+    RETRY_FRAMES if they are still audible. A finished sound of an emitter with
+    finite loops is not restarted. Sounds of emitters need max_instances of at least
+    max_voices, otherwise emitters restart each other's sounds.
+    """
+
+    def __init__(self, audio, listener_entity: int, max_voices: int = 8):
+        """
+        Initialize sound emitter processor.
+
+        :param audio: AudioCommandQueue or AudioManager
+        :param listener_entity: entity with AABB of the listener, e.g. player
+        :param max_voices: maximum number of playing emitters, less than voice pool size
+        """
+        self.audio = audio
+        self.listener_entity = listener_entity
+        self.max_voices = max_voices
+        self.frame = 0
+        self.emitters = set()
+        self.stats = {'emitters': 0, 'started': 0, 'updated': 0, 'stopped': 0, 'lost': 0}
+
+    def process(self, *_):
+        """Update sounds of emitters."""
+        self.frame += 1
+        for ent in self.audio.take_lost_emitters():
+            self.emitters.discard(ent)
+            self.stats['lost'] += 1
+            if self.world.entity_exists(ent) and \
+                    (emitter := self.world.try_component(ent, SoundEmitterComponent)):
+                emitter.playing = False
+                emitter.retry_frame = self.frame + RETRY_FRAMES
+        entries = list(self.world.get_components(aabb.AABBComponent, SoundEmitterComponent))
+        listener = None
+        if self.world.entity_exists(self.listener_entity):
+            listener = self.world.try_component(self.listener_entity, aabb.AABBComponent)
+        self.stats['emitters'] = len(entries)
+
+        playing = set()
+        if listener is not None and len(entries) > 0:
+            data = np.array([(*box.pos, *box.dim, emitter.volume, emitter.radius,
+                              emitter.left, emitter.right, emitter.playing, emitter.retry_frame)
+                             for _, (box, emitter) in entries], dtype=np.float64)
+            centers = data[:, 0:2] + data[:, 2:4] * 0.5
+            left, right = emitter_gains(centers, np.array(listener.pos + listener.dim * 0.5),
+                                        data[:, 4], data[:, 5])
+            loudness = np.maximum(left, right)
+            was_playing = data[:, 8] > 0.0
+            audible = (loudness > 0.0) & (data[:, 9] <= self.frame)
+            if np.count_nonzero(audible) > self.max_voices:
+                # playing emitters are preferred, so close ranks do not swap every frame
+                rank = np.where(audible, loudness + VOLUME_THRESHOLD * was_playing, -1.0)
+                audible = np.zeros(len(entries), dtype=bool)
+                audible[np.argpartition(-rank, self.max_voices)[:self.max_voices]] = True
+            moved = np.maximum(np.abs(left - data[:, 6]), np.abs(right - data[:, 7]))
+            changed = (audible != was_playing) | (audible & (moved > VOLUME_THRESHOLD))
+
+            for idx in np.flatnonzero(changed):
+                ent, (_, emitter) = entries[idx]
+                emitter.left = float(left[idx])
+                emitter.right = float(right[idx])
+                if not audible[idx]:
+                    self.audio.stop_emitter(ent)
+                    self.emitters.discard(ent)
+                    emitter.playing = False
+                    self.stats['stopped'] += 1
+                elif emitter.playing:
+                    self.audio.set_emitter_volume(ent, emitter.left, emitter.right)
+                    self.stats['updated'] += 1
+                else:
+                    self.audio.play_emitter(ent, emitter.handle, emitter.left, emitter.right,
+                                            emitter.loops)
+                    emitter.playing = True
+                    self.stats['started'] += 1
+            playing = {ent for ent, (_, emitter) in entries if emitter.playing}
+        else:
+            for _, (_, emitter) in entries:
+                emitter.playing = False
+
+        for ent in self.emitters - playing:
+            self.audio.stop_emitter(ent)
+            self.stats['stopped'] += 1
+        self.emitters = playing
@@ -0,0 +1,124 @@
+"""Sound emitter test is responsible for testing positioned sounds of ECS."""
+
+import os
+import unittest
+import esper
+import numpy as np
+from . import sound_emitter
+from .audiomanager import AudioManager
+from .audioqueue import AudioCommandQueue
+from .physics import aabb
+
+
+
+class SoundEmitterTest(unittest.TestCase):
+    """Test class for validating sound emitters."""
+
+    def setUp(self):
+        """Create world with listener and emitters next to it, to the right and far away."""
+        base_dir = os.path.dirname(__file__)
+        self.audio_manager = AudioManager()
+        self.audio_manager.init_sounds(os.path.join(base_dir, 'assets', 'testsounds'), "")
+        handle = self.audio_manager.get_sound_handle('pop1.wav')
+        self.audio_manager.set_sound_priority(handle, 0, 4)
+
+        self.world = esper.World()
+        self.listener = self.world.create_entity(aabb.AABBComponent([0, 0], [10, 10]))
+        self.near = self.world.create_entity(aabb.AABBComponent([0, 0], [10, 10]),
+                                             sound_emitter.SoundEmitterComponent(handle))
+        self.right = self.world.create_entity(aabb.AABBComponent([200, 0], [10, 10]),
+                                              sound_emitter.SoundEmitterComponent(handle))
+        self.far = self.world.create_entity(aabb.AABBComponent([1000, 0], [10, 10]),
+                                            sound_emitter.SoundEmitterComponent(handle))
+        self.processor = sound_emitter.SoundEmitterProcessor(self.audio_manager, self.listener)
+        self.world.add_processor(self.processor)
+
+    def tearDown(self):
+        """Stop sounds of emitters, they are not reported as lost to next tests."""
+        self.audio_manager.stop_all_sounds()
+        self.audio_manager.take_lost_emitters()
+
+    def test_gains(self):
+        """Checking attenuation by distance and panning."""
+        centers = np.array([[0.0, 0.0], [250.0, 0.0], [-400.0, 0.0], [0.0, 600.0]])
+        left, right = sound_emitter.emitter_gains(centers, np.array([0.0, 0.0]),
+                                                  np.full(4, 0.5), np.full(4, 500.0))
+        self.assertAlmostEqual(left[0], 0.5)
+        self.assertAlmostEqual(right[0], 0.5)
+        self.assertLess(left[1], right[1])
+        self.assertAlmostEqual(right[1], 0.5 * 0.5 ** 2)
+        self.assertAlmostEqual(right[2], 0.0)
+        self.assertGreater(left[2], 0.0)
+        self.assertEqual((left[3], right[3]), (0.0, 0.0))
+
+    def test_processing(self):
+        """Checking that only audible emitters play and small moves do not call mixer."""
+        self.world.process(0.0)
+        self.assertEqual(self.processor.emitters, {self.near, self.right})
+        self.assertEqual(self.processor.stats['started'], 2)
+        voice = self.audio_manager.voices.emitter_voice(self.right)
+        self.assertLess(voice.left, voice.right)
+        self.assertIsNone(self.audio_manager.voices.emitter_voice(self.far))
+
+        box = self.world.component_for_entity(self.right, aabb.AABBComponent)
+        box.pos.x += 1
+        self.world.process(0.0)
+        self.assertEqual(self.processor.stats['updated'], 0)
+        box.pos.x += 50
+        self.world.process(0.0)
+        self.assertEqual(self.processor.stats['updated'], 1)
+
+        box.pos.x += 1000
+        self.world.delete_entity(self.near, immediate=True)
+        self.world.process(0.0)
+        self.assertEqual(self.processor.emitters, set())
+        self.assertEqual(self.processor.stats['stopped'], 2)
+        self.assertEqual(self.audio_manager.voices.active(), [])
+
+    def test_command_queue(self):
+        """Checking that emitters started through command queue are restarted after losing voice."""
+        audio_queue = AudioCommandQueue(self.audio_manager)
+        self.world.remove_processor(sound_emitter.SoundEmitterProcessor)
+        processor = sound_emitter.SoundEmitterProcessor(audio_queue, self.listener)
+        self.world.add_processor(processor)
+        voices = self.audio_manager.voices
+        high = self.audio_manager.get_sound_handle('pop3.wav')
+        self.audio_manager.set_sound_priority(high, 1, len(voices.channels))
+
+        self.world.process(0.0)
+        audio_queue.wait()
+        self.assertIsNotNone(voices.emitter_voice(self.near))
+
+        # pool is taken by sounds of higher priority, emitters are started again after a delay
+        for _ in voices.channels:
+            audio_queue.play_sound(high)
+        audio_queue.wait()
+        self.world.process(0.0)
+        self.assertIsNone(voices.emitter_voice(self.near))
+        self.assertEqual(processor.stats['lost'], 2)
+        for _ in range(sound_emitter.RETRY_FRAMES):
+            self.world.process(0.0)
+        audio_queue.wait()
+        self.assertEqual(processor.stats['started'], 4)
+        self.assertIsNone(voices.emitter_voice(self.near))
+
+        audio_queue.stop_sound(high)
+        audio_queue.wait()
+        for _ in range(sound_emitter.RETRY_FRAMES + 1):
+            self.world.process(0.0)
+        audio_queue.stop()
+        self.assertEqual(processor.stats['lost'], 4)
+        self.assertIsNotNone(voices.emitter_voice(self.near))
+        self.assertIsNotNone(voices.emitter_voice(self.right))
+        self.assertEqual(processor.emitters, {self.near, self.right})
+
+    def test_max_voices(self):
+        """Checking that only the loudest emitters play."""
+        self.processor.max_voices = 1
+        self.world.process(0.0)
+        self.assertEqual(self.processor.emitters, {self.near})
+        self.assertIsNone(self.audio_manager.voices.emitter_voice(self.right))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Module is responsible for keeping decoded sounds within a memory budget."""
+
+from collections import OrderedDict
+from typing import Callable
+
+from pygame import mixer
+
+
+def sound_size(sound: mixer.Sound) -> int:
+    """
+    Get size of decoded samples of a sound in bytes.
+
+    :param sound: decoded sound
+
+    :return: size computed from sound length and mixer format, 0 if mixer is not initialized
+    """
+    init = mixer.get_init()
+    if init is None:
+        return 0
+    frequency, sample_format, channels = init
+    return int(round(sound.get_length() * frequency)) * channels * (abs(sample_format) // 8)
+
+
+class SoundCache:
+    """
+    LRU cache of decoded sounds keyed by sound handles.
+
+    Least recently used sounds are dropped when bytes of resident sounds exceed the budget.
+    A dropped sound which is still playing is kept alive by its channel until it ends.
+
+    :param budget: memory budget in bytes
+    :param sounds: ordered dictionary <handle, (mixer.Sound, size)>, most recently used last
+    :param bytes_resident: total size of cached sounds
+    """
+
+    def __init__(self, budget: int):
+        """
+        Initialize empty cache.
+
+        :param budget: memory budget in bytes
+        """
+        self.budget = budget
+        self.sounds = OrderedDict()
+        self.bytes_resident = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, handle: int, load: Callable[[], mixer.Sound]) -> mixer.Sound:
+        """
+        Get sound from cache, decode it with load on miss.
+
+        :param handle: sound handle
+        :param load: function decoding the sound
+
+        :return: decoded sound
+        """
+        if handle in self.sounds:
+            self.hits += 1
+            self.sounds.move_to_end(handle)
+            return self.sounds[handle][0]
+
+        self.misses += 1
+        sound = load()
+        size = sound_size(sound)
+        self.sounds[handle] = (sound, size)
+        self.bytes_resident += size
+        self.evict()
+        return sound
+
+    def peek(self, handle: int) -> mixer.Sound | None:
+        """
+        Get sound if it is resident without changing its position and statistics.
+
+        :param handle: sound handle
+
+        :return: decoded sound or None
+        """
+        if handle in self.sounds:
+            return self.sounds[handle][0]
+        return None
+
+    def set_budget(self, budget: int):
+        """
+        Change memory budget, least recently used sounds are dropped to fit into it.
+
+        :param budget: memory budget in bytes
+        """
+        self.budget = budget
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used sounds until cache fits into budget, last used one stays."""
+        while self.bytes_resident > self.budget and len(self.sounds) > 1:
+            _, (_, size) = self.sounds.popitem(last=False)
+            self.bytes_resident -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all sounds and reset statistics."""
+        self.sounds.clear()
+        self.bytes_resident = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        :return: dict with hits, misses, evictions, resident sounds count, bytes resident and budget
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'sounds_resident': len(self.sounds), 'bytes_resident': self.bytes_resident,
+                'budget': self.budget}
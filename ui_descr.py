@@ -1,9 +1,8 @@
 """Descriptions for all ui screens in game."""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Callable, List, Tuple
-import pygame as pg
 from app_state import app_state
-from gui import ButtonDescr, SliderDescr, Button, Slider, TextRect, BaseUIElem
+from gui import ButtonDescr, SliderDescr, Button, Slider, TextRect, BaseUIElem, WidgetBatch
 
 @dataclass
 class UI:
@@ -12,6 +11,27 @@ class UI:
     buttons: List[Button]
     sliders: List[Slider]
     others: List[Tuple[BaseUIElem, float, float]]
+    widget_batch: WidgetBatch = field(default_factory=WidgetBatch)
+
+class UICache:
+    """UI screens built once per screen, language and resolution.
+
+    Cached screens keep their widgets, so only dynamic values like slider
+    positions should be updated when screen is shown again.
+    """
+
+    def __init__(self):
+        """Create empty cache."""
+        self.screens = {}
+    def get(self, name: str, build: Callable[[], UI], language: str = 'en') -> UI:
+        """Get screen, build it with build on first request."""
+        key = (name, language, tuple(app_state().screen_res))
+        if key not in self.screens:
+            self.screens[key] = build()
+        return self.screens[key]
+    def clear(self) -> None:
+        """Forget all screens, e.g. after language change."""
+        self.screens = {}
 
 def menu_ui(play_callback: Callable, exit_callback: Callable, music_callback: Callable,
             sound_callback: Callable, sounds: Tuple[float, float]) -> UI:
@@ -23,9 +43,9 @@ def menu_ui(play_callback: Callable, exit_callback: Callable, music_callback: Ca
     sound_font = int(64 / 1280 * app_state().screen_res[0])
     return UI(
         [
-            Button(TextRect('Play', pg.font.SysFont('arial', buttons_font), (0, 0, 0, 255)),
+            Button(TextRect('Play', buttons_font, (0, 0, 0, 255)),
                     button_descr, [0.5, 0.325, 0.2, 0.13], play_callback),
-            Button(TextRect('Exit', pg.font.SysFont('arial', buttons_font), (0, 0, 0, 255)),
+            Button(TextRect('Exit', buttons_font, (0, 0, 0, 255)),
                     button_descr, [0.5, 0.85, 0.2, 0.13], exit_callback)
         ],
         [
@@ -33,10 +53,10 @@ def menu_ui(play_callback: Callable, exit_callback: Callable, music_callback: Ca
             Slider(slider_descr, (0.6, 0.7), sounds[1], sound_callback)
         ],
         [
-            (TextRect('GAME', pg.font.SysFont('arial', name_font), (0, 0, 0, 255)), 0.5, 0.15),
-            (TextRect('Loudness', pg.font.SysFont('arial', sound_font), (0, 0, 0, 255)), 0.5, 0.46),
-            (TextRect('Music', pg.font.SysFont('arial', sound_font), (0, 0, 0, 255)), 0.25, 0.6),
-            (TextRect('Sounds', pg.font.SysFont('arial', sound_font), (0, 0, 0, 255)), 0.25, 0.7)
+            (TextRect('GAME', name_font, (0, 0, 0, 255)), 0.5, 0.15),
+            (TextRect('Loudness', sound_font, (0, 0, 0, 255)), 0.5, 0.46),
+            (TextRect('Music', sound_font, (0, 0, 0, 255)), 0.25, 0.6),
+            (TextRect('Sounds', sound_font, (0, 0, 0, 255)), 0.25, 0.7)
         ]
     )
 
@@ -49,9 +69,9 @@ def pause_ui(continue_callback: Callable, menu_callback: Callable, music_callbac
     sound_font = int(64 / 1280 * app_state().screen_res[0])
     return UI(
         [
-            Button(TextRect('Continue', pg.font.SysFont('arial', buttons_font), (0, 0, 0, 255)),
+            Button(TextRect('Continue', buttons_font, (0, 0, 0, 255)),
                     button_descr, [0.5, 0.2, 0.4, 0.13], continue_callback),
-            Button(TextRect('Main menu', pg.font.SysFont('arial', buttons_font), (0, 0, 0, 255)),
+            Button(TextRect('Main menu', buttons_font, (0, 0, 0, 255)),
                     button_descr, [0.5, 0.8, 0.4, 0.13], menu_callback)
         ],
         [
@@ -59,9 +79,9 @@ def pause_ui(continue_callback: Callable, menu_callback: Callable, music_callbac
             Slider(slider_descr, (0.6, 0.6), sounds[1], sound_callback)
         ],
         [
-            (TextRect('Loudness', pg.font.SysFont('arial', sound_font), (0, 0, 0, 255)), 0.5, 0.35),
-            (TextRect('Music', pg.font.SysFont('arial', sound_font), (0, 0, 0, 255)), 0.25, 0.5),
-            (TextRect('Sounds', pg.font.SysFont('arial', sound_font), (0, 0, 0, 255)), 0.25, 0.6)
+            (TextRect('Loudness', sound_font, (0, 0, 0, 255)), 0.5, 0.35),
+            (TextRect('Music', sound_font, (0, 0, 0, 255)), 0.25, 0.5),
+            (TextRect('Sounds', sound_font, (0, 0, 0, 255)), 0.25, 0.6)
         ]
     )
 
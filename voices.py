@@ -0,0 +1,262 @@
+"""Module is responsible for distributing sounds between a fixed pool of mixer channels."""
+
+from dataclasses import dataclass
+from typing import List
+
+from pygame import mixer
+
+
+STEAL_MODES = ['oldest', 'quietest']
+
+
+@dataclass
+class Voice:
+    """
+    Sound instance playing on a channel of the pool.
+
+    :param handle: sound handle
+    :param channel: mixer channel playing the sound
+    :param sound: played sound
+    :param priority: voices with lower priority are stolen first
+    :param volume: channel volume set before play
+    :param order: sequence number of the start, the oldest voice has the lowest one
+    :param emitter: id of sound emitter playing the voice, None for not positioned sounds
+    :param left: gain of left speaker of positioned sound
+    :param right: gain of right speaker of positioned sound
+    """
+
+    handle: int
+    channel: mixer.Channel
+    sound: mixer.Sound
+    priority: int
+    volume: float
+    order: int
+    emitter: int | None = None
+    left: float = 1.0
+    right: float = 1.0
+
+    def loudness(self) -> float:
+        """
+        Get volume of the louder speaker.
+
+        :return: volume
+        """
+        return self.volume * max(self.left, self.right)
+
+    def apply_volume(self):
+        """Set channel volume, positioned sounds are panned between speakers."""
+        if self.emitter is None:
+            self.channel.set_volume(self.volume)
+        else:
+            self.channel.set_volume(self.volume * self.left, self.volume * self.right)
+
+
+class VoiceManager:
+    """
+    Voice manager playing sounds on a fixed pool of reserved mixer channels.
+
+    Every sound is limited by a number of concurrent instances, when the limit is
+    reached the oldest instance of the sound is restarted. When all channels are busy,
+    a voice with priority not higher than the new one is stolen: the oldest or the
+    quietest one. Sound is dropped if all voices have higher priority.
+    Channel volume is applied before playback starts.
+    Sound emitters whose voice was stolen, restarted by instance limit, rejected or
+    stopped by stop() are collected as lost, so their owner can start them again.
+
+    :param channels: mixer channels of the pool
+    :param voices: active voices by channel index
+    :param emitters: channel indices of voices of sound emitters by emitter id
+    :param lost: ids of sound emitters which lost their voice since last take_lost()
+    :param steal: 'oldest' or 'quietest'
+    """
+
+    def __init__(self, channels: int = 16, steal: str = 'oldest'):
+        """
+        Reserve channels of the pool.
+
+        :param channels: number of channels
+        :param steal: voice stealing mode, 'oldest' or 'quietest'
+        """
+        if steal not in STEAL_MODES:
+            raise ValueError(f'Unknown voice stealing mode "{steal}"')
+        self.steal = steal
+        mixer.set_num_channels(max(mixer.get_num_channels(), channels))
+        # Sound.play() of other code does not take reserved channels
+        mixer.set_reserved(channels)
+        self.channels = [mixer.Channel(idx) for idx in range(channels)]
+        self.voices = {}
+        self.emitters = {}
+        self.lost = set()
+        self.order = 0
+        self.stats = {'played': 0, 'stolen': 0, 'limited': 0, 'rejected': 0}
+
+    def update(self):
+        """Free voices which finished playing."""
+        for idx, voice in list(self.voices.items()):
+            if not voice.channel.get_busy() or voice.channel.get_sound() is not voice.sound:
+                del self.voices[idx]
+        self.emitters = {emitter: idx for emitter, idx in self.emitters.items()
+                         if idx in self.voices and self.voices[idx].emitter == emitter}
+
+    def active(self, handle: int = None) -> List[Voice]:
+        """
+        Get playing voices.
+
+        :param handle: sound handle, every voice if None
+
+        :return: list of voices
+        """
+        self.update()
+        return [voice for voice in self.voices.values() if handle is None or voice.handle == handle]
+
+    def play(self, handle: int, sound: mixer.Sound, volume: float,
+             priority: int = 0, max_instances: int = 4, loops: int = 0,
+             emitter: int = None, pan: tuple = (1.0, 1.0)) -> Voice | None:
+        """
+        Play sound on a channel of the pool.
+
+        :param handle: sound handle
+        :param sound: decoded sound
+        :param volume: channel volume
+        :param priority: priority of the voice
+        :param max_instances: maximum number of concurrent instances of the sound
+        :param loops: number of repeats after the first play, -1 = endlessly
+        :param emitter: id of sound emitter, a voice of the same emitter is replaced
+        :param pan: gains of left and right speakers of positioned sound
+
+        :return: playing voice or None if sound was dropped
+        """
+        if emitter is not None:
+            self.stop_emitter(emitter)
+        instances = self.active(handle)
+        if len(instances) >= max_instances:
+            idx = self.channels.index(min(instances, key=lambda voice: voice.order).channel)
+            self.stats['limited'] += 1
+        else:
+            idx = self._free_channel()
+            if idx is None:
+                idx = self._steal_channel(priority)
+                if idx is None:
+                    self.stats['rejected'] += 1
+                    if emitter is not None:
+                        self.lost.add(emitter)
+                    return None
+                self.stats['stolen'] += 1
+        replaced = self.voices.get(idx)
+        if replaced is not None and replaced.emitter is not None:
+            self.lost.add(replaced.emitter)
+        channel = self.channels[idx]
+        channel.stop()
+        self.order += 1
+        voice = Voice(handle, channel, sound, priority, volume, self.order, emitter, *pan)
+        voice.apply_volume()
+        channel.play(sound, loops)
+        self.voices[idx] = voice
+        if emitter is not None:
+            self.emitters[emitter] = idx
+        self.stats['played'] += 1
+        return voice
+
+    def _free_channel(self) -> int | None:
+        """
+        Find channel without voice.
+
+        :return: channel index or None if every channel is busy
+        """
+        for idx, _ in enumerate(self.channels):
+            if idx not in self.voices:
+                return idx
+        return None
+
+    def _steal_channel(self, priority: int) -> int | None:
+        """
+        Choose voice to stop for a new voice with specified priority.
+
+        :param priority: priority of the new voice
+
+        :return: channel index or None if every voice has higher priority
+        """
+        candidates = [(idx, voice) for idx, voice in self.voices.items()
+                      if voice.priority <= priority]
+        if len(candidates) == 0:
+            return None
+        if self.steal == 'oldest':
+            key = lambda item: (item[1].priority, item[1].order)
+        else:
+            key = lambda item: (item[1].priority, item[1].loudness(), item[1].order)
+        return min(candidates, key=key)[0]
+
+    def set_volume(self, handle: int, volume: float):
+        """
+        Change volume of every playing instance of a sound.
+
+        :param handle: sound handle
+        :param volume: channel volume
+        """
+        for voice in self.active(handle):
+            voice.volume = volume
+            voice.apply_volume()
+
+    def emitter_voice(self, emitter: int) -> Voice | None:
+        """
+        Get playing voice of sound emitter.
+
+        :param emitter: id of sound emitter
+
+        :return: voice or None if emitter does not play
+        """
+        voice = self.voices.get(self.emitters.get(emitter))
+        if voice is None or voice.emitter != emitter or not voice.channel.get_busy():
+            return None
+        return voice
+
+    def set_pan(self, emitter: int, left: float, right: float) -> bool:
+        """
+        Change speaker gains of a positioned sound.
+
+        :param emitter: id of sound emitter
+        :param left: gain of left speaker
+        :param right: gain of right speaker
+
+        :return: True if emitter plays
+        """
+        voice = self.emitter_voice(emitter)
+        if voice is None:
+            return False
+        voice.left = left
+        voice.right = right
+        voice.apply_volume()
+        return True
+
+    def stop_emitter(self, emitter: int):
+        """
+        Stop voice of sound emitter.
+
+        :param emitter: id of sound emitter
+        """
+        voice = self.emitter_voice(emitter)
+        if voice is not None:
+            voice.channel.stop()
+            self.update()
+
+    def stop(self, handle: int = None):
+        """
+        Stop instances of a sound.
+
+        :param handle: sound handle, every voice if None
+        """
+        for voice in self.active(handle):
+            voice.channel.stop()
+            if voice.emitter is not None:
+                self.lost.add(voice.emitter)
+        self.update()
+
+    def take_lost(self) -> set:
+        """
+        Get sound emitters which lost their voice since previous call.
+
+        :return: set of emitter ids
+        """
+        lost = self.lost
+        self.lost = set()
+        return lost